@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+"""Benchmark ``circonus`` graph generation and client throughput.
+
+Run with ``python bench_circonus.py``.  Results are written as JSON to standard output, or to the file given with
+``--output``, so that they can be compared between releases.
+
+"""
+
+from __future__ import print_function
+
+from collections import OrderedDict
+from itertools import chain
+from timeit import default_timer
+
+import argparse
+import json
+import platform
+import sys
+
+from circonus import AsyncCirconusClient, CirconusClient, metric, util
+from circonus.collectd import cpu, df, index, interface, memory
+from circonus.collectd.graph import get_collectd_graph_data
+from circonus.fake import FakeCirconusAPI
+from circonus.scheduler import RequestScheduler
+
+
+SCALES = [
+    {"scale": "small", "cpus": 4, "metrics": 1000, "checks": 1},
+    {"scale": "medium", "cpus": 64, "metrics": 10000, "checks": 8},
+    {"scale": "large", "cpus": 256, "metrics": 100000, "checks": 32}
+]
+"""The sizes of the synthetic check bundles to benchmark graph generation with."""
+
+INTERFACE_NAMES = ["eth0", "eth1", "lo", "sit0"]
+
+MOUNT_DIRS = ["root", "boot", "dev-shm", "mnt", "mnt-mysql", "mnt-solr-home", "var-log", "tmp"]
+
+CLIENT_REQUESTS = 200
+"""The number of requests to make per client throughput benchmark."""
+
+CLIENT_ERROR_RATE = 0.1
+"""The fraction of requests which fail and are retried in the client retry benchmark."""
+
+
+def get_cpu_bundle_metrics(cpus):
+    """Get synthetic ``collectd`` CPU metrics for ``cpus`` CPUs."""
+    return [{"name": "cpu`%d`cpu`%s" % (n, s), "status": "active", "type": "numeric"}
+            for n in range(cpus) for s in reversed(cpu.CPU_METRIC_SUFFIXES)]
+
+
+def get_check_bundle(cpus, metrics, checks):
+    """Get a synthetic ``collectd`` check bundle with ``cpus`` CPUs, about ``metrics`` metrics and ``checks``
+    checks."""
+    names = ["memory`memory`%s" % s for s in memory.MEMORY_METRIC_SUFFIXES]
+    names.extend("interface`%s`%s`%s" % (i, t, d) for i in INTERFACE_NAMES
+                 for t in ("if_errors", "if_octets", "if_packets") for d in ("rx", "tx"))
+    names.extend("df`%s`df_complex`%s" % (d, s) for d in MOUNT_DIRS for s in df.DF_METRIC_SUFFIXES)
+    bundle_metrics = get_cpu_bundle_metrics(cpus)
+    bundle_metrics.extend({"name": n, "status": "active", "type": "numeric"} for n in names)
+    bundle_metrics.extend({"name": "statsd`app%d`gauge`value%d" % (n % 100, n), "status": "active", "type": "numeric"}
+                          for n in range(max(0, metrics - len(bundle_metrics))))
+    return {"_cid": "/check_bundle/1",
+            "_checks": ["/check/%d" % (n + 1) for n in range(checks)],
+            "metrics": bundle_metrics,
+            "target": "10.0.0.1",
+            "type": "collectd"}
+
+
+def get_cpu_metrics_quadratic(metrics):
+    """The previous implementation of :func:`circonus.collectd.cpu.get_cpu_metrics`, which scans every metric per CPU
+    and every suffix per metric, kept for comparison."""
+    cpus = cpu._get_cpus(metrics)
+    cpu_metrics = OrderedDict.fromkeys(cpus)
+    for c in cpus:
+        metrics_map = OrderedDict.fromkeys(cpu.CPU_METRIC_SUFFIXES)
+        for m in (m for m in metrics if m["name"].startswith(c)):
+            for s in cpu.CPU_METRIC_SUFFIXES:
+                if m["name"].endswith(s):
+                    metrics_map[s] = m
+                    break
+        sorted_metrics = metrics_map.values()
+        cpu_metrics[c] = sorted_metrics if all(sorted_metrics) else []
+    return list(chain.from_iterable(cpu_metrics.values()))
+
+
+def best_of(f, args, repeat=5):
+    """Get the fastest time in seconds of ``repeat`` calls of ``f`` with ``args``."""
+    times = []
+    for _ in range(repeat):
+        start = default_timer()
+        f(*args)
+        times.append(default_timer() - start)
+    return min(times)
+
+
+def bench_graph_data(scale, repeat):
+    """Time graph generation for a check bundle of ``scale``."""
+    check_bundle = get_check_bundle(scale["cpus"], scale["metrics"], scale["checks"])
+    metric_index = index.MetricIndex(check_bundle["metrics"])
+    cpu_metrics = metric_index.get_metrics("cpu")
+    benchmarks = [
+        ("get_collectd_graph_data", get_collectd_graph_data, (check_bundle,)),
+        ("get_collectd_graph_data_compact", lambda cb: get_collectd_graph_data(cb, compact=True), (check_bundle,)),
+        ("MetricIndex", index.MetricIndex, (check_bundle["metrics"],)),
+        ("get_cpu_graph_data", cpu.get_cpu_graph_data, (check_bundle, None, metric_index)),
+        ("get_memory_graph_data", memory.get_memory_graph_data, (check_bundle, None, metric_index)),
+        ("get_interface_graph_data", interface.get_interface_graph_data, (check_bundle, "eth0", None, metric_index)),
+        ("get_df_graph_data", df.get_df_graph_data, (check_bundle, "/mnt/mysql", None, metric_index)),
+        ("get_datapoints", metric.get_datapoints, ("1", cpu_metrics)),
+        ("colors", lambda items: list(util.colors(items)), (cpu_metrics,))
+    ]
+    results = []
+    for name, f, args in benchmarks:
+        results.append(dict(scale, benchmark=name, seconds=best_of(f, args, repeat)))
+
+    seconds = best_of(cpu.get_cpu_metrics, (cpu_metrics,), repeat)
+    quadratic = best_of(get_cpu_metrics_quadratic, (cpu_metrics,), repeat)
+    results.append(dict(scale, benchmark="get_cpu_metrics", seconds=seconds, quadratic_seconds=quadratic))
+
+    datapoints = metric.get_datapoints("1", cpu_metrics, {"derive": "counter"}, compact=True)
+    results.append(dict(scale, benchmark="datapoint_memory", datapoints=len(datapoints),
+                        record_bytes=sum(sys.getsizeof(dp) for dp in datapoints),
+                        dict_bytes=sum(sys.getsizeof(dp.to_dict()) for dp in datapoints)))
+    return results
+
+
+def bench_client(requests=CLIENT_REQUESTS):
+    """Measure client throughput against a :class:`~circonus.fake.FakeCirconusAPI`."""
+    cids = ["/check_bundle/%d" % n for n in range(requests)]
+    graphs = [{"title": "graph %d" % n, "datapoints": []} for n in range(requests)]
+    results = []
+    with FakeCirconusAPI() as api:
+        for cid in cids:
+            api.add("check_bundle", {"_cid": cid})
+
+        c = CirconusClient("bench", "token", base_url=api.base_url)
+        start = default_timer()
+        for cid in cids:
+            c.get(cid)
+        results.append(("get", default_timer() - start))
+
+        with AsyncCirconusClient("bench", "token", base_url=api.base_url) as async_client:
+            start = default_timer()
+            for r in [async_client.get(cid) for cid in cids]:
+                r.get()
+            results.append(("get_async", default_timer() - start))
+        async_client.client.session.close()
+
+        start = default_timer()
+        c.create_many("graph", graphs)
+        results.append(("create_many", default_timer() - start))
+        c.session.close()
+
+        api.error_rate = CLIENT_ERROR_RATE
+        c = CirconusClient("bench", "token", base_url=api.base_url, scheduler=RequestScheduler(backoff_factor=0))
+        start = default_timer()
+        for cid in cids:
+            c.get(cid)
+        results.append(("get_retried", default_timer() - start))
+        c.session.close()
+    return [{"benchmark": "client_%s" % name, "requests": requests, "seconds": seconds,
+             "requests_per_second": requests / seconds} for name, seconds in results]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="write results to this file instead of standard output")
+    parser.add_argument("--repeat", type=int, default=5, help="take the best of this many runs (default: 5)")
+    parser.add_argument("--scale", action="append", choices=[s["scale"] for s in SCALES],
+                        help="only benchmark these check bundle scales (default: all)")
+    parser.add_argument("--no-client", action="store_true", help="skip the client throughput benchmarks")
+    args = parser.parse_args(argv)
+
+    results = []
+    for scale in SCALES:
+        if args.scale is None or scale["scale"] in args.scale:
+            results.extend(bench_graph_data(scale, args.repeat))
+    if not args.no_client:
+        results.extend(bench_client())
+
+    report = {"python": platform.python_version(), "platform": platform.platform(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, separators=(",", ": "), sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, separators=(",", ": "), sort_keys=True)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ from logging import NullHandler
 
 import logging
 
-from circonus.client import CirconusClient
+from circonus.client import AsyncCirconusClient, CirconusClient, MultiCirconusClient
 
 
 logging.getLogger(__name__).addHandler(NullHandler())
@@ -5,10 +5,56 @@ circonus.annotation
 
 """
 
+from collections import deque
 from datetime import datetime
 from functools import wraps
+from multiprocessing.pool import ThreadPool
+from threading import Condition, Thread
+from time import time
+from weakref import WeakSet
 
+import atexit
+import logging
+
+from circonus.scheduler import is_retryable_error
 from circonus.util import datetime_to_int
+from requests.exceptions import RequestException
+
+
+ANNOTATION_QUEUE_SIZE = 1000
+"""The default maximum number of annotations waiting to be sent by an :class:`AnnotationQueue`."""
+
+ANNOTATION_BATCH_SIZE = 50
+"""The default maximum number of annotations an :class:`AnnotationQueue` sends at once."""
+
+ANNOTATION_MAX_WORKERS = 4
+"""The default maximum number of concurrent requests an :class:`AnnotationQueue` makes to send a batch."""
+
+ANNOTATION_FLUSH_TIMEOUT = 5.0
+"""The default number of seconds to wait for queued annotations to be sent when the interpreter exits."""
+
+OVERFLOW_DROP_NEWEST = "drop_newest"
+"""Drop an annotation added to a full :class:`AnnotationQueue`."""
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+"""Drop the oldest queued annotation to make room for an annotation added to a full :class:`AnnotationQueue`."""
+
+OVERFLOW_BLOCK = "block"
+"""Wait for room when an annotation is added to a full :class:`AnnotationQueue`."""
+
+OVERFLOW_POLICIES = frozenset([OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK])
+"""The policies for annotations added to a full :class:`AnnotationQueue`."""
+
+log = logging.getLogger(__name__)
+
+_exit_queues = WeakSet()
+
+
+@atexit.register
+def _close_exit_queues():
+    """Close each :class:`AnnotationQueue` which flushes on exit and has not been closed."""
+    for queue in list(_exit_queues):
+        queue.close(queue.flush_timeout)
 
 
 class Annotation(object):
@@ -60,9 +106,13 @@ class Annotation(object):
         self.stop = datetime.utcnow()
         self.create()
 
-    def create(self):
-        """Create an annotation from the current state."""
-        data = {
+    def get_data(self):
+        """Get the Circonus API representation of the current state.
+
+        :rtype: :py:class:`dict`
+
+        """
+        return {
             "title": self.title,
             "category": self.category,
             "start": datetime_to_int(self.start),
@@ -70,5 +120,280 @@ class Annotation(object):
             "description": self.description,
             "rel_metrics": self.rel_metrics
         }
-        self.response = self.client.create(self.RESOURCE_PATH, data)
+
+    def create(self):
+        """Create an annotation from the current state."""
+        self.response = self.client.create(self.RESOURCE_PATH, self.get_data())
         return self
+
+
+class AnnotationWriter(object):
+    """The annotation methods of writers which create resources in place of a client, e.g., :class:`AnnotationQueue`.
+
+    Subclasses implement ``create(resource_type, data)``, whose result becomes the ``response`` attribute of each
+    :class:`Annotation`.
+
+    """
+
+    def annotation(self, title, category, description="", rel_metrics=None):
+        """Context manager and decorator for creating :class:`Annotation` instances with this writer.
+
+        :param str title: The title.
+        :param str category: The category.
+        :param str description: (optional) The description.
+        :param list rel_metrics: (optional) The :py:class:`str` names of metrics related to this annotation.
+        :rtype: :class:`Annotation`
+
+        """
+        return Annotation(self, title, category, description, rel_metrics)
+
+    def create_annotation(self, title, category, start=None, stop=None, description="", rel_metrics=None):
+        """Create an :class:`Annotation` with this writer immediately.
+
+        :param str title: The title.
+        :param str category: The category.
+        :param datetime.datetime start: (optional) The start time.
+        :param datetime.datetime stop: (optional) The stop time.
+        :param str description: (optional) The description.
+        :param list rel_metrics: (optional) The :py:class:`str` names of metrics related to this annotation.
+        :rtype: :class:`Annotation`
+
+        ``stop`` defaults to the value of ``start`` if it is not given.
+
+        """
+        a = Annotation(self, title, category, description, rel_metrics)
+        a.start = datetime.utcnow() if start is None else start
+        a.stop = a.start if stop is None else stop
+        a.create()
+        return a
+
+
+class AnnotationQueue(AnnotationWriter):
+    """Construct an :class:`AnnotationQueue`.
+
+    :param client: The client to create annotations with.
+    :type client: :class:`~circonus.CirconusClient`
+    :param int max_size: (optional) The maximum number of annotations waiting to be sent.
+    :param int batch_size: (optional) The maximum number of annotations to send at once.
+    :param int max_workers: (optional) The maximum number of concurrent requests made to send a batch.
+    :param str overflow: (optional) The policy for annotations added while the queue is full, one of
+        :const:`OVERFLOW_POLICIES`.
+    :param bool flush_on_exit: (optional) Send queued annotations when the interpreter exits.
+    :param float flush_timeout: (optional) The number of seconds to wait for queued annotations when exiting.
+    :param spool: (optional) The spool to write annotations which would otherwise be lost to.
+    :type spool: :class:`~circonus.spool.Spool`
+    :rtype: :class:`AnnotationQueue`
+
+    Annotations created with an :class:`AnnotationQueue` are added to a bounded in-memory queue and :meth:`create`
+    returns immediately, so the code being annotated never waits for the Circonus API.  A background thread drains
+    the queue, sending up to ``batch_size`` annotations at a time concurrently.
+
+    When the queue holds ``max_size`` annotations, :const:`OVERFLOW_DROP_NEWEST` drops the annotation being added,
+    :const:`OVERFLOW_DROP_OLDEST` drops the oldest queued annotation instead and :const:`OVERFLOW_BLOCK` waits until
+    there is room.  The ``sent``, ``failed`` and ``dropped`` attributes count annotations created, annotations whose
+    request raised a :class:`~requests.exceptions.RequestException`, which is logged, and annotations dropped.
+
+    If ``flush_on_exit`` is :py:const:`True` the queue is closed when the interpreter exits, waiting at most
+    ``flush_timeout`` seconds for queued annotations to be sent.
+
+    If ``spool`` is given, annotations which would be dropped, annotations still queued when the queue is closed and
+    annotations whose request failed with a transient error, see :func:`~circonus.scheduler.is_retryable_error`, are
+    written to it instead of being lost and counted by the ``spooled`` attribute.
+
+    Usage::
+
+        >>> from circonus import CirconusClient
+        >>> from circonus.annotation import AnnotationQueue
+        >>> circonus = CirconusClient("my-circonus-app", "generated-by-circonus-ui")
+        >>> annotations = AnnotationQueue(circonus)
+        >>> with annotations.annotation("Deploy", "deploys"):
+        ...     deploy()
+
+    The queue may be shared by several threads.
+
+    """
+
+    def __init__(self, client, max_size=ANNOTATION_QUEUE_SIZE, batch_size=ANNOTATION_BATCH_SIZE,
+                 max_workers=ANNOTATION_MAX_WORKERS, overflow=OVERFLOW_DROP_NEWEST, flush_on_exit=True,
+                 flush_timeout=ANNOTATION_FLUSH_TIMEOUT, spool=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("overflow must be one of %s" % ", ".join(sorted(OVERFLOW_POLICIES)))
+        self.client = client
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.overflow = overflow
+        self.flush_timeout = flush_timeout
+        self.spool = spool
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spooled = 0
+        self.closed = False
+        self._queue = deque()
+        self._sending = 0
+        self._condition = Condition()
+        self._pool = ThreadPool(max_workers)
+        self._worker = Thread(target=self._run, name="circonus-annotations")
+        self._worker.daemon = True
+        self._worker.start()
+        if flush_on_exit:
+            _exit_queues.add(self)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(self.flush_timeout)
+
+    def create(self, resource_type, data):
+        """Queue the resource type to be created with ``data``.
+
+        :param str resource_type: The resource type to create, e.g., ``"annotation"``.
+        :param dict data: The data used to create the resource.
+        :return: :py:const:`True` if ``data`` was queued or spooled, or :py:const:`False` if it was dropped.
+        :rtype: :py:class:`bool`
+
+        """
+        queued = False
+        spilled = []
+        with self._condition:
+            if not self.closed and len(self._queue) >= self.max_size:
+                if self.overflow == OVERFLOW_DROP_OLDEST:
+                    spilled.append(self._queue.popleft())
+                elif self.overflow == OVERFLOW_BLOCK:
+                    while len(self._queue) >= self.max_size and not self.closed:
+                        self._condition.wait()
+            if self.closed or len(self._queue) >= self.max_size:
+                spilled.append((resource_type, data))
+            else:
+                self._queue.append((resource_type, data))
+                self._condition.notify_all()
+                queued = True
+        spooled = self._spill(spilled)
+        return queued or spooled
+
+    def _spill(self, items):
+        """Write the (resource type, data) ``items`` which cannot be sent to :attr:`spool` if there is one, otherwise
+        drop them.  The lock must not be held, so that threads adding annotations never wait for the disk.
+
+        :return: :py:const:`True` if the items were spooled.
+        :rtype: :py:class:`bool`
+
+        """
+        if not items:
+            return False
+        if self.spool is None:
+            with self._condition:
+                self.dropped += len(items)
+            return False
+        for resource_type, data in items:
+            self.spool.create(resource_type, data)
+        with self._condition:
+            self.spooled += len(items)
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until every queued annotation has been sent.
+
+        :param float timeout: (optional) The maximum number of seconds to wait.
+        :return: :py:const:`True` if the queue was drained or :py:const:`False` if ``timeout`` expired first.
+        :rtype: :py:class:`bool`
+
+        """
+        deadline = None if timeout is None else time() + timeout
+        with self._condition:
+            while self._queue or self._sending:
+                if not self._worker.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Stop accepting annotations, wait until the queued annotations have been sent and stop the worker thread.
+
+        :param float timeout: (optional) The maximum number of seconds to wait.
+        :return: :py:const:`True` if the queue was drained or :py:const:`False` if ``timeout`` expired first.
+        :rtype: :py:class:`bool`
+
+        Annotations still queued when ``timeout`` expires are spooled or dropped.  Closing a closed queue has no effect.
+
+        """
+        _exit_queues.discard(self)
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+        drained = self.flush(timeout)
+        if not drained:
+            with self._condition:
+                items = list(self._queue)
+                self._queue.clear()
+                self._condition.notify_all()
+            self._spill(items)
+        return drained
+
+    def _next_batch(self):
+        """Wait for and take the next batch of queued annotations.
+
+        :rtype: :py:class:`list` or :py:const:`None`
+
+        :py:const:`None` is returned when the queue is closed and empty.
+
+        """
+        with self._condition:
+            while not self._queue:
+                if self.closed:
+                    return None
+                self._condition.wait()
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._sending = len(batch)
+            self._condition.notify_all()
+            return batch
+
+    def _create(self, resource_type, data):
+        """Create the resource type with ``data``.
+
+        :return: The response or the :class:`~requests.exceptions.RequestException` raised.
+
+        """
+        try:
+            return self.client.create(resource_type, data)
+        except RequestException as e:
+            return e
+
+    def _send(self, batch):
+        """Create each of ``batch`` concurrently.
+
+        :rtype: :py:class:`list`
+
+        """
+        try:
+            return self._pool.map(lambda args: self._create(*args), batch)
+        except Exception as e:
+            log.exception("annotations could not be sent")
+            return [e] * len(batch)
+
+    def _run(self):
+        """Send batches of queued annotations until the queue is closed and empty."""
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                self._pool.close()
+                return
+            results = self._send(batch)
+            failed = [(item, r) for item, r in zip(batch, results) if isinstance(r, Exception)]
+            for _, e in failed:
+                log.error("annotation could not be created: %s", e)
+            if self.spool is not None:
+                self._spill([item for item, e in failed if is_retryable_error(e)])
+            with self._condition:
+                self.sent += len(results) - len(failed)
+                self.failed += len(failed)
+                self._sending = 0
+                self._condition.notify_all()
@@ -0,0 +1,269 @@
+"""
+
+circonus.cache
+~~~~~~~~~~~~~~
+
+Cache responses to ``GET`` requests.
+
+"""
+
+from collections import OrderedDict
+from threading import Event, Lock
+from time import time
+
+from requests.models import RequestEncodingMixin
+
+
+CACHE_MAX_ENTRIES = 1024
+"""The default maximum number of responses to cache."""
+
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+"""The default maximum number of response body bytes to cache."""
+
+CACHE_TTL = 60
+"""The default number of seconds a cached response is fresh for."""
+
+
+def get_cache_key(url, params=None):
+    """Get a key representing a ``GET`` request for ``url`` with ``params``.
+
+    :param str url: The URL.
+    :param params: (optional) The query parameters in any form :mod:`requests` accepts, e.g., a :py:class:`dict`, a
+        :py:class:`list` of (key, value) :py:class:`tuple` instances or an encoded :py:class:`str`.
+    :rtype: :py:class:`str`
+
+    Parameters are sorted, so the order of a :py:class:`dict` or :py:class:`list` does not change the key.
+
+    """
+    if not params:
+        return url
+    if not isinstance(params, basestring):
+        params = RequestEncodingMixin._encode_params(sorted(params.items() if hasattr(params, "items") else params))
+    return "%s?%s" % (url, params)
+
+
+class CacheEntry(object):
+    """Construct a :class:`CacheEntry`.
+
+    :param str url: The URL of the cached response.
+    :param response: The cached response.
+    :type response: :class:`requests.Response`
+    :param int ttl: The number of seconds ``response`` is fresh for.
+
+    """
+
+    __slots__ = ("url", "response", "size", "expires")
+
+    def __init__(self, url, response, ttl):
+        self.url = url
+        self.response = response
+        self.size = len(response.content)
+        self.expires = time() + ttl
+
+    def is_fresh(self):
+        """Is the cached response still fresh?
+
+        :rtype: :py:class:`bool`
+
+        """
+        return time() < self.expires
+
+    def get_validators(self):
+        """Get the conditional request headers which revalidate the cached response.
+
+        :rtype: :py:class:`dict`
+
+        An empty :py:class:`dict` is returned if the server did not send an ``ETag`` or ``Last-Modified`` header.
+
+        """
+        validators = {}
+        headers = self.response.headers
+        if headers.get("ETag"):
+            validators["If-None-Match"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = headers["Last-Modified"]
+        return validators
+
+
+class ResponseCache(object):
+    """Construct a :class:`ResponseCache`.
+
+    :param int max_entries: (optional) The maximum number of responses to cache.
+    :param int max_bytes: (optional) The maximum number of response body bytes to cache.
+    :param int ttl: (optional) The number of seconds a cached response is fresh for.
+    :param dict ttls: (optional) The number of seconds a cached response is fresh for by resource type.
+    :rtype: :class:`ResponseCache`
+
+    The least recently used responses are evicted when either ``max_entries`` or ``max_bytes`` would be exceeded.
+    ``ttls`` maps a resource type to the time to live of its responses, e.g., ``{"check_bundle": 300, "user": 3600}``.
+    Resource types which are not in ``ttls`` use ``ttl``.
+
+    The ``hits`` and ``misses`` attributes count lookups which found a fresh response and lookups which required a
+    request to the API.  The ``revalidations`` attribute counts the misses for which the API confirmed that a stale
+    response was unchanged.
+
+    The cache may be shared by several threads.
+
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL, ttls=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.ttls = {} if ttls is None else ttls
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._entries = OrderedDict()
+        self._keys_by_url = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key):
+        """Remove the entry for ``key``.  The lock must be held."""
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+        keys = self._keys_by_url[entry.url]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_url[entry.url]
+        return entry
+
+    def lookup(self, key):
+        """Look up the cached response for ``key``.
+
+        :param str key: The key from :func:`get_cache_key`.
+        :rtype: (:class:`requests.Response` or :py:const:`None`, :py:class:`dict`)
+
+        If a fresh response is cached it is returned along with an empty :py:class:`dict`.  Otherwise
+        :py:const:`None` is returned along with the conditional request headers which revalidate a stale response, if
+        there is one.
+
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None, {}
+            self._entries[key] = entry
+            if entry.is_fresh():
+                self.hits += 1
+                return entry.response, {}
+            self.misses += 1
+            return None, entry.get_validators()
+
+    def set(self, key, url, response, resource_type=None):
+        """Cache ``response`` for ``key``.
+
+        :param str key: The key from :func:`get_cache_key`.
+        :param str url: The URL of ``response``.
+        :param response: The response to cache.
+        :type response: :class:`requests.Response`
+        :param str resource_type: (optional) The resource type used to look up a time to live in ``ttls``.
+
+        Responses larger than ``max_bytes`` are not cached.
+
+        """
+        entry = CacheEntry(url, response, self.ttls.get(resource_type, self.ttl))
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            while self._entries and (len(self._entries) >= self.max_entries or
+                                     self.size + entry.size > self.max_bytes):
+                self._pop(next(iter(self._entries)))
+            self._entries[key] = entry
+            self._keys_by_url.setdefault(url, set()).add(key)
+            self.size += entry.size
+
+    def refresh(self, key, resource_type=None):
+        """Mark the response for ``key`` fresh again after the API confirmed it was unchanged.
+
+        :param str key: The key from :func:`get_cache_key`.
+        :param str resource_type: (optional) The resource type used to look up a time to live in ``ttls``.
+        :rtype: :class:`requests.Response` or :py:const:`None`
+
+        :py:const:`None` is returned if the response was evicted in the meantime.
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self.revalidations += 1
+            entry.expires = time() + self.ttls.get(resource_type, self.ttl)
+            return entry.response
+
+    def invalidate(self, url):
+        """Remove every cached response for ``url`` regardless of query parameters.
+
+        :param str url: The URL to invalidate.
+
+        """
+        with self._lock:
+            for key in list(self._keys_by_url.get(url, ())):
+                self._pop(key)
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_url.clear()
+            self.size = 0
+
+
+class SingleFlight(object):
+    """Construct a :class:`SingleFlight`.
+
+    :rtype: :class:`SingleFlight`
+
+    Concurrent calls made via :meth:`call` with the same key share a single call of the underlying function.  The
+    first caller makes the call while the others wait for and receive its result, or the exception it raised.
+
+    The ``shared`` attribute counts the calls which received the result of another caller's call.
+
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+        self._lock = Lock()
+
+    def call(self, key, f, *args, **kwargs):
+        """Call ``f`` with ``args`` and ``kwargs`` unless a call for ``key`` is already in flight.
+
+        :param str key: The key identifying identical calls, e.g., from :func:`get_cache_key`.
+        :param f: The function to call.
+        :return: The result of the call in flight for ``key``.
+
+        """
+        with self._lock:
+            event = self._calls.get(key)
+            if event is None:
+                event = self._calls[key] = Event()
+                event.result = event.error = None
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            event.wait()
+            if event.error is not None:
+                raise event.error
+            return event.result
+
+        try:
+            event.result = f(*args, **kwargs)
+        except Exception as e:
+            event.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            event.set()
+        return event.result
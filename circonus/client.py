@@ -5,22 +5,32 @@ circonus.client
 
 """
 
+from collections import OrderedDict
 from datetime import datetime
 from functools import wraps
+from multiprocessing.pool import ThreadPool
 from posixpath import sep as pathsep
+from threading import Lock
 from urlparse import SplitResult, urlunsplit
 
 import logging
-import json
 
-from circonus.annotation import Annotation
+from circonus.annotation import Annotation, AnnotationQueue
+from circonus.cache import SingleFlight, get_cache_key
 from circonus.collectd.cpu import get_cpu_graph_data
 from circonus.collectd.df import get_df_graph_data
 from circonus.collectd.graph import get_collectd_graph_data
 from circonus.collectd.memory import get_memory_graph_data
 from circonus.collectd.interface import get_interface_graph_data
-from circonus.tag import get_tags_with, get_telemetry_tag, is_taggable
+from circonus.instrument import RequestEvent
+from circonus.metric import get_json_object
+from circonus.stream import CHUNK_SIZE, JSONBody, dumps, get_item_count, iter_json_array
+from circonus.transfer import (ACCEPT_ENCODING, COMPRESS_LEVEL, COMPRESS_MIN_BYTES, CountedBody, GzipBody,
+                               TransferCounter, get_received_bytes, gzip_compress)
+from circonus.tag import TagWriter, get_tags_with, get_telemetry_tag, is_taggable
+from circonus.util import API_MAX_WORKERS, API_POOL_MAXSIZE, get_resource_from_cid, map_concurrently
 from requests import codes as status_codes
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 
 import requests
@@ -32,18 +42,63 @@ API_VERSION = 2
 API_BASE_SPLIT = SplitResult(scheme=API_PROTOCOL, netloc=API_LOCATION, path="/v%d" % API_VERSION, query="", fragment="")
 API_BASE_URL = urlunsplit(API_BASE_SPLIT)
 
+API_POOL_CONNECTIONS = 10
+"""The default number of connection pools to cache, i.e., the number of distinct hosts kept alive."""
+
+API_PAGE_SIZE = 1000
+"""The default number of resources to request per page when iterating over a resource collection."""
+
+API_STREAM_RESOURCE_TYPES = frozenset(["graph", "worksheet"])
+"""The resource types whose request bodies may be large enough to stream."""
+
+API_STREAM_MIN_ITEMS = 1000
+"""The default number of list items, e.g., graph datapoints, at which request bodies are streamed."""
+
 log = logging.getLogger(__name__)
 
 
-def get_api_url(resource_type_or_cid):
+def get_api_url(resource_type_or_cid, base_url=None):
     """Get a valid fully qualified Circonus API URL for the given resource type or ``cid``.
 
     :param str resource_type_or_cid: The resource type or ``cid`` representing a specific resource.
+    :param str base_url: (optional) The API base URL, e.g., ``http://127.0.0.1:8080/v2``.
     :return: The API URL.
     :rtype: :py:class:`str`
 
+    ``base_url`` defaults to :const:`API_BASE_URL`.
+
     """
-    return pathsep.join([API_BASE_URL, resource_type_or_cid.strip(pathsep)])
+    base_url = API_BASE_URL if base_url is None else base_url.rstrip(pathsep)
+    return pathsep.join([base_url, resource_type_or_cid.strip(pathsep)])
+
+
+def get_session(pool_connections=API_POOL_CONNECTIONS, pool_maxsize=API_POOL_MAXSIZE, pool_block=False,
+                keep_alive=True):
+    """Get a pooled :class:`requests.Session` for making Circonus API requests.
+
+    :param int pool_connections: (optional) The number of connection pools to cache.
+    :param int pool_maxsize: (optional) The maximum number of connections to keep alive per host.
+    :param bool pool_block: (optional) Block when no free connections are available rather than opening a new one.
+    :param bool keep_alive: (optional) Keep connections alive between requests.
+    :rtype: :class:`requests.Session`
+
+    Connections made by the returned session are reused, which avoids a new TCP and TLS handshake for every request.
+    The underlying :mod:`urllib3` connection pools are thread-safe so a single session may be shared by several
+    threads.  At most ``pool_maxsize`` connections per host are kept alive; if ``pool_block`` is :py:const:`True`
+    threads wait for a free connection instead of opening a connection that is discarded after use.
+
+    Compressed responses are requested with the ``Accept-Encoding`` header :const:`~circonus.transfer.ACCEPT_ENCODING`
+    and decoded transparently, including when they are streamed.
+
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
 
 
 def with_common_tags(f):
@@ -95,8 +150,53 @@ class CirconusClient(object):
     :param str api_app_name: The Circonus API application name.
     :param str api_token: The Circonus API token.
     :param list common_tags: (optional) The :py:class:`str` tags to apply to all resources.
+    :param int pool_connections: (optional) The number of connection pools to cache.
+    :param int pool_maxsize: (optional) The maximum number of connections to keep alive per host.
+    :param bool pool_block: (optional) Block when no free pooled connections are available.
+    :param bool keep_alive: (optional) Keep connections alive between requests.
+    :param cache: (optional) The cache used for :func:`get` requests.
+    :type cache: :class:`~circonus.cache.ResponseCache`
+    :param scheduler: (optional) The scheduler used to rate limit and retry requests.
+    :type scheduler: :class:`~circonus.scheduler.RequestScheduler`
+    :param bool coalesce: (optional) Share a single request between concurrent identical :func:`get` calls.
+    :param int stream_min_items: (optional) The number of list items at which request bodies are streamed.
+    :param bool compress: (optional) Compress large request bodies with gzip.
+    :param int compress_min_bytes: (optional) The request body size in bytes at which bodies are compressed.
+    :param int compress_level: (optional) The gzip compression level.
+    :param list instruments: (optional) The :class:`~circonus.instrument.Instrument` instances notified of requests.
+    :param str base_url: (optional) The API base URL, e.g., ``http://127.0.0.1:8080/v2``.
     :rtype: :class:`CirconusClient`
 
+    Every request is made with a pooled :class:`requests.Session` (see :func:`get_session`) which may be safely shared
+    by several threads.
+
+    If ``cache`` is given, successful :func:`get` responses are cached and served from it until they expire.  Stale
+    responses are revalidated with conditional requests when the API supports them.  Cached responses for a ``cid``
+    are invalidated when it is updated or deleted with this client.
+
+    If ``coalesce`` is :py:const:`True`, :func:`get` calls made by several threads at once for the same resource type
+    or ``cid`` and parameters share one in-flight request.  Every caller then receives the same
+    :class:`~requests.Response` object, which must therefore not be modified.
+
+    If ``scheduler`` is given, every request is made within its rate limit and retried on transient errors according
+    to its retry policy.
+
+    :func:`create` and :func:`update` request bodies for resource types in :const:`API_STREAM_RESOURCE_TYPES` with at
+    least ``stream_min_items`` list items, e.g., graphs with thousands of datapoints, are serialized as they are sent
+    with a :class:`~circonus.stream.JSONBody`.  Set ``stream_min_items`` to :py:const:`None` to never stream.
+
+    If ``compress`` is :py:const:`True`, :func:`create` and :func:`update` request bodies of at least
+    ``compress_min_bytes``, and every streamed body, are sent gzip encoded with a ``Content-Encoding`` header.
+    Responses are always requested compressed, see :func:`get_session`.  The ``transfer`` attribute is a
+    :class:`~circonus.transfer.TransferCounter` of the body bytes sent and received on the wire.
+
+    Each of ``instruments`` is called before and after every request with a :class:`~circonus.instrument.RequestEvent`
+    describing it, including :func:`get` calls served from ``cache``, e.g., a
+    :class:`~circonus.instrument.HistogramCollector` which tracks latency percentiles.
+
+    If ``base_url`` is given requests are made to it instead of :const:`API_BASE_URL`, e.g., to a Circonus Inside
+    installation or a :class:`~circonus.fake.FakeCirconusAPI` in tests.
+
     Usage::
 
         >>> from circonus import CirconusClient
@@ -111,7 +211,11 @@ class CirconusClient(object):
 
     """
 
-    def __init__(self, api_app_name, api_token, common_tags=None):
+    def __init__(self, api_app_name, api_token, common_tags=None, pool_connections=API_POOL_CONNECTIONS,
+                 pool_maxsize=API_POOL_MAXSIZE, pool_block=False, keep_alive=True, cache=None,
+                 scheduler=None, coalesce=False, stream_min_items=API_STREAM_MIN_ITEMS, compress=False,
+                 compress_min_bytes=COMPRESS_MIN_BYTES, compress_level=COMPRESS_LEVEL, instruments=None,
+                 base_url=None):
         self.api_app_name = api_app_name
         self.api_token = api_token
         self.api_headers = {
@@ -123,56 +227,319 @@ class CirconusClient(object):
             self.common_tags = []
         else:
             self.common_tags = common_tags
+        self.session = get_session(pool_connections, pool_maxsize, pool_block, keep_alive)
+        self.cache = cache
+        self.scheduler = scheduler
+        self.in_flight = SingleFlight() if coalesce else None
+        self.stream_min_items = stream_min_items
+        self.compress = compress
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_level = compress_level
+        self.transfer = TransferCounter()
+        self.instruments = [] if instruments is None else list(instruments)
+        self.base_url = API_BASE_URL if base_url is None else base_url.rstrip(pathsep)
+
+    def get_url(self, resource_type_or_cid):
+        """Get the fully qualified URL at :attr:`base_url` for the given resource type or ``cid``.
+
+        :param str resource_type_or_cid: The resource type or ``cid`` representing a specific resource.
+        :rtype: :py:class:`str`
+
+        """
+        return get_api_url(resource_type_or_cid, self.base_url)
+
+    def _get_body(self, resource_type_or_cid, data):
+        """Get the request body serializing ``data`` for the resource type or ``cid`` and its request headers.
+
+        :rtype: (:py:class:`str` or iterable, :py:class:`dict`)
+
+        """
+        if (self.stream_min_items is not None and
+                get_resource_from_cid(resource_type_or_cid) in API_STREAM_RESOURCE_TYPES and
+                get_item_count(data) >= self.stream_min_items):
+            body = JSONBody(data, default=get_json_object)
+            if not self.compress:
+                return body, self.api_headers
+            return GzipBody(body, self.compress_level), self.get_gzip_headers()
+
+        body = dumps(data, default=get_json_object)
+        if not self.compress or len(body) < self.compress_min_bytes:
+            return body, self.api_headers
+        return gzip_compress(body, self.compress_level), self.get_gzip_headers()
+
+    def _send(self, method, resource_type_or_cid, **kwargs):
+        """Make a request with :attr:`session` via :attr:`scheduler` if there is one.
+
+        :param str method: The :class:`requests.Session` method to make the request with, e.g., ``"get"``.
+        :param str resource_type_or_cid: The resource type or ``cid`` to make the request for.
+        :rtype: :class:`requests.Response`
+
+        Body bytes are added to :attr:`transfer` for each request made, including retries.  Streamed responses are
+        counted once they have been consumed.  :attr:`instruments` are notified before and after the request.
+
+        """
+        session_send = getattr(self.session, method)
+        event = RequestEvent(method.upper(), get_resource_from_cid(resource_type_or_cid))
+        attempts = [0]
+
+        def send(url, **kwargs):
+            if attempts[0]:
+                event.retries += 1
+            attempts[0] += 1
+            data = kwargs.get("data")
+            if isinstance(data, basestring):
+                self.transfer.add(sent=len(data))
+                event.add(sent=len(data))
+            elif data is not None:
+                kwargs["data"] = CountedBody(data, self.transfer, event)
+            r = session_send(url, **kwargs)
+            if not kwargs.get("stream"):
+                received = get_received_bytes(r)
+                self.transfer.add(received=received)
+                event.add(received=received)
+            return r
+
+        for instrument in self.instruments:
+            instrument.before_request(event)
+        try:
+            if self.scheduler is None:
+                r = send(self.get_url(resource_type_or_cid), **kwargs)
+            else:
+                r = self.scheduler.send(method, send, self.get_url(resource_type_or_cid), **kwargs)
+        except Exception as e:
+            event.finish(error=e)
+            raise
+        else:
+            event.finish(r.status_code)
+        finally:
+            for instrument in self.instruments:
+                instrument.after_request(event)
+        return r
+
+    def _hit(self, resource_type_or_cid, r):
+        """Notify :attr:`instruments` of a :func:`get` call served from :attr:`cache`.
+
+        :rtype: :class:`requests.Response`
+
+        """
+        if self.instruments:
+            event = RequestEvent("GET", get_resource_from_cid(resource_type_or_cid))
+            event.cache_hit = True
+            for instrument in self.instruments:
+                instrument.before_request(event)
+            event.finish(r.status_code)
+            for instrument in self.instruments:
+                instrument.after_request(event)
+        return r
+
+    def get_gzip_headers(self):
+        """Get the API headers of a request with a gzip encoded body.
+
+        :rtype: :py:class:`dict`
+
+        """
+        headers = dict(self.api_headers)
+        headers["Content-Encoding"] = "gzip"
+        return headers
+
+    def _get_cached(self, resource_type_or_cid, params):
+        """Get the resource at resource type or ``cid`` from :attr:`cache`, requesting it from the API if needed.
+
+        :rtype: :class:`requests.Response`
+
+        """
+        url = self.get_url(resource_type_or_cid)
+        key = get_cache_key(url, params)
+        resource_type = get_resource_from_cid(resource_type_or_cid)
+        r, validators = self.cache.lookup(key)
+        if r is not None:
+            return self._hit(resource_type_or_cid, r)
+
+        if validators:
+            headers = dict(self.api_headers)
+            headers.update(validators)
+            r = self._send("get", resource_type_or_cid, params=params, headers=headers)
+            if r.status_code == status_codes.NOT_MODIFIED:
+                cached = self.cache.refresh(key, resource_type)
+                if cached is not None:
+                    return cached
+                r = self._send("get", resource_type_or_cid, params=params, headers=self.api_headers)
+        else:
+            r = self._send("get", resource_type_or_cid, params=params, headers=self.api_headers)
+
+        if r.status_code == status_codes.OK:
+            self.cache.set(key, url, r, resource_type)
+        return r
+
+    def _get(self, resource_type_or_cid, params):
+        """Get the resource at resource type or ``cid`` from :attr:`cache` if there is one, otherwise the API.
+
+        :rtype: :class:`requests.Response`
+
+        """
+        if self.cache is not None:
+            return self._get_cached(resource_type_or_cid, params)
+        return self._send("get", resource_type_or_cid, params=params, headers=self.api_headers)
+
+    def _invalidate(self, cid):
+        """Remove cached responses for ``cid`` from :attr:`cache`."""
+        if self.cache is not None:
+            self.cache.invalidate(self.get_url(cid))
 
     @log_http_error
     def get(self, resource_type_or_cid, params=None):
-        """Get the resource at resource type or ``cid`` via :func:`requests.get`.
+        """Get the resource at resource type or ``cid`` via :meth:`requests.Session.get`.
 
         :param str resource_type_or_cid: The resource type or ``cid`` representing a specific resource.
-        :param dict params: (optional) The parameters to pass to :func:`requests.get`.
+        :param dict params: (optional) The parameters to pass to :meth:`requests.Session.get`.
         :rtype: :class:`requests.Response`
 
         If a resource type is given, e.g., ``/user``, a :py:class:`list` of resources will exist in the :class:`~requests.Response` JSON.
 
         If a ``cid`` is given, e.g., ``/check_bundle/123456``, a single resource will exist in the :class:`~requests.Response` JSON.
 
+        If the client has a :attr:`cache` the response may be served from it.  Concurrent identical calls share a
+        single request and :class:`~requests.Response` if the client was constructed with ``coalesce=True``.
+
         """
-        return requests.get(get_api_url(resource_type_or_cid), params=params, headers=self.api_headers)
+        if self.in_flight is None:
+            return self._get(resource_type_or_cid, params)
+        key = get_cache_key(self.get_url(resource_type_or_cid), params)
+        return self.in_flight.call(key, self._get, resource_type_or_cid, params)
+
+    @log_http_error
+    def get_stream(self, resource_type_or_cid, params=None):
+        """Get the resource at resource type or ``cid`` via :meth:`requests.Session.get` without reading the body.
+
+        :param str resource_type_or_cid: The resource type or ``cid`` representing a specific resource.
+        :param dict params: (optional) The parameters to pass to :meth:`requests.Session.get`.
+        :rtype: :class:`requests.Response`
+
+        The body of the returned :class:`~requests.Response` has not been read.  It should be consumed with
+        :meth:`~requests.Response.iter_content` and closed when done, e.g., by :func:`iter_json`.
+
+        """
+        return self._send("get", resource_type_or_cid, params=params, headers=self.api_headers, stream=True)
+
+    def iter_json(self, resource_type_or_cid, params=None, chunk_size=CHUNK_SIZE):
+        """Get a generator which incrementally decodes the resources at resource type or ``cid``.
+
+        :param str resource_type_or_cid: The resource type or ``cid`` representing a specific resource.
+        :param dict params: (optional) The parameters to pass to :func:`get_stream`.
+        :param int chunk_size: (optional) The number of bytes to read from the response at a time.
+        :rtype: generator(:py:class:`dict`)
+
+        The response body is read ``chunk_size`` bytes at a time and each resource in the :py:class:`list` returned for
+        a resource type is yielded as soon as it has been decoded, so peak memory is bounded by the largest resource
+        rather than the whole response.  A single resource is yielded once when a ``cid`` is given.
+
+        """
+        r = self.get_stream(resource_type_or_cid, params)
+        try:
+            for resource in iter_json_array(r.iter_content(chunk_size), r.encoding or "utf-8"):
+                yield resource
+        finally:
+            self.transfer.add(received=get_received_bytes(r))
+            r.close()
+
+    def iter_resources(self, resource_type, params=None, page_size=API_PAGE_SIZE, stream=False):
+        """Get a generator which yields each resource of resource type one at a time.
+
+        :param str resource_type: The resource type, e.g., ``/check_bundle``.
+        :param dict params: (optional) The parameters, e.g., filters, to pass to :func:`get`.
+        :param int page_size: (optional) The number of resources to request at a time.
+        :param bool stream: (optional) Decode each page incrementally via :func:`iter_json`.
+        :rtype: generator(:py:class:`dict`)
+
+        The collection is requested a page at a time with the ``size`` and ``offset`` parameters so that only one page
+        of resources is held in memory no matter how many resources exist.  If ``stream`` is :py:const:`True` only one
+        resource is held in memory at a time.  Iteration stops after the first page containing fewer than
+        ``page_size`` resources.
+
+        """
+        page_params = {} if params is None else dict(params)
+        offset = 0
+        while True:
+            page_params.update({"size": page_size, "offset": offset})
+            if stream:
+                page = self.iter_json(resource_type, page_params)
+            else:
+                page = self.get(resource_type, page_params).json()
+            count = 0
+            for resource in page:
+                count += 1
+                yield resource
+            if count < page_size:
+                break
+            offset += count
 
     @log_http_error
     def delete(self, cid, params=None):
-        """Delete the resource at ``cid`` via :func:`requests.delete`.
+        """Delete the resource at ``cid`` via :meth:`requests.Session.delete`.
 
         :param str cid: The resource to delete.
-        :param dict params: (optional) The parameters to pass to :func:`requests.delete`.
+        :param dict params: (optional) The parameters to pass to :meth:`requests.Session.delete`.
         :rtype: :class:`requests.Response`
 
         """
-        return requests.delete(get_api_url(cid), params=params, headers=self.api_headers)
+        r = self._send("delete", cid, params=params, headers=self.api_headers)
+        self._invalidate(cid)
+        return r
 
     @with_common_tags
     @log_http_error
     def update(self, cid, data):
-        """Update the resource at ``cid`` with ``data`` via :func:`requests.put`.
+        """Update the resource at ``cid`` with ``data`` via :meth:`requests.Session.put`.
 
         :param str cid: The resource to update.
         :param dict data: The data used to update the resource.
         :rtype: :class:`requests.Response`
 
         """
-        return requests.put(get_api_url(cid), data=json.dumps(data), headers=self.api_headers)
+        body, headers = self._get_body(cid, data)
+        r = self._send("put", cid, data=body, headers=headers)
+        self._invalidate(cid)
+        return r
 
     @with_common_tags
     @log_http_error
     def create(self, resource_type, data):
-        """Create the resource type with ``data`` via :func:`requests.post`.
+        """Create the resource type with ``data`` via :meth:`requests.Session.post`.
 
         :param str resource_type: The resource type to create.
         :param dict data: The data used to create the resource.
         :rtype: :class:`requests.Response`
 
         """
-        return requests.post(get_api_url(resource_type), data=json.dumps(data), headers=self.api_headers)
+        body, headers = self._get_body(resource_type, data)
+        return self._send("post", resource_type, data=body, headers=headers)
+
+    def create_many(self, resource_type, data, max_workers=API_MAX_WORKERS):
+        """Create several resources of resource type concurrently via :func:`create`.
+
+        :param str resource_type: The resource type to create.
+        :param data: The iterable of :py:class:`dict` instances used to create each resource.
+        :param int max_workers: (optional) The maximum number of concurrent requests.
+        :rtype: :py:class:`list`
+
+        The returned list contains a :class:`requests.Response` for each item in ``data``, in order.  If creating an
+        item failed the :class:`~requests.exceptions.RequestException` raised is in its place instead.
+
+        """
+        return map_concurrently(self.create, ((resource_type, d) for d in data), max_workers)
+
+    def update_many(self, cid_data_pairs, max_workers=API_MAX_WORKERS):
+        """Update several resources concurrently via :func:`update`.
+
+        :param cid_data_pairs: The iterable of (``cid``, ``data``) :py:class:`tuple` instances to update.
+        :param int max_workers: (optional) The maximum number of concurrent requests.
+        :rtype: :py:class:`list`
+
+        The returned list contains a :class:`requests.Response` for each item in ``cid_data_pairs``, in order.  If
+        updating an item failed the :class:`~requests.exceptions.RequestException` raised is in its place instead.
+
+        """
+        return map_concurrently(self.update, cid_data_pairs, max_workers)
 
     def update_with_tags(self, cid, new_tags):
         """Update the resource at ``cid`` to have ``new_tags`` added to it via :func:`update`.
@@ -193,6 +560,15 @@ class CirconusClient(object):
                 r = self.update(cid, {"tags": tags})
         return r
 
+    def tag_batch(self, max_workers=API_MAX_WORKERS):
+        """Context manager for batching tag updates with a :class:`~circonus.tag.TagWriter`.
+
+        :param int max_workers: (optional) The maximum number of resources to update concurrently.
+        :rtype: :class:`~circonus.tag.TagWriter`
+
+        """
+        return TagWriter(self, max_workers)
+
     def annotation(self, title, category, description="", rel_metrics=None):
         """Context manager and decorator for creating :class:`~circonus.annotation.Annotation` instances.
 
@@ -209,6 +585,16 @@ class CirconusClient(object):
         """
         return Annotation(self, title, category, description, rel_metrics)
 
+    def annotation_queue(self, **kwargs):
+        """Get an :class:`~circonus.annotation.AnnotationQueue` which creates annotations with this client in the
+        background.
+
+        :param kwargs: (optional) The keyword arguments to pass to :class:`~circonus.annotation.AnnotationQueue`.
+        :rtype: :class:`~circonus.annotation.AnnotationQueue`
+
+        """
+        return AnnotationQueue(self, **kwargs)
+
     def create_annotation(self, title, category, start=None, stop=None, description="", rel_metrics=None):
         """Create an :class:`~circonus.annotation.Annotation` instance immediately.
 
@@ -235,67 +621,77 @@ class CirconusClient(object):
         a.create()
         return a
 
-    def create_collectd_cpu_graph(self, check_bundle, title=None):
+    def create_collectd_cpu_graph(self, check_bundle, title=None, compact=True):
         """Create a CPU graph from the ``collectd`` ``check_bundle``.
 
         :param dict check_bundle: The check bundle to create a graph for.
         :param str title: (optional) The title to use for the graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records,
+            which use less memory and are serialized when the request is made.
         :rtype: :class:`requests.Response` or :py:const:`None`
 
         :py:const:`None` is returned if no data to create the graph could be found in ``check_bundle``.
 
         """
-        data = get_cpu_graph_data(check_bundle, title)
+        data = get_cpu_graph_data(check_bundle, title, compact=compact)
         return self.create("graph", data) if data else None
 
-    def create_collectd_memory_graph(self, check_bundle, title=None):
+    def create_collectd_memory_graph(self, check_bundle, title=None, compact=True):
         """Create a memory graph from the ``collectd`` ``check_bundle``.
 
         :param dict check_bundle: The check bundle to create a graph for.
         :param str title: (optional) The title to use for the graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records,
+            which use less memory and are serialized when the request is made.
         :rtype: :class:`requests.Response` or :py:const:`None`
 
         :py:const:`None` is returned if no data to create the graph could be found in ``check_bundle``.
 
         """
-        data = get_memory_graph_data(check_bundle, title)
+        data = get_memory_graph_data(check_bundle, title, compact=compact)
         return self.create("graph", data) if data else None
 
-    def create_collectd_interface_graph(self, check_bundle, interface_name="eth0", title=None):
+    def create_collectd_interface_graph(self, check_bundle, interface_name="eth0", title=None, compact=True):
         """Create an interface graph from the ``collectd`` ``check_bundle``.
 
         :param dict check_bundle: The check bundle to create a graph for.
         :param str interface_name: (optional) The interface name, e.g., "eth0".
         :param str title: (optional) The title to use for the graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records,
+            which use less memory and are serialized when the request is made.
         :rtype: :class:`requests.Response` or :py:const:`None`
 
         :py:const:`None` is returned if no data to create the graph could be found in ``check_bundle``.
 
         """
-        data = get_interface_graph_data(check_bundle, interface_name, title)
+        data = get_interface_graph_data(check_bundle, interface_name, title, compact=compact)
         return self.create("graph", data) if data else None
 
-    def create_collectd_df_graph(self, check_bundle, mount_dir, title=None):
+    def create_collectd_df_graph(self, check_bundle, mount_dir, title=None, compact=True):
         """Create a disk free graph from the ``collectd`` ``check_bundle`` for ``mount_dir`` on ``target``.
 
         :param dict check_bundle: The check bundle to create a graph for.
         :param str mount_dir: The mount directory to create the graph for.
         :param str title: (optional) The title to use for the graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records,
+            which use less memory and are serialized when the request is made.
         :rtype: :class:`requests.Response` or :py:const:`None`
 
         :py:const:`None` is returned if no data to create the graph could be found in ``check_bundle``.
 
         """
-        data = get_df_graph_data(check_bundle, mount_dir, title)
+        data = get_df_graph_data(check_bundle, mount_dir, title, compact=compact)
         return self.create("graph", data) if data else None
 
-    def create_collectd_graphs(self, check_bundle, interface_names=None, mount_dirs=None, titles=None):
+    def create_collectd_graphs(self, check_bundle, interface_names=None, mount_dirs=None, titles=None, compact=True):
         """Create several graphs from the ``collectd`` ``check_bundle``.
 
         :param dict check_bundle: The check bundle to create graphs for.
         :param list interface_name: (optional) The interface names to create ``interface`` graphs for, e.g., ``["eth0"]``.
         :param list mount_dirs: (optional) The mount directories to create ``df`` graphs for, e.g., ``["/root", "/mnt"]``.
         :param dict titles: (optional) The titles to use for each graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records,
+            which use less memory and are serialized when the request is made.
         :rtype: (:py:class:`bool`, :py:class:`list`)
 
         ``mount_dirs`` should be a :py:class:`list` of directories where devices are mounted.  ``df`` graphs will be
@@ -304,6 +700,9 @@ class CirconusClient(object):
         ``interface_names`` should be a :py:class:`list` of network interface device names.  ``interface`` graphs will
         be created for each.
 
+        If ``interface_names`` or ``mount_dirs`` are not given, graphs are created for every interface or mount
+        directory found in ``check_bundle``, see :func:`~circonus.collectd.graph.get_collectd_graph_data`.
+
         ``titles`` should be a :py:class:`dict` instance mapping a key representing the ``collectd`` plugin name to a
         title for the graph representing it.  For example::
 
@@ -313,21 +712,379 @@ class CirconusClient(object):
         along with a :py:class:`list` of :class:`requests.Response` instances for requests made.
 
         """
-        if mount_dirs is None:
-            mount_dirs = ["root"]
-
-        if interface_names is None:
-            interface_names = ["eth0"]
-
         if titles is None:
             titles = {}
 
         responses = []
         try:
-            graph_data = get_collectd_graph_data(check_bundle, interface_names, mount_dirs, titles=titles)
+            graph_data = get_collectd_graph_data(check_bundle, interface_names, mount_dirs, titles, compact)
             for d in graph_data:
                 responses.append(self.create("graph", d))
         except HTTPError as e:
             log.error("collectd graphs could not be created: %s", e)
 
         return responses and all([status_codes.OK == r.status_code for r in responses]), responses
+
+
+class AsyncCirconusClient(object):
+    """Construct an :class:`AsyncCirconusClient`.
+
+    :param str api_app_name: The Circonus API application name.
+    :param str api_token: The Circonus API token.
+    :param list common_tags: (optional) The :py:class:`str` tags to apply to all resources.
+    :param int max_workers: (optional) The maximum number of concurrent requests.
+    :param pool: (optional) The pool of worker threads to make requests on instead of a new one.
+    :type pool: :class:`multiprocessing.pool.ThreadPool`
+    :param kwargs: (optional) Any other keyword arguments to pass to :class:`CirconusClient`.
+    :rtype: :class:`AsyncCirconusClient`
+
+    An :class:`AsyncCirconusClient` has the same methods as :class:`CirconusClient` but each one returns immediately
+    with a :class:`multiprocessing.pool.AsyncResult`.  The request is made by a :class:`CirconusClient` on a bounded
+    pool of worker threads that share its pooled session, so hundreds of requests may be fanned out without a thread
+    per request.  Calling :meth:`~multiprocessing.pool.AsyncResult.get` on the result waits for the request and either
+    returns what the equivalent :class:`CirconusClient` method would have or raises the same exception.
+
+    A ``pool`` which is given may be shared with other clients, e.g., by :class:`MultiCirconusClient`, and is not
+    closed by :meth:`close`.
+
+    Usage::
+
+        >>> from circonus import AsyncCirconusClient
+        >>> with AsyncCirconusClient("my-circonus-app", "generated-by-circonus-ui") as circonus:
+        ...     results = [circonus.get(cid) for cid in ["/graph/1", "/graph/2"]]
+        ...     graphs = [r.get().json() for r in results]
+
+    """
+
+    def __init__(self, api_app_name, api_token, common_tags=None, max_workers=API_MAX_WORKERS, pool=None, **kwargs):
+        self.client = CirconusClient(api_app_name, api_token, common_tags, **kwargs)
+        self.shared_pool = pool is not None
+        self.pool = pool if self.shared_pool else ThreadPool(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def api_headers(self):
+        return self.client.api_headers
+
+    @property
+    def common_tags(self):
+        return self.client.common_tags
+
+    def _submit(self, f, *args):
+        """Call ``f`` with ``args`` on the worker pool.
+
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self.pool.apply_async(f, args)
+
+    @property
+    def base_url(self):
+        return self.client.base_url
+
+    def close(self):
+        """Wait for outstanding requests to finish and stop the worker threads unless the pool is shared."""
+        if not self.shared_pool:
+            self.pool.close()
+            self.pool.join()
+
+    def get(self, resource_type_or_cid, params=None):
+        """Get the resource at resource type or ``cid`` via :meth:`CirconusClient.get`.
+
+        :param str resource_type_or_cid: The resource type or ``cid`` representing a specific resource.
+        :param dict params: (optional) The parameters to pass to :meth:`requests.Session.get`.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self._submit(self.client.get, resource_type_or_cid, params)
+
+    def delete(self, cid, params=None):
+        """Delete the resource at ``cid`` via :meth:`CirconusClient.delete`.
+
+        :param str cid: The resource to delete.
+        :param dict params: (optional) The parameters to pass to :meth:`requests.Session.delete`.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self._submit(self.client.delete, cid, params)
+
+    def update(self, cid, data):
+        """Update the resource at ``cid`` with ``data`` via :meth:`CirconusClient.update`.
+
+        :param str cid: The resource to update.
+        :param dict data: The data used to update the resource.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self._submit(self.client.update, cid, data)
+
+    def create(self, resource_type, data):
+        """Create the resource type with ``data`` via :meth:`CirconusClient.create`.
+
+        :param str resource_type: The resource type to create.
+        :param dict data: The data used to create the resource.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self._submit(self.client.create, resource_type, data)
+
+    def update_with_tags(self, cid, new_tags):
+        """Update the resource at ``cid`` to have ``new_tags`` added to it via :meth:`CirconusClient.update_with_tags`.
+
+        :param str cid: The resource to update.
+        :param list new_tags: The :py:class:`str` tags to add to the resource.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self._submit(self.client.update_with_tags, cid, new_tags)
+
+    def annotation(self, title, category, description="", rel_metrics=None):
+        """Context manager and decorator for creating :class:`~circonus.annotation.Annotation` instances.
+
+        :param str title: The title.
+        :param str category: The category.
+        :param str description: (optional) The description.
+        :param list rel_metrics: (optional) The :py:class:`str` names of metrics related to this annotation.
+        :rtype: :class:`~circonus.annotation.Annotation`
+
+        The annotation is created without waiting for the request to finish.  Its ``response`` attribute is a
+        :class:`multiprocessing.pool.AsyncResult`.
+
+        """
+        return Annotation(self, title, category, description, rel_metrics)
+
+    def create_annotation(self, title, category, start=None, stop=None, description="", rel_metrics=None):
+        """Create an :class:`~circonus.annotation.Annotation` via :meth:`CirconusClient.create_annotation`.
+
+        :param str title: The title.
+        :param str category: The category.
+        :param datetime.datetime start: (optional) The start time.
+        :param datetime.datetime stop: (optional) The stop time.
+        :param str description: (optional) The description.
+        :param list rel_metrics: (optional) The :py:class:`str` names of metrics related to this annotation.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        ``start`` defaults to the time this method is called rather than the time the request is made.
+
+        """
+        start = datetime.utcnow() if start is None else start
+        return self._submit(self.client.create_annotation, title, category, start, stop, description, rel_metrics)
+
+    def create_collectd_cpu_graph(self, check_bundle, title=None, compact=True):
+        """Create a CPU graph via :meth:`CirconusClient.create_collectd_cpu_graph`.
+
+        :param dict check_bundle: The check bundle to create a graph for.
+        :param str title: (optional) The title to use for the graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self._submit(self.client.create_collectd_cpu_graph, check_bundle, title, compact)
+
+    def create_collectd_memory_graph(self, check_bundle, title=None, compact=True):
+        """Create a memory graph via :meth:`CirconusClient.create_collectd_memory_graph`.
+
+        :param dict check_bundle: The check bundle to create a graph for.
+        :param str title: (optional) The title to use for the graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self._submit(self.client.create_collectd_memory_graph, check_bundle, title, compact)
+
+    def create_collectd_interface_graph(self, check_bundle, interface_name="eth0", title=None, compact=True):
+        """Create an interface graph via :meth:`CirconusClient.create_collectd_interface_graph`.
+
+        :param dict check_bundle: The check bundle to create a graph for.
+        :param str interface_name: (optional) The interface name, e.g., "eth0".
+        :param str title: (optional) The title to use for the graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self._submit(self.client.create_collectd_interface_graph, check_bundle, interface_name, title,
+                            compact)
+
+    def create_collectd_df_graph(self, check_bundle, mount_dir, title=None, compact=True):
+        """Create a disk free graph via :meth:`CirconusClient.create_collectd_df_graph`.
+
+        :param dict check_bundle: The check bundle to create a graph for.
+        :param str mount_dir: The mount directory to create the graph for.
+        :param str title: (optional) The title to use for the graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self._submit(self.client.create_collectd_df_graph, check_bundle, mount_dir, title, compact)
+
+    def create_collectd_graphs(self, check_bundle, interface_names=None, mount_dirs=None, titles=None, compact=True):
+        """Create several graphs via :meth:`CirconusClient.create_collectd_graphs`.
+
+        :param dict check_bundle: The check bundle to create graphs for.
+        :param list interface_name: (optional) The interface names to create ``interface`` graphs for.
+        :param list mount_dirs: (optional) The mount directories to create ``df`` graphs for.
+        :param dict titles: (optional) The titles to use for each graph.
+        :param bool compact: (optional) Build graph data with compact :class:`~circonus.metric.Datapoint` records.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        If ``interface_names`` or ``mount_dirs`` are not given, graphs are created for every interface or mount
+        directory found in ``check_bundle``.
+
+        """
+        return self._submit(self.client.create_collectd_graphs, check_bundle, interface_names, mount_dirs, titles,
+                            compact)
+
+
+class MultiCirconusClient(object):
+    """Construct a :class:`MultiCirconusClient`.
+
+    :param dict endpoints: (optional) The keyword arguments to construct each account's client with by account.
+    :param int max_workers: (optional) The maximum number of concurrent requests across every account.
+    :rtype: :class:`MultiCirconusClient`
+
+    A :class:`MultiCirconusClient` routes requests to several Circonus API endpoints, e.g., the hosted API and a
+    Circonus Inside installation, or the accounts of several regions, by account name.  Each account has an
+    :class:`AsyncCirconusClient` with its own ``base_url``, credentials and connection pool, while requests for every
+    account are made on one shared pool of worker threads.  No global state is modified, so accounts may be added and
+    used by several threads at once.
+
+    ``endpoints`` maps each account name to the keyword arguments of :meth:`add_endpoint`, which must include
+    ``api_app_name`` and ``api_token``.
+
+    Usage::
+
+        >>> from circonus import MultiCirconusClient
+        >>> endpoints = {"us": {"api_app_name": "my-circonus-app", "api_token": "generated-by-circonus-ui"},
+        ...              "inside": {"api_app_name": "my-circonus-app", "api_token": "generated-by-circonus-inside",
+        ...                         "base_url": "https://circonus.example.com/v2"}}
+        >>> with MultiCirconusClient(endpoints) as circonus:
+        ...     results = circonus.get_all("/check_bundle")
+        ...     check_bundles = {account: r.get().json() for account, r in results.items()}
+        ...     graph = circonus["inside"].get("/graph/1").get().json()
+
+    """
+
+    def __init__(self, endpoints=None, max_workers=API_MAX_WORKERS):
+        self.pool = ThreadPool(max_workers)
+        self.clients = OrderedDict()
+        self._lock = Lock()
+        for account, kwargs in (endpoints or {}).iteritems():
+            self.add_endpoint(account, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, account):
+        return account in self.clients
+
+    def __getitem__(self, account):
+        """Get the client for ``account``.
+
+        :param str account: The account name.
+        :rtype: :class:`AsyncCirconusClient`
+        :raises: :py:exc:`KeyError` if there is no endpoint for ``account``.
+
+        """
+        return self.clients[account]
+
+    @property
+    def accounts(self):
+        """The account names in the order their endpoints were added."""
+        with self._lock:
+            return list(self.clients)
+
+    def add_endpoint(self, account, api_app_name, api_token, common_tags=None, **kwargs):
+        """Add the endpoint for ``account``.
+
+        :param str account: The account name, e.g., ``"eu"``.
+        :param str api_app_name: The Circonus API application name.
+        :param str api_token: The Circonus API token.
+        :param list common_tags: (optional) The :py:class:`str` tags to apply to all resources.
+        :param kwargs: (optional) Any other keyword arguments to pass to :class:`CirconusClient`, e.g., ``base_url``.
+        :rtype: :class:`AsyncCirconusClient`
+
+        An existing endpoint for ``account`` is replaced and its connection pool is closed.
+
+        """
+        async_client = AsyncCirconusClient(api_app_name, api_token, common_tags, pool=self.pool, **kwargs)
+        with self._lock:
+            replaced = self.clients.get(account)
+            self.clients[account] = async_client
+        if replaced is not None:
+            replaced.close()
+            replaced.client.session.close()
+        return async_client
+
+    def close(self):
+        """Wait for outstanding requests to finish, stop the worker threads and close every connection pool."""
+        self.pool.close()
+        self.pool.join()
+        with self._lock:
+            clients = self.clients.values()
+        for async_client in clients:
+            async_client.client.session.close()
+
+    def get(self, account, resource_type_or_cid, params=None):
+        """Get the resource at resource type or ``cid`` from ``account`` via :meth:`CirconusClient.get`.
+
+        :param str account: The account name.
+        :param str resource_type_or_cid: The resource type or ``cid`` representing a specific resource.
+        :param dict params: (optional) The parameters to pass to :meth:`requests.Session.get`.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self[account].get(resource_type_or_cid, params)
+
+    def get_all(self, resource_type_or_cid, params=None):
+        """Get the resource at resource type or ``cid`` from every account concurrently.
+
+        :param str resource_type_or_cid: The resource type or ``cid`` representing a specific resource.
+        :param dict params: (optional) The parameters to pass to :meth:`requests.Session.get`.
+        :rtype: :class:`collections.OrderedDict`
+
+        The returned :class:`~collections.OrderedDict` maps each account name to a
+        :class:`multiprocessing.pool.AsyncResult`.
+
+        """
+        return OrderedDict((account, self.get(account, resource_type_or_cid, params)) for account in self.accounts)
+
+    def delete(self, account, cid, params=None):
+        """Delete the resource at ``cid`` from ``account`` via :meth:`CirconusClient.delete`.
+
+        :param str account: The account name.
+        :param str cid: The resource to delete.
+        :param dict params: (optional) The parameters to pass to :meth:`requests.Session.delete`.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self[account].delete(cid, params)
+
+    def update(self, account, cid, data):
+        """Update the resource at ``cid`` of ``account`` with ``data`` via :meth:`CirconusClient.update`.
+
+        :param str account: The account name.
+        :param str cid: The resource to update.
+        :param dict data: The data used to update the resource.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self[account].update(cid, data)
+
+    def create(self, account, resource_type, data):
+        """Create the resource type with ``data`` in ``account`` via :meth:`CirconusClient.create`.
+
+        :param str account: The account name.
+        :param str resource_type: The resource type to create.
+        :param dict data: The data used to create the resource.
+        :rtype: :class:`multiprocessing.pool.AsyncResult`
+
+        """
+        return self[account].create(resource_type, data)
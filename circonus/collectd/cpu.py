@@ -8,14 +8,13 @@ metrics.
 
 """
 
-from collections import OrderedDict
-from copy import deepcopy
 from itertools import chain
 
 import re
 
+from circonus.collectd.index import get_metric_index
 from circonus.graph import get_graph_data
-from circonus.metric import get_datapoints, get_metrics, get_metrics_sorted_by_suffix
+from circonus.metric import MetricView, get_datapoints, get_metrics_sorted_by_suffix, get_suffix_ranks
 from circonus.util import get_check_id_from_cid
 
 
@@ -26,6 +25,9 @@ This list is used to filter and sort metrics in preparation for creating a graph
 
 """
 
+CPU_METRIC_SUFFIX_RANKS = get_suffix_ranks(CPU_METRIC_SUFFIXES)
+"""Map of each metric suffix to its rank in :const:`~circonus.collectd.cpu.CPU_METRIC_SUFFIXES`."""
+
 CPU_METRIC_RE = re.compile(r"""
 ^cpu                            # Starts with "cpu"
 `.*`                            # Anything in between
@@ -65,13 +67,15 @@ def get_cpu_metrics(metrics):
     #. Name, ascending
     #. Explicit suffix, i.e., :const:`~circonus.collectd.cpu.CPU_METRIC_SUFFIXES`
 
+    Metrics are grouped by CPU in a single pass so the time taken is linear in the number of metrics.
+
     """
-    cpus = _get_cpus(metrics)
-    cpu_metrics = OrderedDict.fromkeys(cpus)
-    for cpu in cpus:
-        cpu_metrics[cpu] = get_metrics_sorted_by_suffix((m for m in metrics if m["name"].startswith(cpu)),
-                                                        CPU_METRIC_SUFFIXES)
-    return list(chain.from_iterable(cpu_metrics.values()))
+    cpu_metrics = {}
+    for m in metrics:
+        cpu_metrics.setdefault(m["name"].rpartition("cpu")[0], []).append(m)
+    return list(chain.from_iterable(get_metrics_sorted_by_suffix(cpu_metrics[cpu], CPU_METRIC_SUFFIXES,
+                                                                 CPU_METRIC_SUFFIX_RANKS)
+                                    for cpu in sorted(cpu_metrics)))
 
 
 def get_stacked_cpu_metrics(metrics, hide_idle=True):
@@ -79,41 +83,48 @@ def get_stacked_cpu_metrics(metrics, hide_idle=True):
 
     :param list metrics: The metrics to stack.
     :param bool hide_idle: (optional) Hide CPU idle.
-    :rtype: :py:class:`list`
+    :rtype: :py:class:`list` of :class:`~circonus.metric.MetricView`
 
     Each CPU will be added to a stack group equal to that CPU's number.  CPU idle metrics are hidden by default.
     ``metrics`` is not modified by this function.
 
     """
-    stacked_metrics = deepcopy(metrics)
-    for m in stacked_metrics:
-        match = CPU_NUMBER_RE.match(m["name"])
-        m["stack"] = int(match.group("number"))
+    stacked_metrics = []
+    for m in metrics:
+        stack = int(CPU_NUMBER_RE.match(m["name"]).group("number"))
         if hide_idle and m["name"].endswith("idle"):
-            m["hidden"] = True
+            stacked_metrics.append(MetricView(m, stack=stack, hidden=True))
+        else:
+            stacked_metrics.append(MetricView(m, stack=stack))
     return stacked_metrics
 
 
-def get_cpu_datapoints(check_bundle, metrics):
+def get_cpu_datapoints(check_bundle, metrics, compact=False):
     """Get a list of datapoints from *sorted* ``metrics``.
 
     :param dict check_bundle: The check bundle.
     :param list metrics: Sorted CPU metrics.
+    :param bool compact: (optional) Create compact :class:`~circonus.metric.Datapoint` records instead of
+        :py:class:`dict` datapoints, see :func:`~circonus.metric.get_datapoints`.
     :rtype: :py:class`list`
 
     """
     datapoints = []
     for cid in check_bundle.get("_checks", []):
         check_id = get_check_id_from_cid(cid)
-        datapoints.extend(get_datapoints(check_id, metrics, {"derive": "counter"}))
+        datapoints.extend(get_datapoints(check_id, metrics, {"derive": "counter"}, compact=compact))
     return datapoints
 
 
-def get_cpu_graph_data(check_bundle, title=None):
+def get_cpu_graph_data(check_bundle, title=None, index=None, compact=False):
     """Get graph data for ``check_bundle``.
 
     :param dict check_bundle: The check bundle to create graph data with.
     :param str title: (optional) The title to use for the graph.
+    :param index: (optional) The index of ``check_bundle`` metrics.
+    :type index: :class:`~circonus.collectd.index.MetricIndex`
+    :param bool compact: (optional) Create compact :class:`~circonus.metric.Datapoint` records instead of
+        :py:class:`dict` datapoints, see :func:`~circonus.metric.get_datapoints`.
     :rtype: :py:class:`dict`
 
     ``title`` defaults to using ``check_bundle["target"]``.
@@ -123,10 +134,11 @@ def get_cpu_graph_data(check_bundle, title=None):
 
     """
     data = {}
-    metrics = get_cpu_metrics(get_metrics(check_bundle, CPU_METRIC_RE))
+    metrics = get_cpu_metrics([m for m in get_metric_index(check_bundle, index).get_metrics("cpu")
+                               if CPU_METRIC_RE.match(m["name"])])
     if metrics:
         stacked_metrics = get_stacked_cpu_metrics(metrics)
-        datapoints = get_cpu_datapoints(check_bundle, stacked_metrics)
+        datapoints = get_cpu_datapoints(check_bundle, stacked_metrics, compact)
         graph_title = title if title else "%s cpu" % check_bundle["target"]
         custom_data = {"title": graph_title, "max_left_y": 100}
         data = get_graph_data(check_bundle, datapoints, custom_data)
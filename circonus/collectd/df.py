@@ -14,6 +14,7 @@ from string import punctuation
 
 import re
 
+from circonus.collectd.index import get_metric_index
 from circonus.graph import get_graph_data
 from circonus.metric import get_datapoints, get_metrics_sorted_by_suffix
 from circonus.util import get_check_id_from_cid
@@ -37,6 +38,20 @@ DF_METRIC_RE = re.compile(r"""
 PUNCTUATION_TABLE = {ord(c): None for c in punctuation}
 
 
+def normalize_mount_dir(mount_dir):
+    """Normalize ``mount_dir`` for comparison by removing all punctuation.
+
+    :param str mount_dir: The mount directory, or the ``collectd`` representation of it.
+    :rtype: :py:class:`unicode`
+
+    ``mount_dir`` is coerced with :py:func:`unicode` before translation because :mod:`requests` encodes responses in
+    UTF-8 by default and Python has different signatures for the function :py:func:`string.translate` and the method
+    :py:meth:`str.translate` method.
+
+    """
+    return unicode(mount_dir).translate(PUNCTUATION_TABLE)
+
+
 def is_mount_dir(metric_name, mount_dir):
     """Is ``metric_name`` the ``collectd`` representation of ``mount_dir``?
 
@@ -44,20 +59,61 @@ def is_mount_dir(metric_name, mount_dir):
     ``collectd`` mount directory was a ``/`` or a ``-`` on the host, e.g., a mount directory may be ``/mnt/solr-home``
     and the metric name representing it may be ``df`mnt-solr-home`df_complex`free``.
 
-    This function takes a naïve approach and removes all punctuation from both directory names before comparing them.
-
-    Both directory names are coerced with :py:func:`unicode` before translation because :mod:`requests` encodes
-    responses in UTF-8 by default and Python has different signatures for the function :py:func:`string.translate` and
-    the method :py:meth:`str.translate` method.
+    This function takes a naïve approach and removes all punctuation from both directory names with
+    :func:`normalize_mount_dir` before comparing them.
 
     """
     split_metric_name = metric_name.split("`")
     if len(split_metric_name) > 1:
-        return (unicode(split_metric_name[1]).translate(PUNCTUATION_TABLE) ==
-                unicode(mount_dir).translate(PUNCTUATION_TABLE))
+        return normalize_mount_dir(split_metric_name[1]) == normalize_mount_dir(mount_dir)
     return False
 
 
+class MountIndex(object):
+    """Construct a :class:`MountIndex`.
+
+    :param list metrics: The metrics to index.
+    :rtype: :class:`MountIndex`
+
+    Disk free metrics are indexed by their normalized mount directory, see :func:`normalize_mount_dir`, so that the
+    metrics of each of N mount directories can be looked up in M metrics with O(M + N) rather than O(N × M)
+    comparisons.  Lookups return metrics in the order of ``metrics``.
+
+    """
+
+    def __init__(self, metrics):
+        self._metrics = {}
+        for m in metrics:
+            if DF_METRIC_RE.match(m["name"]):
+                mount_dir = normalize_mount_dir(m["name"].split("`")[1])
+                self._metrics.setdefault(mount_dir, []).append(m)
+
+    def __len__(self):
+        return len(self._metrics)
+
+    def get_metrics(self, mount_dir):
+        """Get the disk free metrics for ``mount_dir``.
+
+        :param str mount_dir: The mount directory, e.g., ``"/mnt/solr-home"``.
+        :rtype: :py:class:`list`
+
+        """
+        return list(self._metrics.get(normalize_mount_dir(mount_dir), []))
+
+
+def get_mount_index(index):
+    """Get the :class:`MountIndex` of the disk free metrics in ``index``.
+
+    :param index: The index of check bundle metrics.
+    :type index: :class:`~circonus.collectd.index.MetricIndex`
+    :rtype: :class:`MountIndex`
+
+    The mount index is built once per ``index`` with :meth:`~circonus.collectd.index.MetricIndex.get_view`.
+
+    """
+    return index.get_view("df", lambda i: MountIndex(i.get_metrics("df")))
+
+
 def get_df_metrics(metrics, mount_dir):
     """Get disk free metrics from ``metrics`` for ``mount_dir``.
 
@@ -65,8 +121,24 @@ def get_df_metrics(metrics, mount_dir):
     :param str mount_dir: The mount directory to get metrics for.
     :rtype: :py:class:`list`
 
+    Use :func:`get_mount_index` to get the metrics of several mount directories from the same metrics.
+
+    """
+    return MountIndex(metrics).get_metrics(mount_dir)
+
+
+def get_mount_dirs(index):
+    """Get the ``collectd`` representation of each mount directory with disk free metrics in ``index``.
+
+    :param index: The index of check bundle metrics.
+    :type index: :class:`~circonus.collectd.index.MetricIndex`
+    :rtype: :py:class:`list`
+
+    The mount directories are sorted and use ``collectd``'s representation, e.g., ``mnt-solr-home``, which matches the
+    original mount directory via :func:`is_mount_dir`.
+
     """
-    return [m for m in metrics if DF_METRIC_RE.match(m["name"]) and is_mount_dir(m["name"], mount_dir)]
+    return sorted({name.plugin_instance for name, m in index.get_entries("df") if DF_METRIC_RE.match(m["name"])})
 
 
 def get_sorted_df_metrics(metrics):
@@ -79,27 +151,33 @@ def get_sorted_df_metrics(metrics):
     return get_metrics_sorted_by_suffix(metrics, DF_METRIC_SUFFIXES)
 
 
-def get_df_datapoints(check_bundle, metrics):
+def get_df_datapoints(check_bundle, metrics, compact=False):
     """Get a list of datapoints from *sorted* ``metrics``.
 
     :param dict check_bundle: The check bundle.
     :param list metrics: The sorted metrics to cerate datapoints with.
+    :param bool compact: (optional) Create compact :class:`~circonus.metric.Datapoint` records instead of
+        :py:class:`dict` datapoints, see :func:`~circonus.metric.get_datapoints`.
     :rtype: :py:class:`list`
 
     """
     datapoints = []
     for i, cid in enumerate(check_bundle["_checks"]):
         check_id = get_check_id_from_cid(cid)
-        datapoints.extend(get_datapoints(check_id, metrics, {"derive": "gauge", "stack": i}))
+        datapoints.extend(get_datapoints(check_id, metrics, {"derive": "gauge", "stack": i}, compact=compact))
     return datapoints
 
 
-def get_df_graph_data(check_bundle, mount_dir, title=None):
+def get_df_graph_data(check_bundle, mount_dir, title=None, index=None, compact=False):
     """Get graph data for ``check_bundle``.
 
     :param dict check_bundle: The check bundle to create graph data with.
     :param str title: (optional) The title to use for the graph.
     :param str mount_dir: The mount directory to create graph data for.
+    :param index: (optional) The index of ``check_bundle`` metrics.
+    :type index: :class:`~circonus.collectd.index.MetricIndex`
+    :param bool compact: (optional) Create compact :class:`~circonus.metric.Datapoint` records instead of
+        :py:class:`dict` datapoints, see :func:`~circonus.metric.get_datapoints`.
     :rtype: :py:class:`dict`
 
     ``title`` defaults to using ``check_bundle["target"]``.  ``df`` and ``mount_dir`` will be appended to ``title``.
@@ -109,10 +187,10 @@ def get_df_graph_data(check_bundle, mount_dir, title=None):
 
     """
     data = {}
-    df_metrics = get_df_metrics(check_bundle.get("metrics", []), mount_dir)
+    df_metrics = get_mount_index(get_metric_index(check_bundle, index)).get_metrics(mount_dir)
     if df_metrics:
         sorted_df_metrics = get_sorted_df_metrics(df_metrics)
-        datapoints = get_df_datapoints(check_bundle, sorted_df_metrics)
+        datapoints = get_df_datapoints(check_bundle, sorted_df_metrics, compact)
         graph_title = title if title else "%s df" % check_bundle["target"]
         graph_title = "%s %s" % (graph_title, mount_dir)
         custom_data = {"title": graph_title, "min_left_y": 0, "min_right_y": 0}
@@ -8,18 +8,21 @@ Create graph data for several ``collectd`` graphs.
 """
 
 from circonus.collectd.cpu import get_cpu_graph_data
-from circonus.collectd.df import get_df_graph_data
+from circonus.collectd.df import get_df_graph_data, get_mount_dirs
+from circonus.collectd.index import MetricIndex
 from circonus.collectd.memory import get_memory_graph_data
-from circonus.collectd.interface import get_interface_graph_data
+from circonus.collectd.interface import get_interface_graph_data, get_interface_names
 
 
-def get_collectd_graph_data(check_bundle, interface_names, mount_dirs, titles=None):
+def get_collectd_graph_data(check_bundle, interface_names=None, mount_dirs=None, titles=None, compact=False):
     """Get ``collectd`` graph data for ``check_bundle``.
 
     :param dict check_bundle: The check bundle to get graph data from.
-    :param list interface_names: The interface names to get data for.
-    :param list mount_dirs: The mount directories to get data for.
+    :param list interface_names: (optional) The interface names to get data for.
+    :param list mount_dirs: (optional) The mount directories to get data for.
     :param dict titles: (optional) The titles to use for each graph.
+    :param bool compact: (optional) Create compact :class:`~circonus.metric.Datapoint` records instead of
+        :py:class:`dict` datapoints, see :func:`~circonus.metric.get_datapoints`.
     :rtype: :py:class:`list`
 
     ``titles`` should be a :py:class:`dict` instance mapping a key representing the ``collectd`` plugin name to a
@@ -29,15 +32,30 @@ def get_collectd_graph_data(check_bundle, interface_names, mount_dirs, titles=No
 
     The returned list will only contain valid graph data.
 
+    The metrics of ``check_bundle`` are classified in a single pass by a :class:`~circonus.collectd.index.MetricIndex`
+    which is shared by every graph.
+
+    If ``interface_names`` or ``mount_dirs`` are not given, graphs are created for every interface or mount directory
+    found in ``check_bundle``.  See :func:`~circonus.collectd.interface.get_interface_names` and
+    :func:`~circonus.collectd.df.get_mount_dirs`.
+
     """
     if titles is None:
         titles = {}
 
+    index = MetricIndex(check_bundle.get("metrics", []))
+    if interface_names is None:
+        interface_names = get_interface_names(index)
+
+    if mount_dirs is None:
+        mount_dirs = get_mount_dirs(index)
+
     graph_data = [
-        get_cpu_graph_data(check_bundle, title=titles.get("cpu")),
-        get_memory_graph_data(check_bundle, title=titles.get("memory"))
+        get_cpu_graph_data(check_bundle, title=titles.get("cpu"), index=index, compact=compact),
+        get_memory_graph_data(check_bundle, title=titles.get("memory"), index=index, compact=compact)
     ]
-    graph_data.extend([get_interface_graph_data(check_bundle, i,
-                                                title=titles.get("interface")) for i in interface_names])
-    graph_data.extend([get_df_graph_data(check_bundle, d, title=titles.get("df")) for d in mount_dirs])
+    graph_data.extend([get_interface_graph_data(check_bundle, i, title=titles.get("interface"), index=index,
+                                                compact=compact) for i in interface_names])
+    graph_data.extend([get_df_graph_data(check_bundle, d, title=titles.get("df"), index=index, compact=compact)
+                       for d in mount_dirs])
     return [d for d in graph_data if d]
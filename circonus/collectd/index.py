@@ -0,0 +1,125 @@
+"""
+
+circonus.collectd.index
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Index the metrics of a ``collectd`` check bundle by plugin and plugin instance.
+
+"""
+
+from collections import namedtuple
+
+
+METRIC_NAME_SEP = "`"
+"""The delimiter between components of a ``collectd`` metric name."""
+
+MetricName = namedtuple("MetricName", ["plugin", "plugin_instance", "type", "type_instance"])
+"""The components of a ``collectd`` metric name."""
+
+
+def parse_metric_name(name):
+    """Parse the ``collectd`` metric ``name`` into its components.
+
+    :param str name: The metric name, e.g., ``cpu`0`cpu`idle``.
+    :rtype: :class:`MetricName`
+
+    ``collectd`` metric names have the form ``plugin`plugin_instance`type`type_instance``.  Components which are
+    missing, e.g., the plugin instance of ``memory`memory`free``, are empty strings.  Any delimiters beyond the fourth
+    component are kept in the type instance.
+
+    """
+    parts = name.split(METRIC_NAME_SEP, 3)
+    if len(parts) == 4:
+        return MetricName(*parts)
+    elif len(parts) == 3:
+        return MetricName(parts[0], "", parts[1], parts[2])
+    elif len(parts) == 2:
+        return MetricName(parts[0], "", parts[1], "")
+    return MetricName(parts[0], "", "", "")
+
+
+class MetricIndex(object):
+    """Construct a :class:`MetricIndex`.
+
+    :param list metrics: The metrics to index.
+    :rtype: :class:`MetricIndex`
+
+    Each metric name is parsed once with :func:`parse_metric_name` so that the metrics of a plugin, or of a plugin
+    instance, can be looked up without scanning every metric.  Lookups return metrics in the order of ``metrics``.
+
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._by_plugin = {}
+        self._by_instance = {}
+        self._views = {}
+        for m in metrics:
+            name = parse_metric_name(m["name"])
+            entry = (name, m)
+            self._by_plugin.setdefault(name.plugin, []).append(entry)
+            self._by_instance.setdefault((name.plugin, name.plugin_instance), []).append(entry)
+
+    def __len__(self):
+        return len(self.metrics)
+
+    def get_entries(self, plugin, plugin_instance=None):
+        """Get the (:class:`MetricName`, metric) :py:class:`tuple` instances for ``plugin``.
+
+        :param str plugin: The plugin, e.g., ``"cpu"``.
+        :param str plugin_instance: (optional) The plugin instance, e.g., ``"eth0"``.
+        :rtype: :py:class:`list`
+
+        """
+        if plugin_instance is None:
+            return self._by_plugin.get(plugin, [])
+        return self._by_instance.get((plugin, plugin_instance), [])
+
+    def get_metrics(self, plugin, plugin_instance=None):
+        """Get the metrics for ``plugin``.
+
+        :param str plugin: The plugin, e.g., ``"cpu"``.
+        :param str plugin_instance: (optional) The plugin instance, e.g., ``"eth0"``.
+        :rtype: :py:class:`list`
+
+        """
+        return [m for _, m in self.get_entries(plugin, plugin_instance)]
+
+    def get_plugin_instances(self, plugin):
+        """Get the sorted plugin instances of ``plugin``, e.g., the interface names of the ``interface`` plugin.
+
+        :param str plugin: The plugin.
+        :rtype: :py:class:`list`
+
+        """
+        return sorted(instance for p, instance in self._by_instance if p == plugin)
+
+    def get_view(self, name, build):
+        """Get the view of this index called ``name``, building it with ``build`` the first time it is requested.
+
+        :param str name: The name of the view, e.g., ``"df"``.
+        :param build: A function which builds the view from this index.
+        :type build: :py:class:`function`
+
+        Views, e.g., :class:`~circonus.collectd.df.MountIndex`, are kept for as long as the index is.
+
+        """
+        view = self._views.get(name)
+        if view is None:
+            view = self._views[name] = build(self)
+        return view
+
+
+def get_metric_index(check_bundle, index=None):
+    """Get a :class:`MetricIndex` for ``check_bundle``.
+
+    :param dict check_bundle: The check bundle.
+    :param index: (optional) An existing index of ``check_bundle`` metrics.
+    :type index: :class:`MetricIndex`
+    :rtype: :class:`MetricIndex`
+
+    ``index`` is returned if it is given, which lets callers building several graphs from one check bundle share a
+    single index.
+
+    """
+    return MetricIndex(check_bundle.get("metrics", [])) if index is None else index
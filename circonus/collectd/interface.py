@@ -10,8 +10,9 @@ Transmitted metrics will be on the top of the graph and received metrics will be
 
 """
 
+from circonus.collectd.index import get_metric_index
 from circonus.graph import get_graph_data
-from circonus.metric import get_datapoints
+from circonus.metric import MetricView, get_datapoints
 from circonus.util import get_check_id_from_cid
 
 
@@ -40,6 +41,17 @@ def get_interface_metrics(metrics, interface_name="eth0", kind=None):
     return interface_metrics
 
 
+def get_interface_names(index):
+    """Get the names of the interfaces with metrics in ``index``.
+
+    :param index: The index of check bundle metrics.
+    :type index: :class:`~circonus.collectd.index.MetricIndex`
+    :rtype: :py:class:`list`
+
+    """
+    return index.get_plugin_instances("interface")
+
+
 def is_transmitter(metric):
     """Is interface ``metric`` a transmitter?
 
@@ -60,11 +72,15 @@ def is_receiver(metric):
     return metric.get("name", "").endswith("rx")
 
 
-def get_interface_datapoints(check_bundle, interface_name="eth0"):
+def get_interface_datapoints(check_bundle, interface_name="eth0", index=None, compact=False):
     """Get a list of datapoints for ``check_bundle`` and ``interface_name``.
 
     :param list check_bundle: The check bundle.
     :param str interface_name: (optional) The interface name, e.g., "eth0".
+    :param index: (optional) The index of ``check_bundle`` metrics.
+    :type index: :class:`~circonus.collectd.index.MetricIndex`
+    :param bool compact: (optional) Create compact :class:`~circonus.metric.Datapoint` records instead of
+        :py:class:`dict` datapoints, see :func:`~circonus.metric.get_datapoints`.
     :rtype: :py:class:`list`
 
     ``octets`` and ``errors`` will be returned.  ``octets`` datapoints have data formulas added to them which makes
@@ -72,28 +88,34 @@ def get_interface_datapoints(check_bundle, interface_name="eth0"):
     bottom of the graph due to the data formulas.
 
     """
+    metrics = get_metric_index(check_bundle, index).get_metrics("interface", interface_name)
+    octets = []
+    for m in get_interface_metrics(metrics, interface_name, "octets"):
+        if is_transmitter(m):
+            m = MetricView(m, data_formula=DATA_FORMULA_TRANSMITTER)
+        elif is_receiver(m):
+            m = MetricView(m, data_formula=DATA_FORMULA_RECEIVER)
+        octets.append(m)
+    errors = get_interface_metrics(metrics, interface_name, "errors")
+
     datapoints = []
     for cid in check_bundle.get("_checks", []):
         check_id = get_check_id_from_cid(cid)
-        metrics = check_bundle["metrics"]
-        octets = get_interface_metrics(metrics, interface_name, "octets")
-        for m in octets:
-            if is_transmitter(m):
-                m["data_formula"] = DATA_FORMULA_TRANSMITTER
-            elif is_receiver(m):
-                m["data_formula"] = DATA_FORMULA_RECEIVER
-        datapoints.extend(get_datapoints(check_id, octets, {"derive": "counter"}))
-        errors = get_interface_metrics(metrics, interface_name, "errors")
-        datapoints.extend(get_datapoints(check_id, errors, {"derive": "counter", "axis": "r"}))
+        datapoints.extend(get_datapoints(check_id, octets, {"derive": "counter"}, compact=compact))
+        datapoints.extend(get_datapoints(check_id, errors, {"derive": "counter", "axis": "r"}, compact=compact))
     return datapoints
 
 
-def get_interface_graph_data(check_bundle, interface_name="eth0", title=None):
+def get_interface_graph_data(check_bundle, interface_name="eth0", title=None, index=None, compact=False):
     """Get graph data for ``check_bundle``.
 
     :param dict check_bundle: The check bundle to create graph data with.
     :param str title: (optional) The title to use for the graph.
     :param str interface_name: (optional) The interface name, e.g., "eth0".
+    :param index: (optional) The index of ``check_bundle`` metrics.
+    :type index: :class:`~circonus.collectd.index.MetricIndex`
+    :param bool compact: (optional) Create compact :class:`~circonus.metric.Datapoint` records instead of
+        :py:class:`dict` datapoints, see :func:`~circonus.metric.get_datapoints`.
     :rtype: :py:class:`dict`
 
     ``title`` defaults to using ``check_bundle["target"]``.  ``interface_name`` and ``bit/s`` will be appended to
@@ -103,7 +125,7 @@ def get_interface_graph_data(check_bundle, interface_name="eth0", title=None):
     <https://login.circonus.com/resources/api/calls/graph>`_.
 
     """
-    datapoints = get_interface_datapoints(check_bundle, interface_name)
+    datapoints = get_interface_datapoints(check_bundle, interface_name, index, compact)
     graph_title = title if title else "%s interface" % check_bundle["target"]
     graph_title = "%s %s bit/s" % (graph_title, interface_name)
     custom_data = {"title": graph_title}
@@ -9,8 +9,9 @@ Create graph data from a ``collectd`` check bundle.
 
 import re
 
+from circonus.collectd.index import get_metric_index
 from circonus.graph import get_graph_data
-from circonus.metric import get_datapoints, get_metrics, get_metrics_sorted_by_suffix
+from circonus.metric import get_datapoints, get_metrics_sorted_by_suffix
 from circonus.util import get_check_id_from_cid
 
 
@@ -40,26 +41,32 @@ def get_sorted_memory_metrics(metrics):
     return get_metrics_sorted_by_suffix(metrics, MEMORY_METRIC_SUFFIXES)
 
 
-def get_memory_datapoints(check_bundle, metrics):
+def get_memory_datapoints(check_bundle, metrics, compact=False):
     """Get a list of datapoints from *sorted* ``metrics``.
 
     :param dict check_bundle: The check bundle.
     :param list metrics: The sorted metrics to cerate datapoints with.
+    :param bool compact: (optional) Create compact :class:`~circonus.metric.Datapoint` records instead of
+        :py:class:`dict` datapoints, see :func:`~circonus.metric.get_datapoints`.
     :rtype: :py:class:`list`
 
     """
     datapoints = []
     for i, cid in enumerate(check_bundle["_checks"]):
         check_id = get_check_id_from_cid(cid)
-        datapoints.extend(get_datapoints(check_id, metrics, {"derive": "gauge", "stack": i}))
+        datapoints.extend(get_datapoints(check_id, metrics, {"derive": "gauge", "stack": i}, compact=compact))
     return datapoints
 
 
-def get_memory_graph_data(check_bundle, title=None):
+def get_memory_graph_data(check_bundle, title=None, index=None, compact=False):
     """Get graph data for ``check_bundle``.
 
     :param dict check_bundle: The check bundle to create graph data with.
     :param str title: (optional) The title to use for the graph.
+    :param index: (optional) The index of ``check_bundle`` metrics.
+    :type index: :class:`~circonus.collectd.index.MetricIndex`
+    :param bool compact: (optional) Create compact :class:`~circonus.metric.Datapoint` records instead of
+        :py:class:`dict` datapoints, see :func:`~circonus.metric.get_datapoints`.
     :rtype: :py:class:`dict`
 
     ``title`` defaults to using ``check_bundle["target"]``.
@@ -69,10 +76,11 @@ def get_memory_graph_data(check_bundle, title=None):
 
     """
     data = {}
-    memory_metrics = get_metrics(check_bundle, MEMORY_METRIC_RE)
+    memory_metrics = [m for m in get_metric_index(check_bundle, index).get_metrics("memory")
+                      if MEMORY_METRIC_RE.match(m["name"])]
     if memory_metrics:
         sorted_memory_metrics = get_sorted_memory_metrics(memory_metrics)
-        datapoints = get_memory_datapoints(check_bundle, sorted_memory_metrics)
+        datapoints = get_memory_datapoints(check_bundle, sorted_memory_metrics, compact)
         graph_title = title if title else "%s memory" % check_bundle["target"]
         custom_data = {"title": graph_title, "min_left_y": 0, "min_right_y": 0}
         data = get_graph_data(check_bundle, datapoints, custom_data)
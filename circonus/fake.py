@@ -0,0 +1,403 @@
+"""
+
+circonus.fake
+~~~~~~~~~~~~~
+
+A local stand-in for the Circonus API for tests and load tests.
+
+"""
+
+from __future__ import print_function
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from collections import OrderedDict
+from posixpath import sep as pathsep
+from random import random, uniform
+from threading import Lock, Thread
+from time import sleep, time
+from urlparse import parse_qsl, urlsplit
+
+import argparse
+import json
+import socket
+import zlib
+
+from circonus.transfer import GZIP_WBITS
+
+
+FAKE_API_VERSION_PATH = "/v2"
+"""The path prefix of every fake API URL."""
+
+FAKE_PAGE_SIZE = 1000
+"""The number of resources returned for a resource type when the request has no ``size`` parameter."""
+
+FAKE_ERRORS = {
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+    504: "Gateway Timeout"
+}
+"""The messages of the error statuses the fake API responds with."""
+
+
+def get_error(status, explanation=""):
+    """Get a Circonus API error body for ``status``.
+
+    :param int status: The response status code.
+    :param str explanation: (optional) The explanation of the error.
+    :rtype: :py:class:`dict`
+
+    """
+    message = FAKE_ERRORS.get(status, "Error")
+    return {"code": message.replace(" ", ""), "message": message, "explanation": explanation}
+
+
+def matches(resource, params):
+    """Does ``resource`` match the filter ``params``?
+
+    :param dict resource: The resource.
+    :param dict params: The query parameters.  Only those starting with ``f_`` are filters.
+    :rtype: :py:class:`bool`
+
+    ``f_<attribute>`` filters match resources whose attribute, or one of whose attribute values, equals the filter
+    value.  ``f_<attribute>_ge`` filters, e.g., ``f__last_modified_ge``, match resources whose numeric attribute is
+    greater than or equal to the filter value.
+
+    """
+    for name, value in params.iteritems():
+        if not name.startswith("f_"):
+            continue
+        attribute = name[2:]
+        if attribute.endswith("_ge"):
+            try:
+                if resource.get(attribute[:-3], 0) < float(value):
+                    return False
+            except (TypeError, ValueError):
+                return False
+            continue
+        actual = resource.get(attribute)
+        if isinstance(actual, list):
+            if value not in [unicode(v) for v in actual]:
+                return False
+        elif actual is None or unicode(actual) != value:
+            return False
+    return True
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """Handle a request to the :class:`FakeCirconusAPI` which serves it."""
+
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1  # Send each response in one write rather than waiting on delayed ACKs between its parts.
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        """Read the request body, which may be chunked and gzip encoded.
+
+        :rtype: :py:class:`str`
+
+        """
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(";")[0].strip() or "0", 16)
+                if not size:
+                    while self.rfile.readline().strip():
+                        pass
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = "".join(chunks)
+        else:
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if body and self.headers.get("Content-Encoding", "").lower() == "gzip":
+            body = zlib.decompress(body, GZIP_WBITS)
+        return body
+
+    def respond(self, status, data=None, headers=None):
+        """Send a JSON response."""
+        body = "" if data is None else json.dumps(data)
+        self.send_response(status, FAKE_ERRORS.get(status))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).iteritems():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_method(self):
+        split = urlsplit(self.path)
+        body = self.read_body()
+        status, data, headers = self.server.api.handle(self.command, split.path, dict(parse_qsl(split.query)), body,
+                                                       self.headers)
+        self.respond(status, data, headers)
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_method
+
+
+class FakeAPIServer(ThreadingMixIn, HTTPServer):
+    """The threaded HTTP server of a :class:`FakeCirconusAPI`."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, api, address):
+        HTTPServer.__init__(self, address, FakeAPIHandler)
+        self.api = api
+
+
+class FakeCirconusAPI(object):
+    """Construct a :class:`FakeCirconusAPI`.
+
+    :param str host: (optional) The address to listen on.
+    :param int port: (optional) The port to listen on.  ``0`` picks a free port.
+    :param float latency: (optional) The number of seconds to wait before responding to each request.
+    :param float jitter: (optional) The maximum number of seconds to add to ``latency`` at random.
+    :param float error_rate: (optional) The fraction of requests from ``0`` to ``1`` which fail with ``error_status``.
+    :param int error_status: (optional) The status of failed requests.
+    :param float rate_limit: (optional) The number of requests allowed per second before responding with ``429``.
+    :param float retry_after: (optional) The number of seconds sent in the ``Retry-After`` header of ``429`` responses.
+    :param str api_token: (optional) The only ``X-Circonus-Auth-Token`` accepted.  Any token is accepted by default.
+    :rtype: :class:`FakeCirconusAPI`
+
+    An in-memory Circonus API served over HTTP on a background thread.  Resources of any type, e.g., ``check_bundle``,
+    ``graph``, ``annotation`` or ``worksheet``, are created with ``POST``, given a ``_cid``, ``_created`` and
+    ``_last_modified`` time, and may then be read with ``GET``, updated with ``PUT`` and removed with ``DELETE``.
+    Resource types are listed in creation order, paged with the ``size`` and ``offset`` parameters and filtered with
+    ``f_`` parameters, see :func:`matches`.  Request bodies may be streamed and gzip encoded.
+
+    Every request waits ``latency`` seconds, so throughput can be measured against a realistic round trip time.
+    Requests beyond ``rate_limit`` per second, with bursts of up to ``rate_limit`` requests, are rejected with ``429``
+    and ``Retry-After``, and a fraction of requests fail with ``error_status``, so that retries can be exercised.
+    :meth:`fail` queues failures for the next requests instead.  The ``requests`` attribute counts the requests
+    received by method.
+
+    Usage::
+
+        >>> from circonus import CirconusClient
+        >>> from circonus.fake import FakeCirconusAPI
+        >>> with FakeCirconusAPI(latency=0.05) as api:
+        ...     circonus = CirconusClient("my-circonus-app", "token", base_url=api.base_url)
+        ...     circonus.create("graph", {"title": "Load"}).json()["_cid"]
+        u'/graph/1'
+
+    The fake API may also be run on its own with ``python -m circonus.fake``.
+
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 rate_limit=None, retry_after=1, api_token=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.api_token = api_token
+        self.requests = {}
+        self.resources = {}
+        self._ids = {}
+        self._failures = []
+        self._tokens = float("inf")
+        self._updated = time()
+        self._lock = Lock()
+        self.server = FakeAPIServer(self, (host, port))
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def base_url(self):
+        """The base URL to construct a :class:`~circonus.CirconusClient` with."""
+        host, port = self.server.server_address[:2]
+        return "http://%s:%d%s" % (host, port, FAKE_API_VERSION_PATH)
+
+    def start(self):
+        """Serve requests on a background thread.
+
+        :rtype: :class:`FakeCirconusAPI`
+
+        """
+        self._thread = Thread(target=self.server.serve_forever, args=(0.05,))  # Poll often so that stop is quick.
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests and close the listening socket."""
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+
+    def fail(self, status, count=1):
+        """Respond to the next ``count`` requests with ``status``.
+
+        :param int status: The status, e.g., ``500`` or ``429``.
+        :param int count: (optional) The number of requests to fail.
+
+        """
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def add(self, resource_type, data):
+        """Create a resource of resource type without making a request, e.g., to load test data.
+
+        :param str resource_type: The resource type, e.g., ``"check_bundle"``.
+        :param dict data: The resource.
+        :return: The created resource.
+        :rtype: :py:class:`dict`
+
+        A ``_cid`` given in ``data``, e.g., ``/user/current``, is kept.
+
+        """
+        with self._lock:
+            return self._create(resource_type, data)
+
+    def get_resources(self, resource_type):
+        """Get the resources of resource type in creation order.
+
+        :param str resource_type: The resource type, e.g., ``"graph"``.
+        :rtype: :py:class:`list`
+
+        """
+        with self._lock:
+            return list(self.resources.get(resource_type, {}).values())
+
+    def _create(self, resource_type, data):
+        """Create a resource.  The lock must be held."""
+        resources = self.resources.setdefault(resource_type, OrderedDict())
+        resource = dict(data)
+        if "_cid" not in resource:
+            self._ids[resource_type] = self._ids.get(resource_type, 0) + 1
+            resource["_cid"] = "/%s/%d" % (resource_type, self._ids[resource_type])
+        now = int(time())
+        resource.setdefault("_created", now)
+        resource["_last_modified"] = now
+        resources[resource["_cid"]] = resource
+        return resource
+
+    def _get_failure(self):
+        """Get the status of a rate limited or injected failure, if the next request should fail.
+
+        :rtype: (:py:class:`int` or :py:const:`None`, :py:class:`dict`)
+
+        """
+        with self._lock:
+            if self.rate_limit is not None:
+                now = time()
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+                self._updated = now
+                if self._tokens < 1:
+                    return 429, {"Retry-After": "%g" % self.retry_after}
+                self._tokens -= 1
+            if self._failures:
+                status = self._failures.pop(0)
+                return status, {"Retry-After": "%g" % self.retry_after} if status == 429 else {}
+        if self.error_rate and random() < self.error_rate:
+            return self.error_status, {}
+        return None, {}
+
+    def handle(self, method, path, params, body, headers):
+        """Handle a request.
+
+        :param str method: The HTTP method, e.g., ``"GET"``.
+        :param str path: The URL path, e.g., ``/v2/graph/1``.
+        :param dict params: The query parameters.
+        :param str body: The decoded request body.
+        :param headers: The request headers.
+        :return: The response status, JSON data and headers.
+        :rtype: (:py:class:`int`, :py:class:`dict` or :py:class:`list` or :py:const:`None`, :py:class:`dict`)
+
+        """
+        with self._lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+        delay = self.latency + (uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            sleep(delay)
+
+        status, failure_headers = self._get_failure()
+        if status is not None:
+            return status, get_error(status, "Injected by the fake Circonus API."), failure_headers
+        if self.api_token is not None and headers.get("X-Circonus-Auth-Token") != self.api_token:
+            return 403, get_error(403, "The X-Circonus-Auth-Token is not valid."), {}
+        if not path.startswith(FAKE_API_VERSION_PATH + pathsep):
+            return 404, get_error(404, "Unknown path %s." % path), {}
+
+        cid = path[len(FAKE_API_VERSION_PATH):].rstrip(pathsep)
+        resource_type = cid.strip(pathsep).split(pathsep)[0]
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return 400, get_error(400, "The request body is not valid JSON."), {}
+
+        with self._lock:
+            resources = self.resources.get(resource_type, {})
+            if cid == pathsep + resource_type:
+                if method == "GET":
+                    return 200, self._get_page(resources, params), {}
+                if method == "POST" and isinstance(data, dict):
+                    return 200, self._create(resource_type, data), {}
+                return 400, get_error(400, "%s %s is not supported." % (method, cid)), {}
+
+            if cid not in resources:
+                return 404, get_error(404, "%s does not exist." % cid), {}
+            if method == "GET":
+                return 200, resources[cid], {}
+            if method == "PUT" and isinstance(data, dict):
+                resource = dict(resources[cid])
+                resource.update(data)
+                resource["_cid"] = cid
+                return 200, self._create(resource_type, resource), {}
+            if method == "DELETE":
+                del resources[cid]
+                return 204, None, {}
+            return 400, get_error(400, "%s %s is not supported." % (method, cid)), {}
+
+    def _get_page(self, resources, params):
+        """Get a page of the filtered ``resources``.  The lock must be held."""
+        size = int(params.get("size", FAKE_PAGE_SIZE))
+        offset = int(params.get("offset", 0))
+        return [r for r in resources.itervalues() if matches(r, params)][offset:offset + size]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Circonus API.")
+    parser.add_argument("--host", default="127.0.0.1", help="the address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="the port to listen on (default: 8080)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum random seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests which fail")
+    parser.add_argument("--error-status", type=int, default=503, help="status of failed requests (default: 503)")
+    parser.add_argument("--rate-limit", type=float, help="requests allowed per second before responding with 429")
+    args = parser.parse_args(argv)
+
+    api = FakeCirconusAPI(args.host, args.port, args.latency, args.jitter, args.error_rate, args.error_status,
+                          args.rate_limit)
+    print("Serving a fake Circonus API at %s" % api.base_url)
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
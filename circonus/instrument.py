@@ -0,0 +1,274 @@
+"""
+
+circonus.instrument
+~~~~~~~~~~~~~~~~~~~
+
+Instrument the requests a client makes to the Circonus API.
+
+"""
+
+from bisect import bisect_left
+from math import ceil
+from threading import Lock
+from time import time
+
+
+HISTOGRAM_MIN = 0.0001
+"""The upper bound in seconds of the smallest latency histogram bucket."""
+
+HISTOGRAM_GROWTH = 2 ** 0.25
+"""The ratio between the upper bounds of consecutive latency histogram buckets, i.e., a relative error of about 19%."""
+
+HISTOGRAM_BUCKETS = 96
+"""The number of latency histogram buckets, covering latencies up to about two minutes."""
+
+HISTOGRAM_BOUNDS = tuple(HISTOGRAM_MIN * HISTOGRAM_GROWTH ** i for i in range(HISTOGRAM_BUCKETS))
+"""The upper bound in seconds of each latency histogram bucket."""
+
+
+class RequestEvent(object):
+    """Construct a :class:`RequestEvent`.
+
+    :param str method: The HTTP method, e.g., ``"GET"``.
+    :param str resource_type: The resource type, e.g., ``"check_bundle"``.
+    :rtype: :class:`RequestEvent`
+
+    The details of a single client request passed to each :class:`Instrument`.  Before the request ``status`` and
+    ``latency`` are :py:const:`None`.  After it:
+
+    * ``status`` is the response status code, or :py:const:`None` if ``error`` was raised.
+    * ``latency`` is the number of seconds taken, including retries and waiting for the rate limit.
+    * ``bytes_sent`` and ``bytes_received`` count body bytes on the wire.  Streamed responses are not counted.
+    * ``retries`` counts the retries made.
+    * ``cache_hit`` is :py:const:`True` if the response was served from the client's cache without a request.
+
+    """
+
+    __slots__ = ("method", "resource_type", "status", "latency", "bytes_sent", "bytes_received", "retries",
+                 "cache_hit", "error", "start")
+
+    def __init__(self, method, resource_type):
+        self.method = method
+        self.resource_type = resource_type
+        self.status = None
+        self.latency = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.cache_hit = False
+        self.error = None
+        self.start = time()
+
+    def __repr__(self):
+        return "<RequestEvent %s %s [%s]>" % (self.method, self.resource_type, self.status)
+
+    def add(self, sent=0, received=0):
+        """Add ``sent`` and ``received`` body bytes.
+
+        :param int sent: (optional) The number of bytes sent.
+        :param int received: (optional) The number of bytes received.
+
+        """
+        self.bytes_sent += sent
+        self.bytes_received += received
+
+    def finish(self, status=None, error=None):
+        """Record the outcome of the request.
+
+        :param int status: (optional) The response status code.
+        :param error: (optional) The exception raised by the request.
+
+        """
+        self.status = status
+        self.error = error
+        self.latency = time() - self.start
+
+
+class Instrument(object):
+    """The interface of client instruments.
+
+    Pass instruments to :class:`~circonus.CirconusClient` with the ``instruments`` parameter.  Both callbacks are made
+    on the thread making the request, so they should be quick and must be thread-safe.  Exceptions they raise are
+    propagated to the caller.
+
+    """
+
+    def before_request(self, event):
+        """Called before a request is made.
+
+        :param event: The request.
+        :type event: :class:`RequestEvent`
+
+        """
+
+    def after_request(self, event):
+        """Called after a request was made, whether it succeeded or not.
+
+        :param event: The finished request.
+        :type event: :class:`RequestEvent`
+
+        """
+
+
+class LatencyHistogram(object):
+    """Construct a :class:`LatencyHistogram`.
+
+    :rtype: :class:`LatencyHistogram`
+
+    Latencies are counted in buckets bounded by :const:`HISTOGRAM_BOUNDS`, so memory use is fixed and percentiles are
+    approximated by the upper bound of the bucket they fall in.  The histogram is not thread-safe.
+
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (HISTOGRAM_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency):
+        """Count ``latency``.
+
+        :param float latency: The latency in seconds.
+
+        """
+        self.counts[bisect_left(HISTOGRAM_BOUNDS, latency)] += 1
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def get_percentile(self, percentile):
+        """Get the approximate latency at ``percentile``.
+
+        :param float percentile: The percentile from ``0`` to ``100``, e.g., ``99``.
+        :rtype: :py:class:`float` or :py:const:`None`
+
+        :py:const:`None` is returned if no latencies were counted.
+
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(ceil(self.count * percentile / 100.0)))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.max, HISTOGRAM_BOUNDS[i]) if i < HISTOGRAM_BUCKETS else self.max
+
+
+class RequestStats(object):
+    """Construct a :class:`RequestStats`.
+
+    :rtype: :class:`RequestStats`
+
+    The statistics of the requests with one method and resource type collected by a :class:`HistogramCollector`.
+
+    """
+
+    __slots__ = ("latencies", "errors", "cache_hits", "retries", "bytes_sent", "bytes_received", "statuses")
+
+    def __init__(self):
+        self.latencies = LatencyHistogram()
+        self.errors = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.statuses = {}
+
+    def add(self, event):
+        """Add the finished request ``event``.
+
+        :param event: The finished request.
+        :type event: :class:`RequestEvent`
+
+        """
+        self.latencies.add(event.latency)
+        if event.error is not None:
+            self.errors += 1
+        else:
+            self.statuses[event.status] = self.statuses.get(event.status, 0) + 1
+        if event.cache_hit:
+            self.cache_hits += 1
+        self.retries += event.retries
+        self.bytes_sent += event.bytes_sent
+        self.bytes_received += event.bytes_received
+
+    def get_snapshot(self, elapsed):
+        """Get the statistics as a :py:class:`dict`.
+
+        :param float elapsed: The number of seconds the statistics were collected over.
+        :rtype: :py:class:`dict`
+
+        """
+        latencies = self.latencies
+        return {"count": latencies.count,
+                "rate": latencies.count / elapsed if elapsed > 0 else None,
+                "mean": latencies.total / latencies.count if latencies.count else None,
+                "p50": latencies.get_percentile(50),
+                "p99": latencies.get_percentile(99),
+                "max": latencies.max,
+                "errors": self.errors,
+                "cache_hits": self.cache_hits,
+                "retries": self.retries,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "statuses": dict(self.statuses)}
+
+
+class HistogramCollector(Instrument):
+    """Construct a :class:`HistogramCollector`.
+
+    :rtype: :class:`HistogramCollector`
+
+    An :class:`Instrument` which collects request statistics in memory by method and resource type.
+
+    Usage::
+
+        >>> from circonus import CirconusClient
+        >>> from circonus.instrument import HistogramCollector
+        >>> collector = HistogramCollector()
+        >>> circonus = CirconusClient("my-circonus-app", "generated-by-circonus-ui", instruments=[collector])
+        >>> response = circonus.get("/check_bundle")
+        >>> collector.snapshot()["GET check_bundle"]["p99"]
+        0.2726269331352866
+
+    The collector may be shared by several clients and threads.
+
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = Lock()
+        self.started = time()
+
+    def after_request(self, event):
+        key = "%s %s" % (event.method, event.resource_type)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = RequestStats()
+            stats.add(event)
+
+    def snapshot(self):
+        """Get the statistics collected so far.
+
+        :rtype: :py:class:`dict`
+
+        The statistics are keyed by method and resource type, e.g., ``"GET check_bundle"``.  Each value is a
+        :py:class:`dict` with the request ``count`` and ``rate`` per second, the ``mean``, ``p50``, ``p99`` and ``max``
+        latency in seconds, the number of ``errors``, ``cache_hits`` and ``retries``, the ``bytes_sent`` and
+        ``bytes_received``, and the count of each response status in ``statuses``.
+
+        """
+        with self._lock:
+            elapsed = time() - self.started
+            return {key: stats.get_snapshot(elapsed) for key, stats in self._stats.iteritems()}
+
+    def reset(self):
+        """Discard the statistics collected so far."""
+        with self._lock:
+            self._stats.clear()
+            self.started = time()
@@ -7,10 +7,109 @@ Manipulate check metrics.
 
 """
 
-from collections import OrderedDict
-from copy import deepcopy
+from collections import Mapping, MutableMapping
+from itertools import izip
 
-from circonus.util import colors
+from circonus.util import COLOR_FROM, COLOR_TO, get_palette
+
+
+DATAPOINT_ATTRIBUTES = ("alpha", "axis", "check_id", "color", "data_formula", "derive", "hidden", "legend_formula",
+                        "metric_name", "metric_type", "name", "stack")
+"""The datapoint attributes which :class:`Datapoint` stores in slots rather than in a :py:class:`dict`."""
+
+
+class _SlotsMapping(object):
+    """The read-only :py:class:`~collections.Mapping` methods for classes with ``__slots__``.
+
+    :py:class:`~collections.Mapping` itself does not define ``__slots__`` in Python 2, so subclassing it would give
+    every instance a ``__dict__``.  Subclasses define ``__getitem__``, ``__iter__`` and ``__len__`` and are registered
+    as virtual subclasses of :py:class:`~collections.Mapping` instead.
+
+    """
+
+    __slots__ = ()
+
+    __hash__ = None
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return dict(self.iteritems()) == dict(other.iteritems())
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def iterkeys(self):
+        return iter(self)
+
+    def itervalues(self):
+        return (self[key] for key in self)
+
+    def iteritems(self):
+        return ((key, self[key]) for key in self)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+
+class MetricView(_SlotsMapping):
+    """Construct a :class:`MetricView`.
+
+    :param dict metric: The metric.
+    :param overrides: The attribute values to use in place of those in ``metric``.
+    :rtype: :class:`MetricView`
+
+    A read-only :py:class:`dict`-like view of ``metric`` with some attributes overridden, used in place of copying
+    ``metric`` when preparing metrics for :func:`get_datapoints`.  ``metric`` is neither copied nor modified.
+
+    """
+
+    __slots__ = ("metric", "overrides")
+
+    def __init__(self, metric, **overrides):
+        self.metric = metric
+        self.overrides = overrides
+
+    def __getitem__(self, key):
+        if key in self.overrides:
+            return self.overrides[key]
+        return self.metric[key]
+
+    def __iter__(self):
+        for key in self.metric:
+            yield key
+        for key in self.overrides:
+            if key not in self.metric:
+                yield key
+
+    def __len__(self):
+        return len(self.metric) + sum(1 for key in self.overrides if key not in self.metric)
+
+    def __repr__(self):
+        return "MetricView(%r, **%r)" % (self.metric, self.overrides)
+
+
+Mapping.register(MetricView)
 
 
 def get_metrics(check_bundle, metric_re):
@@ -24,11 +123,22 @@ def get_metrics(check_bundle, metric_re):
     return [m for m in check_bundle.get("metrics", []) if metric_re.match(m["name"])]
 
 
-def get_metrics_sorted_by_suffix(metrics, suffixes):
+def get_suffix_ranks(suffixes):
+    """Get a map of each suffix in ``suffixes`` to its rank.
+
+    :param list suffixes: Sorted list of suffixes.
+    :rtype: :py:class:`dict`
+
+    """
+    return {s: i for i, s in reversed(list(enumerate(suffixes)))}
+
+
+def get_metrics_sorted_by_suffix(metrics, suffixes, suffix_ranks=None):
     """Get a list of metrics sorted by suffix from the list of metrics.
 
     :param list metrics: Metrics to sort.
     :param list suffixes: Sorted list of suffixes used to sort the return metrics list.
+    :param dict suffix_ranks: (optional) The map of ``suffixes`` to their rank from :func:`get_suffix_ranks`.
     :rtype: :py:class:`list`
 
     Sort the ``metrics`` list by metric names ending with values in the ``suffixes`` list.  When creating graphs with
@@ -37,23 +147,138 @@ def get_metrics_sorted_by_suffix(metrics, suffixes):
 
     If there are not enough ``metrics`` to sort for ``suffixes`` an empty list is returned.
 
+    The last component of each metric name is looked up in ``suffix_ranks`` so that sorting is linear in the number of
+    metrics.  Names whose last component is not a suffix fall back to comparing the end of the name with each suffix.
+    Callers sorting several lists by the same ``suffixes`` should compute ``suffix_ranks`` once.
+
     """
-    metrics_map = OrderedDict.fromkeys(suffixes)
+    if suffix_ranks is None:
+        suffix_ranks = get_suffix_ranks(suffixes)
+
+    sorted_metrics = [None] * len(suffixes)
     for m in metrics:
-        for s in suffixes:
-            if m["name"].endswith(s):
-                metrics_map[s] = m
-                break
-    sorted_metrics = metrics_map.values()
+        name = m["name"]
+        rank = suffix_ranks.get(name.rpartition("`")[-1])
+        if rank is None:
+            rank = next((i for i, s in enumerate(suffixes) if name.endswith(s)), None)
+        if rank is not None:
+            sorted_metrics[rank] = m
     return sorted_metrics if all(sorted_metrics) else []
 
 
-def get_datapoints(check_id, metrics, custom=None):
+class Datapoint(_SlotsMapping):
+    """Construct a :class:`Datapoint`.
+
+    :param attributes: The datapoint attributes.
+    :rtype: :class:`Datapoint`
+
+    A compact, :py:class:`dict`-like graph datapoint.  The attributes in :const:`DATAPOINT_ATTRIBUTES` are stored in
+    slots and any others in a :py:class:`dict` which is only created when needed, so a datapoint uses a fraction of
+    the memory of the equivalent :py:class:`dict`.  Use :meth:`to_dict` or :func:`get_json_object` to serialize it.
+    :func:`get_datapoints` and the ``collectd`` graph data functions return datapoints of this type when they are
+    called with ``compact=True``, as the ``create_collectd_*`` methods of :class:`~circonus.CirconusClient` do.
+
+    """
+
+    __slots__ = DATAPOINT_ATTRIBUTES + ("custom",)
+
+    _attributes = frozenset(DATAPOINT_ATTRIBUTES)
+
+    def __init__(self, **attributes):
+        for key, value in attributes.iteritems():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key in self._attributes:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return self._get_custom()[key]
+
+    def __setitem__(self, key, value):
+        if key in self._attributes:
+            setattr(self, key, value)
+        else:
+            try:
+                self.custom[key] = value
+            except AttributeError:
+                self.custom = {key: value}
+
+    def __delitem__(self, key):
+        if key in self._attributes:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        else:
+            del self._get_custom()[key]
+
+    def __iter__(self):
+        for key in DATAPOINT_ATTRIBUTES:
+            if hasattr(self, key):
+                yield key
+        for key in self._get_custom():
+            yield key
+
+    def __len__(self):
+        return sum(1 for key in DATAPOINT_ATTRIBUTES if hasattr(self, key)) + len(self._get_custom())
+
+    def __repr__(self):
+        return "Datapoint(%r)" % self.to_dict()
+
+    def _get_custom(self):
+        """Get the attributes which are not in :const:`DATAPOINT_ATTRIBUTES`."""
+        return getattr(self, "custom", {})
+
+    def update(self, other=(), **attributes):
+        """Update the datapoint with the attributes in ``other`` and ``attributes`` like :py:meth:`dict.update`."""
+        for key, value in (other.iteritems() if isinstance(other, Mapping) else other):
+            self[key] = value
+        for key, value in attributes.iteritems():
+            self[key] = value
+
+    def to_dict(self):
+        """Get the datapoint as a :py:class:`dict`.
+
+        :rtype: :py:class:`dict`
+
+        """
+        d = {key: getattr(self, key) for key in DATAPOINT_ATTRIBUTES if hasattr(self, key)}
+        d.update(self._get_custom())
+        return d
+
+
+MutableMapping.register(Datapoint)
+
+
+def get_json_object(o):
+    """Get a JSON serializable object for ``o``.
+
+    :param o: The object which :py:mod:`json` cannot serialize, e.g., a :class:`Datapoint`.
+    :rtype: :py:class:`dict`
+    :raises: :py:exc:`TypeError` if ``o`` is not a :py:class:`~collections.Mapping`.
+
+    Pass as the ``default`` parameter of :py:func:`json.dumps` to serialize graph data containing :class:`Datapoint`
+    or :class:`MetricView` instances.
+
+    """
+    if isinstance(o, Datapoint):
+        return o.to_dict()
+    elif isinstance(o, Mapping):
+        return dict(o)
+    raise TypeError("%r is not JSON serializable" % o)
+
+
+def get_datapoints(check_id, metrics, custom=None, color_from=COLOR_FROM, color_to=COLOR_TO, compact=False):
     """Get a list of datapoints for ``check_id`` from ``metrics``.
 
     :param str check_id: The check id.
-    :param list metrics: The metrics.
+    :param list metrics: The metrics, which may be :py:class:`dict` or :class:`MetricView` instances.
     :param dict custom: (optional) The custom datapoint attributes used to update each datapoint.
+    :param str color_from: (optional) The color of the first datapoint.
+    :param str color_to: (optional) The color of the last datapoint.
+    :param bool compact: (optional) Get compact :class:`Datapoint` records instead of :py:class:`dict` instances.
     :rtype: :py:class:`list`
 
     Datapoints determine how ``metrics`` are rendered on a `graph
@@ -61,24 +286,29 @@ def get_datapoints(check_id, metrics, custom=None):
     default values of required datapoint attributes.  Datapoint attributes can be overridden with the ``custom``
     parameter.  The ``custom`` :py:class:`dict` is used to :py:meth:`~dict.update` each datapoint as it is created.
 
+    Each datapoint is a :py:class:`dict`.  If ``compact`` is :py:const:`True` each datapoint is a :class:`Datapoint`
+    instead, which supports the :py:class:`dict` interface in a fraction of the memory but must be serialized with
+    :func:`get_json_object`, as :class:`~circonus.CirconusClient` does.
+
     """
     if custom is None:
         custom = {}
 
-    c = colors(metrics)
+    datapoint_type = Datapoint if compact else dict
+    palette = get_palette(len(metrics), color_from, color_to)
     datapoints = []
-    for m in metrics:
-        dp = {"alpha": m.get("alpha"),
-              "axis": "l",
-              "check_id": check_id,
-              "color": c.next().get_hex_l(),
-              "data_formula": m.get("data_formula"),
-              "hidden": m.get("hidden", False),
-              "legend_formula": m.get("legend_formula"),
-              "metric_name": m.get("name"),
-              "metric_type": m.get("type"),
-              "name": m.get("name"),
-              "stack": m.get("stack")}
+    for m, color in izip(metrics, palette):
+        dp = datapoint_type(alpha=m.get("alpha"),
+                            axis="l",
+                            check_id=check_id,
+                            color=color,
+                            data_formula=m.get("data_formula"),
+                            hidden=m.get("hidden", False),
+                            legend_formula=m.get("legend_formula"),
+                            metric_name=m.get("name"),
+                            metric_type=m.get("type"),
+                            name=m.get("name"),
+                            stack=m.get("stack"))
         dp.update(custom)
         datapoints.append(dp)
     return datapoints
@@ -92,13 +322,8 @@ def get_metrics_with_status(metrics, status, metric_re=None):
     :param re metric_re: (optional) The compiled regular expression used to match metrics to update.
     :rtype: :py:class:`list`
 
-    ``metrics`` is not modified by this function.
+    ``metrics`` is not modified by this function.  Each metric is copied shallowly, so attribute values which are
+    themselves containers are shared with ``metrics`` rather than copied.
 
     """
-    updated_status = {"status": status}
-    updated_metrics = deepcopy(metrics)
-    if metric_re:
-        [m.update(updated_status) for m in updated_metrics if metric_re.search(m["name"])]
-    else:
-        [m.update(updated_status) for m in updated_metrics]
-    return updated_metrics
+    return [dict(m, status=status) if metric_re is None or metric_re.search(m["name"]) else dict(m) for m in metrics]
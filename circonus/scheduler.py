@@ -0,0 +1,212 @@
+"""
+
+circonus.scheduler
+~~~~~~~~~~~~~~~~~~
+
+Schedule requests within the Circonus API rate limit and retry failed requests.
+
+"""
+
+from email.utils import mktime_tz, parsedate_tz
+from random import uniform
+from threading import Lock
+from time import sleep, time
+
+import logging
+
+from requests import codes as status_codes
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+
+RETRY_STATUSES = frozenset([
+    status_codes.TOO_MANY_REQUESTS,
+    status_codes.INTERNAL_SERVER_ERROR,
+    status_codes.BAD_GATEWAY,
+    status_codes.SERVICE_UNAVAILABLE,
+    status_codes.GATEWAY_TIMEOUT
+])
+"""HTTP status codes of responses which may succeed if the request is retried."""
+
+RETRY_METHODS = frozenset(["DELETE", "GET", "HEAD", "OPTIONS", "PUT"])
+"""Idempotent HTTP methods which are safe to retry."""
+
+log = logging.getLogger(__name__)
+
+
+def get_retry_after(response):
+    """Get the number of seconds the server asked to wait before retrying from ``response``.
+
+    :param response: The response.
+    :type response: :class:`requests.Response`
+    :rtype: :py:class:`float` or :py:const:`None`
+
+    The ``Retry-After`` header may be a number of seconds or an HTTP date.  :py:const:`None` is returned if the header
+    is missing or cannot be parsed.
+
+    """
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        date = parsedate_tz(retry_after)
+        return None if date is None else max(0.0, mktime_tz(date) - time())
+
+
+def is_retryable_error(error):
+    """Might the request which raised ``error`` succeed if it is retried?
+
+    :param error: The exception raised by the request.
+    :rtype: :py:class:`bool`
+
+    Connection errors, timeouts and :class:`~requests.exceptions.HTTPError` instances for a response status in
+    :const:`RETRY_STATUSES` are retryable.
+
+    """
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+    response = getattr(error, "response", None) if isinstance(error, HTTPError) else None
+    return response is not None and response.status_code in RETRY_STATUSES
+
+
+class TokenBucket(object):
+    """Construct a :class:`TokenBucket`.
+
+    :param float rate: The number of tokens added per second.
+    :param int capacity: (optional) The maximum number of tokens, i.e., the largest burst allowed.
+    :rtype: :class:`TokenBucket`
+
+    ``capacity`` defaults to ``rate``, allowing one second worth of requests to be made at once.
+
+    The bucket may be shared by several threads.
+
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = max(1.0, self.rate if capacity is None else float(capacity))
+        self.tokens = self.capacity
+        self.updated = time()
+        self.paused_until = 0.0
+        self._lock = Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available.
+
+        :rtype: :py:class:`float`
+
+        Return the number of seconds spent waiting.
+
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """Stop handing out tokens for ``seconds``, e.g., after the server responded that the rate limit was exceeded.
+
+        :param float seconds: The number of seconds to pause for.
+
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time() + seconds)
+
+
+class RequestScheduler(object):
+    """Construct a :class:`RequestScheduler`.
+
+    :param float rate: (optional) The maximum number of requests per second, e.g., the Circonus API quota.
+    :param int burst: (optional) The maximum number of requests which may be made at once.
+    :param int max_retries: (optional) The maximum number of times to retry a request.
+    :param float backoff_factor: (optional) The base number of seconds to back off for.
+    :param float backoff_max: (optional) The maximum number of seconds to back off for.
+    :param retry_methods: (optional) The HTTP methods which may be retried.
+    :type retry_methods: :py:class:`frozenset`
+    :rtype: :class:`RequestScheduler`
+
+    When ``rate`` is given, requests are made no faster than ``rate`` per second with a :class:`TokenBucket`.
+
+    Requests which fail with a connection error or a response status in :const:`RETRY_STATUSES` are retried up to
+    ``max_retries`` times when their method is in ``retry_methods``.  ``POST`` requests are not idempotent and are
+    therefore not retried unless ``"POST"`` is included in ``retry_methods``.  Before each retry the scheduler waits
+    for the time given by the ``Retry-After`` response header or otherwise a random time between zero and
+    ``backoff_factor * 2 ** retry`` seconds, capped at ``backoff_max``.  A ``429 Too Many Requests`` response pauses
+    the token bucket so that every thread sharing the scheduler backs off together.
+
+    The ``retries`` attribute counts the retries made.  The scheduler may be shared by several threads.
+
+    """
+
+    def __init__(self, rate=None, burst=None, max_retries=3, backoff_factor=0.5, backoff_max=30.0,
+                 retry_methods=RETRY_METHODS):
+        self.bucket = None if rate is None else TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_methods = retry_methods
+        self.retries = 0
+        self._lock = Lock()
+
+    def get_backoff(self, retry):
+        """Get a random number of seconds to back off for before ``retry``.
+
+        :param int retry: The number of the retry, starting from ``0``.
+        :rtype: :py:class:`float`
+
+        """
+        return uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** retry))
+
+    def _wait(self, delay):
+        """Wait ``delay`` seconds before retrying."""
+        with self._lock:
+            self.retries += 1
+        sleep(delay)
+
+    def send(self, method, send, *args, **kwargs):
+        """Call ``send`` with ``args`` and ``kwargs`` within the rate limit, retrying if needed.
+
+        :param str method: The HTTP method of the request ``send`` makes, e.g., ``"get"``.
+        :param send: The function which makes the request, e.g., :meth:`requests.Session.get`.
+        :rtype: :class:`requests.Response`
+
+        The last response is returned if retries are exhausted.  The last connection error is raised if no response
+        was received.
+
+        """
+        retryable = method.upper() in self.retry_methods
+        retry = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+
+            try:
+                r = send(*args, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                if not retryable or retry >= self.max_retries:
+                    raise
+                log.warning("retrying %s request after error: %s", method.upper(), e)
+                self._wait(self.get_backoff(retry))
+                retry += 1
+                continue
+
+            if r.status_code not in RETRY_STATUSES or not retryable or retry >= self.max_retries:
+                return r
+
+            retry_after = get_retry_after(r)
+            delay = min(self.backoff_max, self.get_backoff(retry) if retry_after is None else retry_after)
+            if self.bucket is not None and r.status_code == status_codes.TOO_MANY_REQUESTS:
+                self.bucket.pause(delay)
+            log.warning("retrying %s request after %s response in %.2fs", method.upper(), r.status_code, delay)
+            r.close()
+            self._wait(delay)
+            retry += 1
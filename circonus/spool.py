@@ -0,0 +1,351 @@
+"""
+
+circonus.spool
+~~~~~~~~~~~~~~
+
+Spool annotations and other writes to disk while the Circonus API is unavailable and replay them later.
+
+"""
+
+from multiprocessing.pool import ThreadPool
+from threading import Event, Lock, Thread
+from time import time
+
+import json
+import logging
+import os
+
+from circonus.annotation import AnnotationWriter
+from circonus.metric import get_json_object
+from circonus.scheduler import is_retryable_error
+from circonus.stream import dumps
+
+
+SPOOL_SEGMENT_BYTES = 1024 * 1024
+"""The default size in bytes at which a spool segment is sealed and a new one is started."""
+
+SPOOL_SEGMENT_SUFFIX = ".log"
+"""The file name suffix of spool segments."""
+
+SPOOL_CURSOR = "cursor"
+"""The file name of the spool's replay position."""
+
+SPOOL_METHODS = frozenset(["create", "update"])
+"""The client methods which may be spooled."""
+
+SPOOL_BATCH_SIZE = 100
+"""The default number of spooled events to replay at once."""
+
+SPOOL_MAX_WORKERS = 4
+"""The default maximum number of concurrent requests made to replay a batch."""
+
+SPOOL_REPLAY_INTERVAL = 30.0
+"""The default number of seconds between replays by a :class:`SpoolReplayer`."""
+
+log = logging.getLogger(__name__)
+
+
+class Spool(AnnotationWriter):
+    """Construct a :class:`Spool`.
+
+    :param str directory: The directory to write segments to.  It is created if it does not exist.
+    :param int segment_bytes: (optional) The size in bytes at which a segment is sealed.
+    :param bool fsync: (optional) Flush every event to the disk rather than only to the operating system.
+    :rtype: :class:`Spool`
+
+    A durable, append-only log of :func:`~circonus.CirconusClient.create` and :func:`~circonus.CirconusClient.update`
+    calls.  :meth:`create` and :meth:`update` never make a request.  Each call is encoded as a line of JSON and written
+    to the current segment file with a single buffered append, so the caller never waits for the API and the event
+    survives the process exiting or crashing.  With ``fsync`` it also survives the machine crashing, at the cost of a
+    disk flush per event.  Segments are sealed once they reach ``segment_bytes`` and deleted once replayed.
+
+    :meth:`replay`, or a :class:`SpoolReplayer` in the background, sends the spooled events in bulk when the API is
+    reachable again.  Annotations may be spooled with :meth:`annotation` and :meth:`create_annotation`, or spooled only
+    when they cannot be sent by an :class:`~circonus.annotation.AnnotationQueue`.
+
+    Usage::
+
+        >>> from circonus import CirconusClient
+        >>> from circonus.spool import Spool
+        >>> spool = Spool("/var/spool/circonus")
+        >>> with spool.annotation("Deploy", "deploys"):
+        ...     deploy()
+        >>> spool.replay(CirconusClient("my-circonus-app", "generated-by-circonus-ui"))
+        True
+
+    The spool may be shared by several threads, but ``directory`` must only be used by one process at a time.
+
+    """
+
+    def __init__(self, directory, segment_bytes=SPOOL_SEGMENT_BYTES, fsync=False):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.replayed = 0
+        self.rejected = 0
+        self._file = None
+        self._sequence = max([int(name.split(".")[0]) for name in self.get_segments()] or [0])
+        self._lock = Lock()
+        self._replay_lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_segments(self):
+        """Get the file names of the segments in the order they were written.
+
+        :rtype: :py:class:`list`
+
+        """
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(SPOOL_SEGMENT_SUFFIX))
+
+    def _roll(self):
+        """Seal the current segment so that the next event starts a new one.  The lock must be held."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, method, resource_type_or_cid, data):
+        """Append a call of the client ``method`` to the spool.
+
+        :param str method: The client method, one of :const:`SPOOL_METHODS`.
+        :param str resource_type_or_cid: The resource type or ``cid`` to pass to ``method``.
+        :param dict data: The data to pass to ``method``.
+
+        """
+        if method not in SPOOL_METHODS:
+            raise ValueError("method must be one of %s" % ", ".join(sorted(SPOOL_METHODS)))
+        line = dumps({"method": method, "path": resource_type_or_cid, "data": data, "time": int(time())},
+                     default=get_json_object) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._sequence += 1
+                path = os.path.join(self.directory, "%012d%s" % (self._sequence, SPOOL_SEGMENT_SUFFIX))
+                self._file = open(path, "ab")
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            if self._file.tell() >= self.segment_bytes:
+                self._roll()
+
+    def create(self, resource_type, data):
+        """Spool the creation of the resource type with ``data``.
+
+        :param str resource_type: The resource type to create.
+        :param dict data: The data used to create the resource.
+        :rtype: :py:class:`bool`
+
+        """
+        self.append("create", resource_type, data)
+        return True
+
+    def update(self, cid, data):
+        """Spool the update of the resource at ``cid`` with ``data``.
+
+        :param str cid: The resource to update.
+        :param dict data: The data used to update the resource.
+        :rtype: :py:class:`bool`
+
+        """
+        self.append("update", cid, data)
+        return True
+
+    def close(self):
+        """Seal the current segment."""
+        with self._lock:
+            self._roll()
+
+    def _read_cursor(self):
+        """Get the (segment, offset) replay position.
+
+        :rtype: (:py:class:`str` or :py:const:`None`, :py:class:`int`)
+
+        """
+        try:
+            with open(os.path.join(self.directory, SPOOL_CURSOR)) as f:
+                cursor = json.load(f)
+            return cursor["segment"], cursor["offset"]
+        except (IOError, KeyError, TypeError, ValueError):
+            return None, 0
+
+    def _write_cursor(self, segment, offset):
+        """Atomically save the (``segment``, ``offset``) replay position."""
+        path = os.path.join(self.directory, SPOOL_CURSOR)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"segment": segment, "offset": offset}, f)
+        os.rename(path + ".tmp", path)
+
+    def _read_batch(self, f, offset, batch_size):
+        """Read up to ``batch_size`` events from the segment file ``f`` at ``offset``.
+
+        :return: The (offset, event) :py:class:`tuple` instances, the offset after them and whether the end of the
+            segment was reached.
+        :rtype: (:py:class:`list`, :py:class:`int`, :py:class:`bool`)
+
+        """
+        batch = []
+        while len(batch) < batch_size:
+            line = f.readline()
+            if not line:
+                return batch, offset, True
+            start, offset = offset, offset + len(line)
+            try:
+                if not line.endswith("\n"):
+                    raise ValueError("incomplete event")
+                event = json.loads(line)
+                if event["method"] not in SPOOL_METHODS:
+                    raise ValueError("unknown method %s" % event["method"])
+                batch.append((start, event))
+            except (KeyError, TypeError, ValueError) as e:
+                log.error("skipping spooled event at %s:%d: %s", f.name, start, e)
+                self.rejected += 1
+        return batch, offset, False
+
+    def _replay_segment(self, client, segment, batch_size, pool):
+        """Replay the events of ``segment`` from the saved position and delete it.
+
+        :rtype: :py:class:`bool`
+
+        """
+        def send(event):
+            try:
+                return getattr(client, event["method"])(event["path"], event["data"])
+            except Exception as e:
+                return e
+
+        cursor_segment, offset = self._read_cursor()
+        if cursor_segment != segment:
+            offset = 0
+        path = os.path.join(self.directory, segment)
+        with open(path, "rb") as f:
+            f.seek(offset)
+            done = False
+            while not done:
+                batch, offset, done = self._read_batch(f, offset, batch_size)
+                results = pool.map(send, [event for _, event in batch])
+                for (start, event), r in zip(batch, results):
+                    if not isinstance(r, Exception):
+                        self.replayed += 1
+                    elif is_retryable_error(r):
+                        log.warning("stopping replay at %s:%d: %s", segment, start, r)
+                        self._write_cursor(segment, start)
+                        return False
+                    else:
+                        log.error("dropping spooled %s of %s: %s", event["method"], event["path"], r)
+                        self.rejected += 1
+                self._write_cursor(segment, offset)
+        os.remove(path)
+        return True
+
+    def replay(self, client, batch_size=SPOOL_BATCH_SIZE, max_workers=SPOOL_MAX_WORKERS):
+        """Send the spooled events with ``client`` in the order they were spooled.
+
+        :param client: The client to send events with.
+        :type client: :class:`~circonus.CirconusClient`
+        :param int batch_size: (optional) The number of events to send at once.
+        :param int max_workers: (optional) The maximum number of concurrent requests made to send a batch.
+        :return: :py:const:`True` if the spool was drained or :py:const:`False` if the API was unavailable.
+        :rtype: :py:class:`bool`
+
+        The current segment is sealed and every segment is replayed ``batch_size`` events at a time, concurrently
+        within a batch.  Replay stops at the first event which fails with a transient error, see
+        :func:`~circonus.scheduler.is_retryable_error`, and resumes from it next time.  Events which succeeded after it
+        in the same batch are sent again, i.e., events are delivered at least once.  Events the API rejects for any
+        other reason, events which raise any other exception and events which cannot be decoded, e.g., a partial write
+        when the process was killed, are logged and dropped.  The ``replayed`` and ``rejected`` attributes count them.
+
+        Events spooled while a replay is in progress are sent by the next replay.
+
+        """
+        with self._replay_lock:
+            with self._lock:
+                self._roll()
+                segments = self.get_segments()
+            if not segments:
+                return True
+            pool = ThreadPool(max_workers)
+            try:
+                for segment in segments:
+                    if not self._replay_segment(client, segment, batch_size, pool):
+                        return False
+            finally:
+                pool.close()
+                pool.join()
+            try:
+                os.remove(os.path.join(self.directory, SPOOL_CURSOR))
+            except OSError:
+                pass
+            return True
+
+
+class SpoolReplayer(object):
+    """Construct a :class:`SpoolReplayer`.
+
+    :param spool: The spool to replay.
+    :type spool: :class:`Spool`
+    :param client: The client to send events with.
+    :type client: :class:`~circonus.CirconusClient`
+    :param float interval: (optional) The number of seconds between replays.
+    :param int batch_size: (optional) The number of events to send at once.
+    :param int max_workers: (optional) The maximum number of concurrent requests made to send a batch.
+    :rtype: :class:`SpoolReplayer`
+
+    Replays ``spool`` with :meth:`Spool.replay` on a background thread as soon as it is started and then every
+    ``interval`` seconds, so spooled events are drained in bulk once the API is reachable again.
+
+    Usage::
+
+        >>> with SpoolReplayer(spool, circonus):
+        ...     run_forever()
+
+    """
+
+    def __init__(self, spool, client, interval=SPOOL_REPLAY_INTERVAL, batch_size=SPOOL_BATCH_SIZE,
+                 max_workers=SPOOL_MAX_WORKERS):
+        self.spool = spool
+        self.client = client
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self._stopped = Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _run(self):
+        while True:
+            try:
+                self.spool.replay(self.client, self.batch_size, self.max_workers)
+            except Exception:
+                log.exception("spool could not be replayed")
+            if self._stopped.wait(self.interval):
+                return
+
+    def start(self):
+        """Start replaying on a background thread.
+
+        :rtype: :class:`SpoolReplayer`
+
+        """
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name="circonus-spool-replayer")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop replaying once the replay in progress, if any, finishes."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,197 @@
+"""
+
+circonus.store
+~~~~~~~~~~~~~~
+
+Persist check bundles on disk between runs.
+
+"""
+
+from threading import Lock
+
+import json
+import sqlite3
+
+from circonus.cache import get_cache_key
+
+
+LAST_MODIFIED_FILTER = "f__last_modified_ge"
+"""The Circonus API filter parameter selecting resources modified at or after a given time."""
+
+STORE_BATCH_SIZE = 100
+"""The number of check bundles to store per transaction when syncing."""
+
+
+class CheckBundleStore(object):
+    """Construct a :class:`CheckBundleStore`.
+
+    :param str path: The path of the `SQLite <https://www.sqlite.org/>`_ database file, or ``":memory:"``.
+    :rtype: :class:`CheckBundleStore`
+
+    Check bundles, including their metrics, are stored keyed by ``_cid`` along with their ``_last_modified`` time.
+    :meth:`sync` only requests check bundles which were modified since the most recently modified check bundle
+    returned by the last sync with the same parameters, so a restarted process only downloads check bundles which
+    changed while it was not running.
+
+    Usage::
+
+        >>> from circonus import CirconusClient
+        >>> from circonus.store import CheckBundleStore
+        >>> circonus = CirconusClient("my-circonus-app", "generated-by-circonus-ui")
+        >>> store = CheckBundleStore("check_bundles.db")
+        >>> store.sync(circonus, {"f_type": "collectd"})
+        >>> check_bundle = store.get("/check_bundle/12345")
+
+    The store may be shared by several threads.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS check_bundle ("
+                                     "cid TEXT PRIMARY KEY, "
+                                     "last_modified INTEGER NOT NULL, "
+                                     "data TEXT NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS sync_watermark ("
+                                     "params TEXT PRIMARY KEY, "
+                                     "last_modified INTEGER NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS sync_check_bundle ("
+                                     "params TEXT NOT NULL, "
+                                     "cid TEXT NOT NULL, "
+                                     "PRIMARY KEY (params, cid))")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM check_bundle").fetchone()[0]
+
+    def __iter__(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT data FROM check_bundle ORDER BY cid").fetchall()
+        return (json.loads(data) for data, in rows)
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
+
+    def get(self, cid):
+        """Get the check bundle at ``cid``.
+
+        :param str cid: The check bundle ``cid``.
+        :rtype: :py:class:`dict` or :py:const:`None`
+
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT data FROM check_bundle WHERE cid = ?", (cid,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get_last_modified(self, params=None):
+        """Get the ``_last_modified`` time of the most recently modified check bundle.
+
+        :param dict params: (optional) The parameters of a :meth:`sync` to get the time for.
+        :rtype: :py:class:`int`
+
+        If ``params`` is given, the time is that of the most recently modified check bundle returned by a sync with the
+        same parameters, since check bundles stored by a sync with other filters say nothing about the check bundles
+        ``params`` selects.  ``0`` is returned if the store is empty or there has been no such sync.
+
+        """
+        with self._lock:
+            if params is None:
+                return self._connection.execute("SELECT COALESCE(MAX(last_modified), 0) "
+                                                "FROM check_bundle").fetchone()[0]
+            row = self._connection.execute("SELECT last_modified FROM sync_watermark WHERE params = ?",
+                                           (get_cache_key("check_bundle", params),)).fetchone()
+        return 0 if row is None else row[0]
+
+    def put(self, check_bundles):
+        """Store each check bundle in ``check_bundles``, replacing any stored check bundle with the same ``_cid``.
+
+        :param check_bundles: The iterable of check bundle :py:class:`dict` instances to store.
+        :rtype: :py:class:`int`
+
+        Return the number of check bundles stored.
+
+        """
+        rows = [(cb["_cid"], cb.get("_last_modified", 0), json.dumps(cb)) for cb in check_bundles]
+        with self._lock:
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO check_bundle (cid, last_modified, data) "
+                                             "VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def delete(self, cid):
+        """Delete the check bundle at ``cid``.
+
+        :param str cid: The check bundle ``cid``.
+
+        """
+        with self._lock:
+            with self._connection:
+                self._connection.execute("DELETE FROM check_bundle WHERE cid = ?", (cid,))
+                self._connection.execute("DELETE FROM sync_check_bundle WHERE cid = ?", (cid,))
+
+    def sync(self, client, params=None, full=False):
+        """Store check bundles from the Circonus API which changed since the last sync.
+
+        :param client: The client to request check bundles with.
+        :type client: :class:`~circonus.CirconusClient`
+        :param dict params: (optional) The parameters, e.g., filters, used to select check bundles.
+        :param bool full: (optional) Request every check bundle and delete stored ones which were not returned.
+        :rtype: :py:class:`int`
+
+        Check bundles are streamed from :meth:`~circonus.CirconusClient.iter_resources` and stored
+        :const:`STORE_BATCH_SIZE` at a time.  The most recent ``_last_modified`` time returned is kept for ``params``,
+        see :meth:`get_last_modified`, so syncs with different filters do not skip each other's check bundles.  Check
+        bundles modified in the same second as the most recently stored one are requested again since
+        ``_last_modified`` has a resolution of one second.  Deleted check bundles can only be detected by a ``full``
+        sync, which deletes them in a single transaction.
+
+        A ``full`` sync without filters deletes every stored check bundle which was not returned.  A ``full`` sync with
+        filters only deletes check bundles which previous syncs with the same ``params`` returned, and keeps those
+        which a sync with other ``params`` also returned, since their incremental syncs would not request them again.
+
+        Return the number of check bundles stored.
+
+        """
+        params = {} if params is None else dict(params)
+        key = get_cache_key("check_bundle", params)
+        filtered = bool(params)
+        last_modified = 0
+        if not full:
+            last_modified = params[LAST_MODIFIED_FILTER] = self.get_last_modified(params)
+
+        count = 0
+        seen = set()
+        page = []
+        for cb in client.iter_resources("check_bundle", params, stream=True):
+            page.append(cb)
+            last_modified = max(last_modified, cb.get("_last_modified", 0))
+            seen.add(cb["_cid"])
+            if len(page) == STORE_BATCH_SIZE:
+                count += self.put(page)
+                page = []
+        count += self.put(page)
+
+        with self._lock:
+            with self._connection:
+                self._connection.executemany("INSERT OR IGNORE INTO sync_check_bundle (params, cid) VALUES (?, ?)",
+                                             [(key, cid) for cid in seen])
+                if full and filtered:
+                    rows = self._connection.execute("SELECT cid FROM sync_check_bundle WHERE params = ?",
+                                                    (key,)).fetchall()
+                    stale = [(key, cid) for cid, in rows if cid not in seen]
+                    self._connection.executemany("DELETE FROM sync_check_bundle WHERE params = ? AND cid = ?", stale)
+                    self._connection.executemany("DELETE FROM check_bundle WHERE cid = ? AND cid NOT IN "
+                                                 "(SELECT cid FROM sync_check_bundle)", [(cid,) for _, cid in stale])
+                elif full:
+                    rows = self._connection.execute("SELECT cid FROM check_bundle").fetchall()
+                    stale = [(cid,) for cid, in rows if cid not in seen]
+                    self._connection.executemany("DELETE FROM sync_check_bundle WHERE cid = ?", stale)
+                    self._connection.executemany("DELETE FROM check_bundle WHERE cid = ?", stale)
+                self._connection.execute("INSERT OR REPLACE INTO sync_watermark (params, last_modified) "
+                                         "VALUES (?, ?)", (key, last_modified))
+        return count
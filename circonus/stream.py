@@ -0,0 +1,244 @@
+"""
+
+circonus.stream
+~~~~~~~~~~~~~~~
+
+Incrementally encode large JSON request bodies and decode large JSON responses.
+
+"""
+
+from codecs import getincrementaldecoder
+from json import JSONDecoder
+
+import re
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+CHUNK_SIZE = 64 * 1024
+"""The default number of bytes to read from a streamed response at a time."""
+
+WHITESPACE_RE = re.compile(r"\s*")
+"""A compiled regular expression which matches optional JSON whitespace."""
+
+STRUCTURE_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|["{}\[\],]')
+"""A compiled regular expression which matches a JSON string, the start of one, or a character which delimits values."""
+
+STRING_RE = re.compile(r'["\\]')
+"""A compiled regular expression which matches the JSON characters which end strings and escape characters."""
+
+DELIMITER_RE = re.compile(r"\s*[,\]]")
+"""A compiled regular expression which matches the optional whitespace and delimiter following an array element."""
+
+
+def dumps(data, default=None):
+    """Serialize ``data`` to a JSON :py:class:`str`.
+
+    :param data: The data to serialize.
+    :param default: (optional) The function which gets a serializable object for objects :py:mod:`json` cannot
+        serialize, e.g., :func:`~circonus.metric.get_json_object`.
+    :rtype: :py:class:`str`
+
+    `simplejson <https://pypi.python.org/pypi/simplejson>`_ is used when it is installed since its C extension
+    serializes faster than :py:mod:`json`.  The output is the same with either.
+
+    """
+    return json.dumps(data, default=default)
+
+
+def get_item_count(data):
+    """Get the number of items in the lists of ``data``, e.g., the number of datapoints of a graph.
+
+    :param dict data: The data.
+    :rtype: :py:class:`int`
+
+    """
+    return sum(len(v) for v in data.itervalues() if isinstance(v, list)) if isinstance(data, dict) else 0
+
+
+class JSONBody(object):
+    """Construct a :class:`JSONBody`.
+
+    :param dict data: The data to serialize.
+    :param int chunk_size: (optional) The approximate number of bytes per chunk.
+    :param default: (optional) The function which gets a serializable object for objects :py:mod:`json` cannot
+        serialize.
+    :rtype: :class:`JSONBody`
+
+    A streaming request body which serializes ``data`` to JSON a chunk at a time as it is sent, e.g., a graph with
+    thousands of datapoints.  Each item of the lists in ``data`` is serialized separately, so peak memory is bounded by
+    ``chunk_size`` and the largest item rather than the size of the whole document, and the first chunk can be sent
+    before the rest is serialized.  The serialized document is the same as :func:`dumps` would return.
+
+    :mod:`requests` sends iterable bodies with chunked transfer encoding.  The body may be iterated more than once,
+    e.g., when a request is retried.
+
+    """
+
+    def __init__(self, data, chunk_size=CHUNK_SIZE, default=None):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.default = default
+
+    def __iter__(self):
+        chunk = []
+        size = 0
+        for part in self.iter_parts():
+            chunk.append(part)
+            size += len(part)
+            if size >= self.chunk_size:
+                yield "".join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield "".join(chunk)
+
+    def iter_parts(self):
+        """Get a generator which serializes :attr:`data` one part at a time.
+
+        :rtype: generator
+
+        """
+        if not isinstance(self.data, dict):
+            yield dumps(self.data, self.default)
+            return
+
+        yield "{"
+        for i, (key, value) in enumerate(self.data.iteritems()):
+            if i:
+                yield ", "
+            if not isinstance(value, list) or not value:
+                yield dumps({key: value}, self.default)[1:-1]
+                continue
+
+            # Serializing an empty list under key gives the key exactly as it appears in the whole document.
+            yield dumps({key: []})[1:-3]
+            yield "["
+            for j, item in enumerate(value):
+                if j:
+                    yield ", "
+                yield dumps(item, self.default)
+            yield "]"
+        yield "}"
+
+
+def iter_json_array(chunks, encoding="utf-8"):
+    """Get a generator which decodes each element of a JSON array from ``chunks`` one at a time.
+
+    :param chunks: The iterable of encoded :py:class:`str` chunks which make up a JSON document.
+    :param str encoding: (optional) The encoding of ``chunks``.
+    :rtype: generator
+
+    Only as much of the document as is needed to decode the next element is buffered, so peak memory is bounded by the
+    size of the largest element rather than the size of the document.  An element which continues past the buffered
+    chunks is not decoded again after every chunk; instead each new chunk is scanned once for the end of the element,
+    tracking the nesting depth and whether the scan is inside a string, and the element is decoded once it is complete.
+    An element split across many chunks is therefore decoded in linear rather than quadratic time.
+
+    If the document is not an array, e.g., a single resource requested by ``cid``, the whole document is decoded and
+    yielded once.
+
+    :raises: :py:class:`ValueError` if the document is not valid JSON.
+
+    """
+    decoder = JSONDecoder()
+    text_decoder = getincrementaldecoder(encoding)()
+    chunks = iter(chunks)
+    buf = u""
+    pos = 0
+    exhausted = False
+
+    def read(buf, pos):
+        """Discard the decoded part of ``buf`` and append the next chunk to it."""
+        chunk = next(chunks, None)
+        if chunk is None:
+            return buf[pos:] + text_decoder.decode(b"", final=True), 0, True
+        return buf[pos:] + text_decoder.decode(chunk), 0, False
+
+    def scan(buf, i, depth, in_string):
+        """Scan ``buf`` from ``i`` for the ``,`` or ``]`` which follows the element being read.
+
+        :return: The index of the delimiter, or :py:const:`None` if more chunks are needed, and the index, depth and
+            string state to resume scanning from.
+
+        """
+        while True:
+            if in_string:
+                m = STRING_RE.search(buf, i)
+                if m is None:
+                    return None, len(buf), depth, True
+                if m.group() == u"\\":
+                    if m.end() == len(buf):
+                        return None, m.start(), depth, True
+                    i = m.end() + 1
+                    continue
+                i = m.end()
+                in_string = False
+                continue
+            m = STRUCTURE_RE.search(buf, i)
+            if m is None:
+                return None, len(buf), depth, False
+            c, i = m.group(), m.end()
+            if len(c) > 1:
+                continue
+            elif c == u'"':
+                in_string = True
+            elif c in u"[{":
+                depth += 1
+            elif depth == 0:
+                return m.start(), i, depth, False
+            elif c != u",":
+                depth -= 1
+
+    def skip_whitespace(buf, pos, exhausted):
+        """Advance ``pos`` past whitespace, reading more chunks until a significant character is found."""
+        pos = WHITESPACE_RE.match(buf, pos).end()
+        while pos == len(buf) and not exhausted:
+            buf, pos, exhausted = read(buf, pos)
+            pos = WHITESPACE_RE.match(buf, pos).end()
+        return buf, pos, exhausted
+
+    buf, pos, exhausted = skip_whitespace(buf, pos, exhausted)
+    if buf[pos:pos + 1] != u"[":
+        while not exhausted:
+            buf, pos, exhausted = read(buf, pos)
+        yield decoder.decode(buf)
+        return
+
+    buf, pos, exhausted = skip_whitespace(buf, pos + 1, exhausted)
+    if buf[pos:pos + 1] == u"]":
+        return
+
+    while True:
+        buf, pos, exhausted = skip_whitespace(buf, pos, exhausted)
+        try:
+            element, end = decoder.raw_decode(buf, pos)
+            complete = exhausted or DELIMITER_RE.match(buf, end) is not None
+        except ValueError:
+            if exhausted:
+                raise
+            complete = False
+
+        # The element is incomplete, or is not yet followed by a delimiter, e.g., a number split at ``.`` or ``e`` which
+        # decodes as its integer prefix.  Rather than decoding it again after every chunk, scan the chunks for its end.
+        if not complete:
+            i, depth, in_string = pos, 0, False
+            while True:
+                delimiter, i, depth, in_string = scan(buf, i, depth, in_string)
+                if delimiter is not None or exhausted:
+                    break
+                i -= pos
+                buf, pos, exhausted = read(buf, pos)
+            element, end = decoder.raw_decode(buf, pos)
+
+        yield element
+        buf, pos, exhausted = skip_whitespace(buf, end, exhausted)
+        separator = buf[pos:pos + 1]
+        if separator == u"]":
+            return
+        elif separator != u",":
+            raise ValueError("Expecting , delimiter: char %d" % pos)
+        pos += 1
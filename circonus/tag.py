@@ -7,7 +7,10 @@ Manipulate tags on resources that support them.
 
 """
 
-from circonus.util import get_resource_from_cid
+from collections import OrderedDict
+from threading import Lock
+
+from circonus.util import API_MAX_WORKERS, get_resource_from_cid, map_concurrently
 
 
 TAGGABLE_RESOURCES = [
@@ -122,3 +125,110 @@ def get_telemetry_tag(check_bundle):
 
     """
     return get_tag_string(check_bundle["type"], "telemetry")
+
+
+class TagWriter(object):
+    """Construct a :class:`TagWriter`.
+
+    :param client: The client to update resources with.
+    :type client: :class:`~circonus.CirconusClient`
+    :param int max_workers: (optional) The maximum number of resources to update concurrently.
+    :rtype: :class:`TagWriter`
+
+    Tags added and removed with :meth:`add` and :meth:`remove` are collected per ``cid`` and only sent to the API by
+    :meth:`flush`, which is called when a :class:`TagWriter` used as a context manager exits without an exception.
+    Flushing makes at most one ``GET`` and one ``PUT`` request per resource, concurrently across resources, no matter
+    how many times tags were added to or removed from it.  If the same tag is both added and removed the last
+    operation wins.
+
+    Usage::
+
+        >>> with circonus.tag_batch() as tags:
+        ...     tags.add("/graph/1", ["role:web"])
+        ...     tags.add("/graph/1", ["env:prod"])
+        ...     tags.remove("/graph/1", ["env:dev"])
+
+    Operations may be added by several threads.
+
+    """
+
+    def __init__(self, client, max_workers=API_MAX_WORKERS):
+        self.client = client
+        self.max_workers = max_workers
+        self.results = None
+        self._pending = OrderedDict()
+        self._lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def _get_pending(self, cid):
+        """Get the (added, removed) tag sets for ``cid``.  The lock must be held."""
+        return self._pending.setdefault(cid, (set(), set()))
+
+    def add(self, cid, tags):
+        """Add ``tags`` to the resource at ``cid`` when flushed.
+
+        :param str cid: The ``cid`` of the resource.
+        :param list tags: The tags to add.
+
+        Resources which are not taggable are ignored.
+
+        """
+        if is_taggable(cid):
+            with self._lock:
+                added, removed = self._get_pending(cid)
+                added.update(tags)
+                removed.difference_update(tags)
+
+    def remove(self, cid, tags):
+        """Remove ``tags`` from the resource at ``cid`` when flushed.
+
+        :param str cid: The ``cid`` of the resource.
+        :param list tags: The tags to remove.
+
+        Resources which are not taggable are ignored.
+
+        """
+        if is_taggable(cid):
+            with self._lock:
+                added, removed = self._get_pending(cid)
+                removed.update(tags)
+                added.difference_update(tags)
+
+    def _flush_one(self, cid, added, removed):
+        """Apply the net tag changes to the resource at ``cid``.
+
+        :rtype: :class:`requests.Response` or :py:const:`False`
+
+        """
+        resource = self.client.get(cid).json()
+        tags = get_tags_with(resource, added)
+        if tags is not None:
+            resource = {"tags": tags}
+        tags_without = get_tags_without(resource, removed)
+        if tags_without is not None:
+            tags = tags_without
+        return self.client.update(cid, {"tags": tags}) if tags is not None else False
+
+    def flush(self):
+        """Send the pending tag changes to the API.
+
+        :rtype: :py:class:`list`
+
+        The returned list, also kept as the ``results`` attribute, contains a (``cid``, result) :py:class:`tuple` for
+        each resource in the order they were first changed.  The result is the :class:`requests.Response` of the update,
+        :py:const:`False` if the resource already had the wanted tags, or the
+        :class:`~requests.exceptions.RequestException` raised.
+
+        """
+        with self._lock:
+            pending = [(cid, added, removed) for cid, (added, removed) in self._pending.items()]
+            self._pending.clear()
+        results = map_concurrently(self._flush_one, pending, self.max_workers)
+        self.results = [(cid, r) for (cid, _, _), r in zip(pending, results)]
+        return self.results
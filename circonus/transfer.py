@@ -0,0 +1,128 @@
+"""
+
+circonus.transfer
+~~~~~~~~~~~~~~~~~
+
+Compress request bodies and count the bytes transferred to and from the Circonus API.
+
+"""
+
+from threading import Lock
+
+import zlib
+
+
+ACCEPT_ENCODING = "gzip, deflate"
+"""The response content encodings the client accepts.  :mod:`urllib3` decodes them, including when streaming."""
+
+COMPRESS_MIN_BYTES = 1024
+"""The default request body size in bytes at which bodies are compressed."""
+
+COMPRESS_LEVEL = 6
+"""The default :py:mod:`zlib` compression level of request bodies."""
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+"""The :py:mod:`zlib` window bits which select the gzip container format."""
+
+
+def gzip_compress(data, level=COMPRESS_LEVEL):
+    """Compress ``data`` with gzip.
+
+    :param str data: The data to compress.
+    :param int level: (optional) The compression level from ``1``, fastest, to ``9``, smallest.
+    :rtype: :py:class:`str`
+
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def get_received_bytes(response):
+    """Get the number of body bytes read from the network for ``response``, i.e., before decompression.
+
+    :param response: The response.
+    :type response: :class:`requests.Response`
+    :rtype: :py:class:`int`
+
+    Only the bytes read so far are counted, so a streamed response should be consumed first.
+
+    """
+    try:
+        return int(response.raw.tell())
+    except (AttributeError, TypeError, ValueError):
+        return 0
+
+
+class GzipBody(object):
+    """Construct a :class:`GzipBody`.
+
+    :param body: The iterable of :py:class:`str` chunks to compress, e.g., a :class:`~circonus.stream.JSONBody`.
+    :param int level: (optional) The compression level.
+    :rtype: :class:`GzipBody`
+
+    A streaming request body which compresses ``body`` with gzip a chunk at a time as it is sent.  The body may be
+    iterated more than once if ``body`` may.
+
+    """
+
+    def __init__(self, body, level=COMPRESS_LEVEL):
+        self.body = body
+        self.level = level
+
+    def __iter__(self):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, GZIP_WBITS)
+        for chunk in self.body:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+
+class CountedBody(object):
+    """Construct a :class:`CountedBody`.
+
+    :param body: The iterable of :py:class:`str` chunks to send.
+    :param counters: The counters, e.g., :class:`TransferCounter` instances, to add the bytes sent to.
+    :rtype: :class:`CountedBody`
+
+    A streaming request body which counts the bytes of each chunk of ``body`` as it is sent.
+
+    """
+
+    def __init__(self, body, *counters):
+        self.body = body
+        self.counters = counters
+
+    def __iter__(self):
+        for chunk in self.body:
+            for counter in self.counters:
+                counter.add(sent=len(chunk))
+            yield chunk
+
+
+class TransferCounter(object):
+    """Construct a :class:`TransferCounter`.
+
+    :rtype: :class:`TransferCounter`
+
+    The ``bytes_sent`` and ``bytes_received`` attributes count request and response body bytes as they were sent and
+    received on the wire, i.e., after compression, including retried requests.  The counter may be shared by several
+    threads.
+
+    """
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._lock = Lock()
+
+    def add(self, sent=0, received=0):
+        """Add ``sent`` and ``received`` bytes.
+
+        :param int sent: (optional) The number of bytes sent.
+        :param int received: (optional) The number of bytes received.
+
+        """
+        with self._lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
@@ -9,9 +9,25 @@ Utility functions that other modules depend upon.
 
 
 from calendar import timegm
+from multiprocessing.pool import ThreadPool
 from posixpath import sep as pathsep
 
-from colour import Color
+from requests.exceptions import RequestException
+
+
+API_POOL_MAXSIZE = 10
+"""The default maximum number of connections to keep alive per host."""
+
+API_MAX_WORKERS = API_POOL_MAXSIZE
+"""The default number of worker threads used to make concurrent requests."""
+
+COLOR_FROM = "red"
+"""The default color of the first item in a palette."""
+
+COLOR_TO = "green"
+"""The default color of the last item in a palette."""
+
+_palettes = {}
 
 
 def datetime_to_int(dt):
@@ -48,17 +64,75 @@ def get_resource_from_cid(cid):
     return cid.strip(pathsep).split(pathsep)[0]
 
 
-def colors(items):
+def map_concurrently(f, args_list, max_workers):
+    """Call ``f`` with each tuple of arguments in ``args_list`` using a bounded pool of worker threads.
+
+    :param f: The function to call.
+    :param list args_list: The argument :py:class:`tuple` instances to call ``f`` with.
+    :param int max_workers: The maximum number of worker threads.
+    :rtype: :py:class:`list`
+
+    The returned list contains the result of each call in the order of ``args_list``.  A
+    :class:`~requests.exceptions.RequestException` raised by a call is returned in place of its result so that a single
+    failure does not abort the remaining calls.
+
+    """
+    def call(args):
+        try:
+            return f(*args)
+        except RequestException as e:
+            return e
+
+    args_list = list(args_list)
+    if not args_list:
+        return []
+
+    pool = ThreadPool(min(max_workers, len(args_list)))
+    try:
+        return pool.map(call, args_list)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def get_palette(size, color_from=COLOR_FROM, color_to=COLOR_TO):
+    """Get a palette of ``size`` hex color strings ranging from ``color_from`` to ``color_to``.
+
+    :param int size: The number of colors.
+    :param str color_from: (optional) The first color, e.g., ``"red"`` or ``"#ff0000"``.
+    :param str color_to: (optional) The last color.
+    :rtype: :py:class:`tuple`
+
+    Palettes are cached by ``size``, ``color_from`` and ``color_to`` so that colors are only interpolated once.  A
+    palette of ``color_from`` alone is returned when ``size`` is less than two.  `colour
+    <https://pypi.python.org/pypi/colour>`_ is not imported until the first palette is created.
+
+    """
+    size = max(size, 1)
+    key = (size, color_from, color_to)
+    palette = _palettes.get(key)
+    if palette is None:
+        from colour import Color
+
+        if size < 2:
+            palette = (Color(color_from).get_hex_l(),)
+        else:
+            palette = tuple(c.get_hex_l() for c in Color(color_from).range_to(Color(color_to), size))
+        _palettes[key] = palette
+    return palette
+
+
+def colors(items, color_from=COLOR_FROM, color_to=COLOR_TO):
     """Create a generator which returns colors for each item in ``items``.
 
     :param list items: The list to generate colors for.
+    :param str color_from: (optional) The color of the first item.
+    :param str color_to: (optional) The color of the last item.
     :rtype: generator(`colour.Color <https://pypi.python.org/pypi/colour>`_)
 
+    The colors are created from the cached palette returned by :func:`get_palette`.
+
     """
-    if len(items) < 2:
-        c = (c for c in (Color("red"),))
-    else:
-        color_from = Color("red")
-        color_to = Color("green")
-        c = (color_from.range_to(color_to, len(items)))
-    return c
+    from colour import Color
+
+    return (Color(c) for c in get_palette(len(items), color_from, color_to))
@@ -27,5 +27,6 @@ setup(
     ],
     keywords="circonus monitoring analytics",
     packages=find_packages(),
-    install_requires=["colour", "requests"]
+    install_requires=["colour", "requests"],
+    extras_require={"speedups": ["simplejson"]}
 )
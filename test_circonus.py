@@ -3,22 +3,28 @@
 # pylint: disable=W0212
 
 from datetime import datetime, timedelta
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Event, Thread
 from time import sleep
 from uuid import uuid4
 
 import json
+import os
 import re
 import types
 import unittest
+import zlib
 
 from colour import Color
-from circonus import CirconusClient, graph, metric, tag, util
-from circonus.annotation import Annotation
+from circonus import (AsyncCirconusClient, CirconusClient, MultiCirconusClient, annotation, cache, client, fake, graph,
+                      instrument, metric, scheduler, spool, store, stream, tag, transfer, util)
+from circonus.annotation import Annotation, AnnotationQueue
 from circonus.client import API_BASE_URL, get_api_url
-from circonus.collectd import cpu, df, interface, memory
+from circonus.collectd import cpu, df, index, interface, memory
 from circonus.collectd.graph import get_collectd_graph_data
-from mock import patch, MagicMock
-from requests.exceptions import HTTPError
+from mock import ANY, patch, MagicMock
+from requests.exceptions import ConnectionError, HTTPError
 
 import requests
 import responses
@@ -298,6 +304,18 @@ class CirconusClientTestCase(unittest.TestCase):
         cls.api_token = str(uuid4())
         cls.c = CirconusClient(cls.api_app_name, cls.api_token)
 
+    def test_base_url(self):
+        self.assertEqual(API_BASE_URL, self.c.base_url)
+        self.assertEqual(get_api_url("/graph/1"), self.c.get_url("/graph/1"))
+        self.assertEqual("http://127.0.0.1:8080/v2/graph/1", get_api_url("/graph/1", "http://127.0.0.1:8080/v2/"))
+
+        c = CirconusClient(self.api_app_name, self.api_token, base_url="https://circonus.example.com/v2/")
+        self.assertEqual("https://circonus.example.com/v2", c.base_url)
+        with patch("circonus.client.requests.Session.get") as get_patch:
+            c.get("/graph/1")
+            get_patch.assert_called_with("https://circonus.example.com/v2/graph/1", params=None,
+                                         headers=c.api_headers)
+
     @responses.activate
     def test_common_tags(self):
         self.assertEqual([], self.c.common_tags)
@@ -308,13 +326,13 @@ class CirconusClientTestCase(unittest.TestCase):
 
         cid = "/check_bundle/12345"
         data = json.dumps({"tags": common_tags})
-        with patch("circonus.client.requests.put") as put_patch:
+        with patch("circonus.client.requests.Session.put") as put_patch:
             c.update(cid, {})
             put_patch.assert_called_with(get_api_url(cid), headers=self.c.api_headers, data=data)
 
         tags_with_telemetry = common_tags + ["telemetry:collectd"]
         data = json.dumps({"type": "collectd", "tags": tags_with_telemetry})
-        with patch("circonus.client.requests.put") as put_patch:
+        with patch("circonus.client.requests.Session.put") as put_patch:
             c.update(cid, {"type": "collectd"})
             put_patch.assert_called_with(get_api_url(cid), headers=self.c.api_headers, data=data)
             self.assertItemsEqual(common_tags, c.common_tags)
@@ -322,7 +340,7 @@ class CirconusClientTestCase(unittest.TestCase):
         tags_with_telemetry = common_tags + ["telemetry:collectd"]
         data = {"type": "collectd", "tags": ["existing:tag"]}
         expected_data = json.dumps({"type": "collectd", "tags": tag.get_tags_with(data, tags_with_telemetry)})
-        with patch("circonus.client.requests.put") as put_patch:
+        with patch("circonus.client.requests.Session.put") as put_patch:
             c.update(cid, data)
             put_patch.assert_called_with(get_api_url(cid), headers=self.c.api_headers, data=expected_data)
             self.assertItemsEqual(common_tags, c.common_tags)
@@ -336,6 +354,21 @@ class CirconusClientTestCase(unittest.TestCase):
         actual = self.c.api_headers
         self.assertEqual(expected, actual)
 
+    def test_session(self):
+        self.assertIsInstance(self.c.session, requests.Session)
+        adapter = self.c.session.get_adapter(API_BASE_URL)
+        self.assertEqual(client.API_POOL_CONNECTIONS, adapter._pool_connections)
+        self.assertEqual(client.API_POOL_MAXSIZE, adapter._pool_maxsize)
+        self.assertEqual("keep-alive", self.c.session.headers["Connection"])
+
+        c = CirconusClient(self.api_app_name, self.api_token, pool_connections=2, pool_maxsize=32, pool_block=True,
+                           keep_alive=False)
+        adapter = c.session.get_adapter(API_BASE_URL)
+        self.assertEqual(2, adapter._pool_connections)
+        self.assertEqual(32, adapter._pool_maxsize)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual("close", c.session.headers["Connection"])
+
     def test_get_api_url(self):
         expected = API_BASE_URL + "/path/to/resource"
         self.assertEqual(expected, get_api_url("path/to/resource"))
@@ -399,7 +432,7 @@ class CirconusClientTestCase(unittest.TestCase):
             self.assertEqual(stop, a.stop)
 
     def test_get(self):
-        with patch("circonus.client.requests.get") as get_patch:
+        with patch("circonus.client.requests.Session.get") as get_patch:
             get_patch.return_value = MagicMock()
             cid = "/user"
             self.c.get(cid)
@@ -409,21 +442,243 @@ class CirconusClientTestCase(unittest.TestCase):
             self.c.get(cid, params)
             get_patch.assert_called_with(get_api_url(cid), headers=self.c.api_headers, params=params)
 
+    def test_iter_resources(self):
+        resources = [{"_cid": "/graph/%d" % i} for i in range(5)]
+
+        def get(url, params, headers):
+            r = MagicMock()
+            r.json.return_value = resources[params["offset"]:params["offset"] + params["size"]]
+            return r
+
+        with patch("circonus.client.requests.Session.get", side_effect=get) as get_patch:
+            it = self.c.iter_resources("/graph", {"f_title": "test"}, page_size=2)
+            self.assertIsInstance(it, types.GeneratorType)
+            self.assertEqual(resources, list(it))
+            self.assertEqual(3, get_patch.call_count)
+            get_patch.assert_called_with(get_api_url("/graph"), headers=self.c.api_headers,
+                                         params={"f_title": "test", "size": 2, "offset": 4})
+
+        with patch("circonus.client.requests.Session.get", side_effect=get) as get_patch:
+            self.assertEqual(resources, list(self.c.iter_resources("/graph", page_size=5)))
+            self.assertEqual(2, get_patch.call_count)
+
+    @responses.activate
+    def test_iter_json(self):
+        resources = [{"_cid": "/check_bundle/%d" % i, "metrics": [{"name": u"m\xe9tric`%d" % i}]} for i in range(50)]
+        responses.add(responses.GET, get_api_url("/check_bundle"), body=json.dumps(resources), status=200,
+                      content_type="application/json")
+        it = self.c.iter_json("/check_bundle", chunk_size=7)
+        self.assertIsInstance(it, types.GeneratorType)
+        self.assertEqual(resources, list(it))
+
+    def test_iter_resources_stream(self):
+        resources = [{"_cid": "/graph/%d" % i} for i in range(5)]
+
+        def get(url, params, headers, stream):
+            r = MagicMock()
+            r.encoding = "utf-8"
+            r.iter_content.return_value = [json.dumps(resources[params["offset"]:params["offset"] + params["size"]])]
+            return r
+
+        with patch("circonus.client.requests.Session.get", side_effect=get) as get_patch:
+            self.assertEqual(resources, list(self.c.iter_resources("/graph", page_size=2, stream=True)))
+            self.assertEqual(3, get_patch.call_count)
+
+    @responses.activate
+    def test_get_cached(self):
+        cid = "/check_bundle/12345"
+        responses.add(responses.GET, get_api_url(cid), body=json.dumps(check_bundle), status=200,
+                      content_type="application/json")
+        c = CirconusClient(self.api_app_name, self.api_token, cache=cache.ResponseCache())
+        self.assertEqual(check_bundle, c.get(cid).json())
+        self.assertEqual(check_bundle, c.get(cid).json())
+        self.assertEqual(1, len(responses.calls))
+        self.assertEqual(1, c.cache.hits)
+        self.assertEqual(1, c.cache.misses)
+
+        c.get(cid, {"f_target": "10.0.0.1"})
+        self.assertEqual(2, len(responses.calls))
+
+        with patch("circonus.client.requests.Session.put") as put_patch:
+            put_patch.return_value = MagicMock()
+            c.update(cid, {"display_name": "test"})
+        self.assertEqual(0, len(c.cache))
+        c.get(cid)
+        self.assertEqual(3, len(responses.calls))
+
+    @responses.activate
+    def test_get_cached_revalidate(self):
+        cid = "/graph/12345"
+        etag = '"deadbeef"'
+
+        def callback(request):
+            if request.headers.get("If-None-Match") == etag:
+                return 304, {}, ""
+            return 200, {"ETag": etag}, json.dumps({"_cid": cid})
+
+        responses.add_callback(responses.GET, get_api_url(cid), callback=callback)
+        c = CirconusClient(self.api_app_name, self.api_token, cache=cache.ResponseCache(ttl=0))
+        r = c.get(cid)
+        self.assertIs(r, c.get(cid))
+        self.assertEqual(2, len(responses.calls))
+        self.assertEqual(etag, responses.calls[1].request.headers["If-None-Match"])
+        self.assertEqual(1, c.cache.revalidations)
+
+    def test_scheduler(self):
+        cid = "/graph/12345"
+        c = CirconusClient(self.api_app_name, self.api_token, scheduler=scheduler.RequestScheduler())
+        unavailable = MagicMock(status_code=503, headers={})
+        ok = MagicMock(status_code=200)
+        with patch("circonus.scheduler.sleep"):
+            with patch("circonus.client.requests.Session.get", side_effect=[unavailable, ok]) as get_patch:
+                self.assertIs(ok, c.get(cid))
+                self.assertEqual(2, get_patch.call_count)
+                get_patch.assert_called_with(get_api_url(cid), headers=c.api_headers, params=None)
+        self.assertEqual(1, c.scheduler.retries)
+
+    def test_get_coalesced(self):
+        cid = "/check_bundle/12345"
+        started = Event()
+        release = Event()
+        response_mock = MagicMock()
+
+        def get(url, params, headers):
+            started.set()
+            release.wait()
+            return response_mock
+
+        self.assertIsNone(self.c.in_flight)
+        c = CirconusClient(self.api_app_name, self.api_token, coalesce=True)
+        with patch("circonus.client.requests.Session.get", side_effect=get) as get_patch:
+            results = []
+            threads = [Thread(target=lambda: results.append(c.get(cid))) for _ in range(4)]
+            threads[0].start()
+            started.wait()
+            for t in threads[1:]:
+                t.start()
+            while c.in_flight.shared < 3:
+                sleep(0.001)
+            release.set()
+            for t in threads:
+                t.join()
+            self.assertEqual(1, get_patch.call_count)
+            self.assertEqual([response_mock] * 4, results)
+
+            c.get(cid)
+            self.assertEqual(2, get_patch.call_count)
+
     def test_delete(self):
-        with patch("circonus.client.requests.delete") as delete_patch:
+        with patch("circonus.client.requests.Session.delete") as delete_patch:
             delete_patch.return_value = MagicMock()
             cid = "/user/12345"
             self.c.delete(cid)
             delete_patch.assert_called_with(get_api_url(cid), headers=self.c.api_headers, params=None)
 
     def test_update(self):
-        with patch("circonus.client.requests.put") as update_patch:
+        with patch("circonus.client.requests.Session.put") as update_patch:
             update_patch.return_value = MagicMock()
             cid = "/user/12345"
             data = {"email": "test@example.com"}
             self.c.update(cid, data)
             update_patch.assert_called_with(get_api_url(cid), headers=self.c.api_headers, data=json.dumps(data))
 
+    def test_create_streams_large_graphs(self):
+        c = CirconusClient(self.api_app_name, self.api_token, stream_min_items=3)
+        small = {"title": "small", "datapoints": [{"metric_name": "a"}, {"metric_name": "b"}]}
+        large = {"title": "large", "datapoints": [metric.Datapoint(metric_name=str(i)) for i in range(3)]}
+        with patch("circonus.client.requests.Session.post") as post_patch:
+            c.create("graph", small)
+            self.assertEqual(json.dumps(small), post_patch.call_args[1]["data"])
+
+            c.create("graph", large)
+            body = post_patch.call_args[1]["data"]
+            self.assertIsInstance(body.body, stream.JSONBody)
+            document = "".join(body)
+            self.assertEqual(json.dumps(large, default=metric.get_json_object), document)
+            self.assertEqual(len(json.dumps(small)) + len(document), c.transfer.bytes_sent)
+
+            c.create("user", large)
+            self.assertIsInstance(post_patch.call_args[1]["data"], types.StringTypes)
+
+        with patch("circonus.client.requests.Session.put") as put_patch:
+            c.update("/graph/1", large)
+            self.assertIsInstance(put_patch.call_args[1]["data"].body, stream.JSONBody)
+
+        c = CirconusClient(self.api_app_name, self.api_token, stream_min_items=None)
+        with patch("circonus.client.requests.Session.post") as post_patch:
+            c.create("graph", large)
+            self.assertIsInstance(post_patch.call_args[1]["data"], types.StringTypes)
+
+    def test_create_compressed(self):
+        c = CirconusClient(self.api_app_name, self.api_token, compress=True, compress_min_bytes=64,
+                           stream_min_items=10)
+        small = {"title": "small"}
+        large = {"title": "large", "datapoints": [{"metric_name": "cpu`%d`cpu`idle" % i} for i in range(5)]}
+        streamed = {"title": "streamed", "datapoints": [{"metric_name": "cpu`%d`cpu`idle" % i} for i in range(10)]}
+        gzip_headers = dict(c.api_headers, **{"Content-Encoding": "gzip"})
+        with patch("circonus.client.requests.Session.post") as post_patch:
+            c.create("graph", small)
+            post_patch.assert_called_with(get_api_url("graph"), headers=c.api_headers, data=json.dumps(small))
+
+            c.create("graph", large)
+            post_patch.assert_called_with(get_api_url("graph"), headers=gzip_headers, data=ANY)
+            compressed = post_patch.call_args[1]["data"]
+            self.assertEqual(large, json.loads(zlib.decompress(compressed, transfer.GZIP_WBITS)))
+            self.assertTrue(len(compressed) < len(json.dumps(large)))
+
+            c.create("graph", streamed)
+            post_patch.assert_called_with(get_api_url("graph"), headers=gzip_headers, data=ANY)
+            body = "".join(post_patch.call_args[1]["data"])
+            self.assertEqual(streamed, json.loads(zlib.decompress(body, transfer.GZIP_WBITS)))
+            self.assertEqual(len(json.dumps(small)) + len(compressed) + len(body), c.transfer.bytes_sent)
+
+    @responses.activate
+    def test_iter_json_gzip(self):
+        resources = [{"_cid": "/graph/%d" % i} for i in range(100)]
+        body = transfer.gzip_compress(json.dumps(resources))
+        responses.add(responses.GET, get_api_url("/graph"), body=body, status=200,
+                      content_type="application/json", adding_headers={"Content-Encoding": "gzip"})
+        c = CirconusClient(self.api_app_name, self.api_token)
+        self.assertEqual(resources, list(c.iter_json("/graph", chunk_size=16)))
+        self.assertEqual(len(body), c.transfer.bytes_received)
+        self.assertEqual("gzip, deflate", responses.calls[0].request.headers["Accept-Encoding"])
+
+    @responses.activate
+    def test_create_many(self):
+        responses.add(responses.POST, get_api_url("graph"), body=json.dumps({"_cid": "/graph/1"}), status=200,
+                      content_type="application/json")
+        self.assertEqual([], self.c.create_many("graph", []))
+
+        rs = self.c.create_many("graph", ({"title": str(i)} for i in range(8)), max_workers=4)
+        self.assertEqual(8, len(rs))
+        self.assertTrue(all(200 == r.status_code for r in rs))
+        actual = sorted(json.loads(c.request.body)["title"] for c in responses.calls)
+        self.assertEqual([str(i) for i in range(8)], actual)
+
+    def test_create_many_partial_failure(self):
+        def post(url, data, headers):
+            r = MagicMock()
+            if json.loads(data)["title"] == "bad":
+                r.raise_for_status.side_effect = HTTPError(response=MagicMock())
+            return r
+
+        with patch("circonus.client.requests.Session.post", side_effect=post):
+            with patch("circonus.client.log"):
+                rs = self.c.create_many("graph", [{"title": "good"}, {"title": "bad"}, {"title": "good"}])
+        self.assertNotIsInstance(rs[0], HTTPError)
+        self.assertIsInstance(rs[1], HTTPError)
+        self.assertNotIsInstance(rs[2], HTTPError)
+
+    def test_update_many(self):
+        with patch("circonus.client.requests.Session.put") as put_patch:
+            put_patch.return_value = MagicMock()
+            pairs = [("/user/%d" % i, {"email": "%d@example.com" % i}) for i in range(3)]
+            rs = self.c.update_many(pairs, max_workers=2)
+            self.assertEqual(3, len(rs))
+            self.assertEqual(3, put_patch.call_count)
+            for cid, data in pairs:
+                put_patch.assert_any_call(get_api_url(cid), headers=self.c.api_headers, data=json.dumps(data))
+
     def test_update_with_tags_only_acts_on_taggable_resources(self):
         self.assertFalse(self.c.update_with_tags("/account", ["cat:tag"]))
         self.assertFalse(self.c.update_with_tags("/alert", ["cat:tag"]))
@@ -461,7 +716,7 @@ class CirconusClientTestCase(unittest.TestCase):
                         "type": "newrelic_rpm"}
         responses.add(responses.GET, get_api_url(cid), body=json.dumps(check_bundle), status=200,
                       content_type="application/json")
-        with patch("circonus.client.requests.put") as put_patch:
+        with patch("circonus.client.requests.Session.put") as put_patch:
             self.c.update_with_tags(cid, new_tags)
             data = json.dumps({"tags": tag.get_tags_with(check_bundle, new_tags)})
             put_patch.assert_called_with(get_api_url(cid), headers=self.c.api_headers, data=data)
@@ -487,7 +742,7 @@ class CirconusClientTestCase(unittest.TestCase):
                         "type": "newrelic_rpm"}
         responses.add(responses.GET, get_api_url(cid), body=json.dumps(check_bundle), status=200,
                       content_type="application/json")
-        with patch("circonus.client.requests.put") as put_patch:
+        with patch("circonus.client.requests.Session.put") as put_patch:
             self.c.update_with_tags(cid, new_tags)
             data = json.dumps({"tags": tag.get_tags_with(check_bundle, new_tags)})
             put_patch.assert_called_with(get_api_url(cid), headers=self.c.api_headers, data=data)
@@ -512,7 +767,7 @@ class CirconusClientTestCase(unittest.TestCase):
                                    "security_level": "0"},
                         "_last_modified": 1416618604}
         data = {}
-        with patch("circonus.client.requests.post") as post_patch:
+        with patch("circonus.client.requests.Session.post") as post_patch:
             self.assertIsNone(self.c.create_collectd_cpu_graph(check_bundle))
             post_patch.assert_not_called()
 
@@ -556,7 +811,7 @@ class CirconusClientTestCase(unittest.TestCase):
                                    {"derive": "counter", "name": "cpu`1`cpu`idle", "color": "#008000", "legend_formula": None, "check_id": 12345, "data_formula": None, "metric_type": "numeric", "alpha": None, "hidden": True, "axis": "l", "stack": 1, "metric_name": "cpu`1`cpu`idle"}],
                     "tags": ["telemetry:collectd"],
                     "title": "10.0.0.1 cpu"}
-        with patch("circonus.client.requests.post") as post_patch:
+        with patch("circonus.client.requests.Session.post") as post_patch:
             self.assertIsNotNone(self.c.create_collectd_cpu_graph(cb))
             post_patch.assert_called()
             actual = json.loads(post_patch.call_args[-1]["data"])
@@ -571,7 +826,7 @@ class CirconusClientTestCase(unittest.TestCase):
     def test_create_collectd_memory_graph_no_memory_metrics(self):
         target = "10.0.0.1"
         cb = {"target": target, "type": "collectd"}
-        with patch("circonus.client.requests.post") as post_patch:
+        with patch("circonus.client.requests.Session.post") as post_patch:
             self.assertIsNone(self.c.create_collectd_memory_graph(cb))
             post_patch.assert_not_called()
 
@@ -582,7 +837,7 @@ class CirconusClientTestCase(unittest.TestCase):
               "type": "collectd",
               "metrics": [{"status": "active", "type": "numeric", "name": "memory`memory`cached"}]}
         expected = {"min_left_y": 0, "datapoints": [], "tags": ["telemetry:collectd"], "min_right_y": 0, "title": "10.0.0.1 memory"}
-        with patch("circonus.client.requests.post") as post_patch:
+        with patch("circonus.client.requests.Session.post") as post_patch:
             self.assertIsNotNone(self.c.create_collectd_memory_graph(cb))
             post_patch.assert_called()
             actual = json.loads(post_patch.call_args[-1]["data"])
@@ -605,7 +860,7 @@ class CirconusClientTestCase(unittest.TestCase):
                     "tags": ["telemetry:collectd"],
                     "min_right_y": 0,
                     "title": "10.0.0.1 memory"}
-        with patch("circonus.client.requests.post") as post_patch:
+        with patch("circonus.client.requests.Session.post") as post_patch:
             self.assertIsNotNone(self.c.create_collectd_memory_graph(cb))
             post_patch.assert_called()
             actual = json.loads(post_patch.call_args[-1]["data"])
@@ -632,7 +887,7 @@ class CirconusClientTestCase(unittest.TestCase):
                         {"derive": "counter", "name": "interface`eth0`if_errors`tx", "color": "#ff0000", "legend_formula": None, "check_id": 12345, "data_formula": None, "metric_type": "numeric", "alpha": None, "hidden": False, "axis": "r", "stack": None, "metric_name": "interface`eth0`if_errors`tx"},
                         {"derive": "counter", "name": "interface`eth0`if_errors`rx", "color": "#008000", "legend_formula": None, "check_id": 12345, "data_formula": None, "metric_type": "numeric", "alpha": None, "hidden": False, "axis": "r", "stack": None, "metric_name": "interface`eth0`if_errors`rx"}],
                     "tags": ["telemetry:collectd"]}
-        with patch("circonus.client.requests.post") as post_patch:
+        with patch("circonus.client.requests.Session.post") as post_patch:
             self.assertIsNotNone(self.c.create_collectd_interface_graph(cb))
             post_patch.assert_called()
             actual = json.loads(post_patch.call_args[-1]["data"])
@@ -664,7 +919,7 @@ class CirconusClientTestCase(unittest.TestCase):
                     "datapoints": [{"derive": "gauge", "name": "df`mnt-mysql`df_complex`reserved", "color": "#ff0000", "legend_formula": None, "check_id": 12345, "data_formula": None, "metric_type": "numeric", "alpha": None, "hidden": False, "axis": "l", "stack": 0, "metric_name": "df`mnt-mysql`df_complex`reserved"},
                                    {"derive": "gauge", "name": "df`mnt-mysql`df_complex`used", "color": "#bfbf00", "legend_formula":None, "check_id": 12345, "data_formula": None, "metric_type": "numeric", "alpha": None, "hidden": False, "axis":"l", "stack": 0, "metric_name": "df`mnt-mysql`df_complex`used"},
                                    {"derive": "gauge", "name": "df`mnt-mysql`df_complex`free", "color": "#008000", "legend_formula": None, "check_id": 12345, "data_formula": None, "metric_type": "numeric", "alpha": None, "hidden": False, "axis": "l", "stack": 0, "metric_name": "df`mnt-mysql`df_complex`free"}]}
-        with patch("circonus.client.requests.post") as post_patch:
+        with patch("circonus.client.requests.Session.post") as post_patch:
             self.assertIsNotNone(self.c.create_collectd_df_graph(cb, "/mnt/mysql"))
             post_patch.assert_called()
             actual = json.loads(post_patch.call_args[-1]["data"])
@@ -694,11 +949,14 @@ class CirconusClientTestCase(unittest.TestCase):
               "target": target,
               "type": "collectd",
               "metrics": []}
-        with patch("circonus.client.requests.post") as post_patch:
+        with patch("circonus.client.requests.Session.post") as post_patch:
             post_patch.return_value = response_mock = MagicMock()
             response_mock.status_code = 200
             success, rs = self.c.create_collectd_graphs(cb)
-            post_patch.assert_called()
+            self.assertFalse(success)
+            self.assertEqual([], rs)
+            self.assertFalse(post_patch.called)
+            success, rs = self.c.create_collectd_graphs(cb, ["eth0"], ["root"])
             self.assertTrue(success)
             self.assertIsInstance(rs, types.ListType)
             self.assertEqual(1, len(rs))
@@ -718,14 +976,139 @@ class CirconusClientTestCase(unittest.TestCase):
 
     def test_create_collectd_graphs(self):
         target = "10.0.0.1"
-        with patch("circonus.client.requests.post") as post_patch:
+        with patch("circonus.client.requests.Session.post") as post_patch:
             post_patch.return_value = response_mock = MagicMock()
             response_mock.status_code = 200
             success, rs = self.c.create_collectd_graphs(check_bundle)
             post_patch.assert_called()
             self.assertTrue(success)
+            self.assertEqual(10, len(rs))
+            self.assertEqual(10, post_patch.call_count)
+            success, rs = self.c.create_collectd_graphs(check_bundle, ["eth0"], ["root"])
+            self.assertTrue(success)
             self.assertEqual(4, len(rs))
-            self.assertEqual(4, post_patch.call_count)
+            self.assertEqual(14, post_patch.call_count)
+            compact_bodies = [json.loads(c[1]["data"]) for c in post_patch.call_args_list[-4:]]
+            self.c.create_collectd_graphs(check_bundle, ["eth0"], ["root"], compact=False)
+            self.assertEqual([json.loads(c[1]["data"]) for c in post_patch.call_args_list[-4:]], compact_bodies)
+
+
+class AsyncCirconusClientTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.api_app_name = "TEST"
+        cls.api_token = str(uuid4())
+        cls.c = AsyncCirconusClient(cls.api_app_name, cls.api_token, ["cat:tag"], max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.c.close()
+
+    def test_shared_client(self):
+        self.assertEqual(["cat:tag"], self.c.common_tags)
+        self.assertEqual(self.c.client.api_headers, self.c.api_headers)
+
+    def test_get(self):
+        with patch("circonus.client.requests.Session.get") as get_patch:
+            get_patch.return_value = response_mock = MagicMock()
+            cids = ["/graph/%d" % i for i in range(4)]
+            results = [self.c.get(cid) for cid in cids]
+            self.assertEqual([response_mock] * 4, [r.get() for r in results])
+            for cid in cids:
+                get_patch.assert_any_call(get_api_url(cid), headers=self.c.api_headers, params=None)
+
+    def test_update_with_common_tags(self):
+        cid = "/check_bundle/12345"
+        with patch("circonus.client.requests.Session.put") as put_patch:
+            put_patch.return_value = MagicMock()
+            self.c.update(cid, {}).get()
+            put_patch.assert_called_with(get_api_url(cid), headers=self.c.api_headers,
+                                         data=json.dumps({"tags": ["cat:tag"]}))
+
+    @responses.activate
+    def test_get_raises_http_error(self):
+        cid = "graph/12345"
+        responses.add(responses.GET, get_api_url(cid),
+                      body=json.dumps({"message": "test", "code": "test", "explanation": "test"}),
+                      status=500,
+                      content_type="application/json")
+        with self.assertRaises(HTTPError):
+            self.c.get(cid).get()
+
+    def test_annotation(self):
+        with patch("circonus.client.CirconusClient.create") as create_patch:
+            create_patch.return_value = response_mock = MagicMock()
+            with self.c.annotation("title", "category") as a:
+                pass
+            self.assertEqual(response_mock, a.response.get())
+            create_patch.assert_called()
+
+    def test_create_collectd_graphs(self):
+        with patch("circonus.client.requests.Session.post") as post_patch:
+            post_patch.return_value = response_mock = MagicMock()
+            response_mock.status_code = 200
+            success, rs = self.c.create_collectd_graphs(check_bundle).get()
+            self.assertTrue(success)
+            self.assertEqual(10, post_patch.call_count)
+
+
+class MultiCirconusClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.us = fake.FakeCirconusAPI(api_token="us-token").start()
+        self.inside = fake.FakeCirconusAPI(api_token="inside-token").start()
+        self.c = MultiCirconusClient({"us": {"api_app_name": "app", "api_token": "us-token",
+                                             "base_url": self.us.base_url}}, max_workers=4)
+        self.c.add_endpoint("inside", "app", "inside-token", ["cat:tag"], base_url=self.inside.base_url)
+
+    def tearDown(self):
+        self.c.close()
+        self.us.stop()
+        self.inside.stop()
+
+    def test_endpoints(self):
+        self.assertEqual(["us", "inside"], self.c.accounts)
+        self.assertIn("inside", self.c)
+        self.assertEqual(self.inside.base_url, self.c["inside"].base_url)
+        self.assertIs(self.c.pool, self.c["us"].pool)
+        self.assertIs(self.c.pool, self.c["inside"].pool)
+        self.assertIsNot(self.c["us"].client.session, self.c["inside"].client.session)
+        with self.assertRaises(KeyError):
+            self.c["eu"]
+
+    def test_replace_endpoint(self):
+        replaced = self.c["us"]
+        with patch.object(replaced.client.session, "close") as close_patch:
+            async_client = self.c.add_endpoint("us", "app", "inside-token", base_url=self.inside.base_url)
+            close_patch.assert_called_once_with()
+        self.assertIs(async_client, self.c["us"])
+        self.assertEqual(["us", "inside"], self.c.accounts)
+        self.c.create("us", "graph", {"title": "replaced"}).get()
+        self.assertEqual([], self.us.get_resources("graph"))
+        self.assertEqual(["replaced"], [g["title"] for g in self.inside.get_resources("graph")])
+
+    def test_routing(self):
+        self.c.create("us", "graph", {"title": "us"}).get()
+        self.c.create("inside", "graph", {"title": "inside"}).get()
+        self.assertEqual(["us"], [g["title"] for g in self.us.get_resources("graph")])
+        self.assertEqual(["inside"], [g["title"] for g in self.inside.get_resources("graph")])
+        self.assertEqual(["cat:tag"], self.inside.get_resources("graph")[0]["tags"])
+
+        results = self.c.get_all("graph")
+        self.assertEqual(["us", "inside"], results.keys())
+        self.assertEqual({"us": ["us"], "inside": ["inside"]},
+                         {account: [g["title"] for g in r.get().json()] for account, r in results.items()})
+
+        self.c.update("us", "/graph/1", {"title": "updated"}).get()
+        self.assertEqual("updated", self.c.get("us", "/graph/1").get().json()["title"])
+        self.c.delete("inside", "/graph/1").get()
+        self.assertEqual([], self.inside.get_resources("graph"))
+
+    def test_shared_pool_not_closed(self):
+        async_client = AsyncCirconusClient("app", "us-token", pool=self.c.pool, base_url=self.us.base_url)
+        async_client.close()
+        self.assertEqual(200, self.c.get("us", "graph").get().status_code)
 
 
 class AnnotationTestCase(unittest.TestCase):
@@ -802,6 +1185,105 @@ class AnnotationTestCase(unittest.TestCase):
             create_patch.assert_called()
 
 
+class AnnotationQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.release = Event()
+        self.release.set()
+        self.client.create.side_effect = lambda resource_type, data: self.release.wait() or MagicMock()
+
+    def get_queue(self, **kwargs):
+        q = AnnotationQueue(self.client, flush_on_exit=False, **kwargs)
+        self.addCleanup(self.release.set)
+        return q
+
+    def fill(self, q, titles):
+        """Block the worker on the first annotation then queue the rest."""
+        self.release.clear()
+        q.create_annotation(titles[0], "category")
+        while not q._sending:
+            sleep(0.001)
+        return [q.create_annotation(t, "category").response for t in titles[1:]]
+
+    def test_create(self):
+        q = self.get_queue()
+        with q.annotation("title", "category") as a:
+            pass
+        self.assertTrue(a.response)
+        self.assertTrue(q.flush(1))
+        self.client.create.assert_called_with(Annotation.RESOURCE_PATH, a.get_data())
+        self.assertEqual(1, q.sent)
+        self.assertEqual(0, len(q))
+
+    def test_client_annotation_queue(self):
+        c = CirconusClient("app", "token")
+        with patch("circonus.client.CirconusClient.create") as create_patch:
+            with c.annotation_queue(flush_on_exit=False) as q:
+                a = q.create_annotation("title", "category")
+            create_patch.assert_called_with(Annotation.RESOURCE_PATH, a.get_data())
+        self.assertIs(c, q.client)
+
+    def test_batches(self):
+        q = self.get_queue(batch_size=2)
+        self.fill(q, ["a", "b", "c", "d"])
+        self.assertEqual(3, len(q))
+        self.release.set()
+        self.assertTrue(q.flush(1))
+        self.assertEqual(4, q.sent)
+        titles = [call[0][1]["title"] for call in self.client.create.call_args_list]
+        self.assertEqual(["a", "b", "c", "d"], sorted(titles))
+
+    def test_drop_newest(self):
+        q = self.get_queue(max_size=2)
+        self.assertEqual([True, True, False], self.fill(q, ["a", "b", "c", "d"]))
+        self.release.set()
+        q.flush(1)
+        self.assertEqual(["a", "b", "c"], [call[0][1]["title"] for call in self.client.create.call_args_list])
+        self.assertEqual(1, q.dropped)
+
+    def test_drop_oldest(self):
+        q = self.get_queue(max_size=2, overflow="drop_oldest")
+        self.assertEqual([True, True, True], self.fill(q, ["a", "b", "c", "d"]))
+        self.release.set()
+        q.flush(1)
+        self.assertEqual(["a", "c", "d"], [call[0][1]["title"] for call in self.client.create.call_args_list])
+        self.assertEqual(1, q.dropped)
+
+    def test_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            AnnotationQueue(self.client, overflow="unknown", flush_on_exit=False)
+
+    def test_flush_on_exit(self):
+        q = AnnotationQueue(self.client)
+        q.create_annotation("title", "category")
+        self.assertIn(q, annotation._exit_queues)
+        annotation._close_exit_queues()
+        self.assertTrue(q.closed)
+        self.assertEqual(1, q.sent)
+        self.assertNotIn(q, annotation._exit_queues)
+
+    def test_failures(self):
+        self.client.create.side_effect = HTTPError()
+        q = self.get_queue()
+        q.create_annotation("title", "category")
+        self.assertTrue(q.close(1))
+        self.assertEqual(1, q.failed)
+        self.assertEqual(0, q.sent)
+
+    def test_close(self):
+        q = self.get_queue()
+        self.fill(q, ["a", "b"])
+        self.assertFalse(q.close(0.01))
+        self.assertEqual(1, q.dropped)
+        self.assertFalse(q.create_annotation("c", "category").response)
+        self.assertEqual(2, q.dropped)
+        self.release.set()
+        q._worker.join(1)
+        self.assertFalse(q._worker.is_alive())
+        self.assertEqual(1, q.sent)
+
+
 class UtilTestCase(unittest.TestCase):
 
     def test_get_resource_from_cid(self):
@@ -835,6 +1317,18 @@ class UtilTestCase(unittest.TestCase):
         actual = list(util.colors(items))
         self.assertEqual(expected, actual)
 
+        expected = [Color("blue"), Color("red")]
+        actual = list(util.colors(items, "blue", "red"))
+        self.assertEqual(expected, actual)
+
+    def test_get_palette(self):
+        self.assertEqual(("#ff0000",), util.get_palette(0))
+        self.assertEqual(("#ff0000",), util.get_palette(1))
+        self.assertEqual(("#ff0000", "#008000"), util.get_palette(2))
+        self.assertEqual(("#0000ff", "#ff0000"), util.get_palette(2, "blue", "red"))
+        self.assertEqual([c.get_hex_l() for c in Color("red").range_to(Color("green"), 16)], list(util.get_palette(16)))
+        self.assertIs(util.get_palette(16), util.get_palette(16))
+
 
 class TagTestCase(unittest.TestCase):
 
@@ -981,6 +1475,54 @@ class TagTestCase(unittest.TestCase):
         self.assertIsNone(tag.get_tags_without({}, ["test:new"]))
 
 
+class TagWriterTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.c = CirconusClient("TEST", str(uuid4()))
+
+    def test_max_workers(self):
+        self.assertEqual(client.API_MAX_WORKERS, tag.TagWriter(self.c).max_workers)
+        self.assertEqual(2, self.c.tag_batch(max_workers=2).max_workers)
+
+    def test_flush(self):
+        resources = {"/graph/1": {"tags": ["env:dev", "role:web"]},
+                     "/graph/2": {"tags": ["role:db"]},
+                     "/graph/3": {"tags": ["env:prod"]}}
+
+        def get(url, params, headers):
+            r = MagicMock()
+            r.json.return_value = resources["/" + url.split("/", 4)[-1]]
+            return r
+
+        with patch("circonus.client.requests.Session.get", side_effect=get) as get_patch:
+            with patch("circonus.client.requests.Session.put") as put_patch:
+                put_patch.return_value = response_mock = MagicMock()
+                with self.c.tag_batch() as tags:
+                    tags.add("/graph/1", ["env:prod"])
+                    tags.remove("/graph/1", ["env:dev"])
+                    tags.add("/graph/1", ["new:tag"])
+                    tags.add("/graph/2", ["role:web"])
+                    tags.remove("/graph/2", ["role:web"])
+                    tags.add("/graph/3", ["env:prod"])
+                    tags.add("/user/1", ["env:prod"])
+                self.assertEqual(3, get_patch.call_count)
+                self.assertEqual(1, put_patch.call_count)
+                data = json.loads(put_patch.call_args[1]["data"])
+                self.assertItemsEqual(["env:prod", "role:web", "new:tag"], data["tags"])
+                self.assertEqual([("/graph/1", response_mock), ("/graph/2", False), ("/graph/3", False)],
+                                 tags.results)
+
+    def test_exit_with_exception(self):
+        with patch("circonus.client.requests.Session.get") as get_patch:
+            with self.assertRaises(ValueError):
+                with self.c.tag_batch() as tags:
+                    tags.add("/graph/1", ["env:prod"])
+                    raise ValueError()
+            get_patch.assert_not_called()
+            self.assertIsNone(tags.results)
+
+
 class MetricTestCase(unittest.TestCase):
 
     def test_get_metrics(self):
@@ -1020,6 +1562,13 @@ class MetricTestCase(unittest.TestCase):
         sorted_metrics = metric.get_metrics_sorted_by_suffix(unsorted_metrics, cpu.CPU_METRIC_SUFFIXES)
         self.assertEqual([], sorted_metrics)
 
+    def test_get_suffix_ranks(self):
+        self.assertEqual({"a": 0, "b": 1}, metric.get_suffix_ranks(["a", "b", "a"]))
+
+    def test_get_metrics_sorted_by_suffix_partial_name(self):
+        metrics = [{"name": "x`usedfree"}, {"name": "x`used"}]
+        self.assertEqual(metrics[::-1], metric.get_metrics_sorted_by_suffix(metrics, ["used", "free"]))
+
     def test_get_datapoints(self):
         metrics = metric.get_metrics(check_bundle, cpu.CPU_METRIC_RE)
         check_id = util.get_check_id_from_cid(check_bundle["_cid"])
@@ -1033,6 +1582,50 @@ class MetricTestCase(unittest.TestCase):
             self.assertIn("custom", dp)
             self.assertEqual("attribute", dp["custom"])
 
+        datapoints = metric.get_datapoints(check_id, metrics, color_from="blue", color_to="red")
+        self.assertEqual(list(util.get_palette(len(metrics), "blue", "red")), [dp["color"] for dp in datapoints])
+
+        compact = metric.get_datapoints(check_id, metrics, {"custom": "attribute"}, compact=True)
+        self.assertTrue(all(isinstance(dp, metric.Datapoint) for dp in compact))
+        self.assertEqual(metric.get_datapoints(check_id, metrics, {"custom": "attribute"}),
+                         [dp.to_dict() for dp in compact])
+
+    def test_metric_view(self):
+        m = {"name": "cpu`0`cpu`idle", "type": "numeric"}
+        view = metric.MetricView(m, stack=0, type="text")
+        self.assertEqual(0, view["stack"])
+        self.assertEqual("text", view["type"])
+        self.assertEqual("cpu`0`cpu`idle", view["name"])
+        self.assertIsNone(view.get("hidden"))
+        self.assertEqual(3, len(view))
+        self.assertItemsEqual(["name", "type", "stack"], list(view))
+        self.assertEqual({"name": "cpu`0`cpu`idle", "type": "text", "stack": 0}, dict(view))
+        self.assertEqual({"name": "cpu`0`cpu`idle", "type": "numeric"}, m)
+
+    def test_datapoint(self):
+        dp = metric.Datapoint(axis="l", stack=None, custom_attribute="test")
+        self.assertEqual("l", dp["axis"])
+        self.assertIsNone(dp["stack"])
+        self.assertEqual("test", dp["custom_attribute"])
+        self.assertNotIn("color", dp)
+        self.assertIsNone(dp.get("color"))
+        self.assertRaises(KeyError, lambda: dp["color"])
+        self.assertEqual({"axis": "l", "stack": None, "custom_attribute": "test"}, dp)
+        self.assertEqual(3, len(dp))
+
+        dp.update({"axis": "r", "derive": "counter"})
+        del dp["custom_attribute"]
+        self.assertEqual({"axis": "r", "stack": None, "derive": "counter"}, dp.to_dict())
+        self.assertRaises(KeyError, dp.__delitem__, "color")
+        self.assertRaises(AttributeError, setattr, dp, "other", 1)
+
+    def test_get_json_object(self):
+        data = {"datapoints": [metric.Datapoint(axis="l", derive="counter")],
+                "metric": metric.MetricView({"name": "test"}, stack=0)}
+        expected = {"datapoints": [{"axis": "l", "derive": "counter"}], "metric": {"name": "test", "stack": 0}}
+        self.assertEqual(expected, json.loads(json.dumps(data, default=metric.get_json_object)))
+        self.assertRaises(TypeError, json.dumps, object(), default=metric.get_json_object)
+
     def test_get_metrics_with_status(self):
         metrics = [{'status': 'available', 'type': 'numeric', 'name': 'cpu`1`cpu`idle'},
                    {'status': 'available', 'type': 'numeric', 'name': 'cpu`1`cpu`user'},
@@ -1154,6 +1747,14 @@ class CollectdCpuTestCase(unittest.TestCase):
         actual = cpu.get_cpu_metrics(self.metrics)
         self.assertEqual(expected, actual)
 
+    def test_get_cpu_metrics_many_cpus(self):
+        metrics = [{"name": "cpu`%d`cpu`%s" % (n, s)} for s in cpu.CPU_METRIC_SUFFIXES for n in range(12)]
+        actual = cpu.get_cpu_metrics(metrics)
+        self.assertEqual(len(metrics), len(actual))
+        cpus = [n for n in range(12) for _ in cpu.CPU_METRIC_SUFFIXES]
+        self.assertEqual(sorted(cpus, key=lambda n: "cpu`%d`" % n), [int(m["name"].split("`")[1]) for m in actual])
+        self.assertEqual(cpu.CPU_METRIC_SUFFIXES * 12, [m["name"].rpartition("`")[-1] for m in actual])
+
     def test_get_stacked_cpu_metrics(self):
         self.assertEqual([], cpu.get_stacked_cpu_metrics([]))
         stacked_metrics = cpu.get_stacked_cpu_metrics(self.metrics)
@@ -1168,6 +1769,9 @@ class CollectdCpuTestCase(unittest.TestCase):
             self.assertIn(str(m["stack"]), m["name"])
             self.assertNotIn("hidden", m)
         self.assertNotEqual(self.metrics, stacked_metrics)
+        for m in self.metrics:
+            self.assertNotIn("stack", m)
+            self.assertNotIn("hidden", m)
 
     def test_get_cpu_datapoints(self):
         self.assertEqual([], cpu.get_cpu_datapoints({}, []))
@@ -1273,6 +1877,15 @@ class CollectdInterfaceTestCase(unittest.TestCase):
         datapoints = interface.get_interface_datapoints(check_bundle, interface_name)
         self.assertEqual([], datapoints)
 
+    def test_get_interface_datapoints_does_not_modify_check_bundle(self):
+        interface.get_interface_datapoints(check_bundle)
+        self.assertFalse([m for m in check_bundle["metrics"] if "data_formula" in m])
+
+    def test_get_interface_names(self):
+        self.assertEqual([], interface.get_interface_names(index.MetricIndex([])))
+        self.assertEqual(["eth0", "lo", "sit0"],
+                         interface.get_interface_names(index.MetricIndex(check_bundle["metrics"])))
+
     def test_is_transmitter(self):
         self.assertTrue(interface.is_transmitter({"name": "tx"}))
         self.assertTrue(interface.is_transmitter({"name": "test tx"}))
@@ -1367,6 +1980,28 @@ class CollectdDfTestCase(unittest.TestCase):
         actual = df.get_df_metrics(check_bundle["metrics"], "/mnt/solr-home/")
         self.assertItemsEqual(expected, actual)
 
+    def test_normalize_mount_dir(self):
+        self.assertEqual(u"mntsolrhome", df.normalize_mount_dir("/mnt/solr-home/"))
+        self.assertEqual(u"mntsolrhome", df.normalize_mount_dir("mnt-solr-home"))
+
+    def test_mount_index(self):
+        mount_index = df.MountIndex(check_bundle["metrics"])
+        self.assertEqual(5, len(mount_index))
+        for mount_dir in ["root", "/mnt/mysql", "/mnt/solr-home/"]:
+            self.assertEqual(df.get_df_metrics(check_bundle["metrics"], mount_dir), mount_index.get_metrics(mount_dir))
+        self.assertEqual([], mount_index.get_metrics("/missing"))
+
+    def test_get_mount_index(self):
+        metric_index = index.MetricIndex(check_bundle["metrics"])
+        mount_index = df.get_mount_index(metric_index)
+        self.assertIs(mount_index, df.get_mount_index(metric_index))
+        self.assertEqual(3, len(mount_index.get_metrics("/mnt/mysql")))
+
+    def test_get_mount_dirs(self):
+        self.assertEqual([], df.get_mount_dirs(index.MetricIndex([])))
+        self.assertEqual(["dev-shm", "mnt", "mnt-mysql", "mnt-solr-home", "root"],
+                         df.get_mount_dirs(index.MetricIndex(check_bundle["metrics"])))
+
     def test_get_sorted_df_metrics(self):
         expected = [m for m in check_bundle["metrics"] if m["name"].startswith("df`")]
         expected = [m for m in expected if "`mnt-solr-home`" in m["name"]]
@@ -1420,6 +2055,44 @@ class CollectdDfTestCase(unittest.TestCase):
         self.assertEqual(expected, actual)
 
 
+class CollectdIndexTestCase(unittest.TestCase):
+
+    def test_parse_metric_name(self):
+        self.assertEqual(("cpu", "0", "cpu", "idle"), index.parse_metric_name("cpu`0`cpu`idle"))
+        self.assertEqual(("memory", "", "memory", "free"), index.parse_metric_name("memory`memory`free"))
+        self.assertEqual(("df", "mnt", "df_complex", "free`x"), index.parse_metric_name("df`mnt`df_complex`free`x"))
+        self.assertEqual(("plugin", "", "type", ""), index.parse_metric_name("plugin`type"))
+        self.assertEqual(("DB", "", "", ""), index.parse_metric_name("DB"))
+        self.assertEqual("idle", index.parse_metric_name("cpu`0`cpu`idle").type_instance)
+
+    def test_metric_index(self):
+        metrics = check_bundle["metrics"]
+        i = index.MetricIndex(metrics)
+        self.assertEqual(len(metrics), len(i))
+        self.assertEqual([m for m in metrics if m["name"].startswith("cpu`")], i.get_metrics("cpu"))
+        self.assertEqual([m for m in metrics if m["name"].startswith("interface`eth0`")],
+                         i.get_metrics("interface", "eth0"))
+        self.assertEqual([], i.get_metrics("interface", "eth1"))
+        self.assertEqual([], i.get_metrics("nothing"))
+        self.assertEqual(["eth0", "lo", "sit0"], i.get_plugin_instances("interface"))
+        name, m = i.get_entries("memory")[0]
+        self.assertEqual("memory", name.plugin)
+        self.assertEqual(m["name"], "`".join(p for p in name if p))
+
+    def test_get_view(self):
+        i = index.MetricIndex(check_bundle["metrics"])
+        build = MagicMock(side_effect=lambda i: len(i))
+        self.assertEqual(len(i), i.get_view("count", build))
+        self.assertEqual(len(i), i.get_view("count", build))
+        build.assert_called_once_with(i)
+
+    def test_get_metric_index(self):
+        i = index.get_metric_index(check_bundle)
+        self.assertIsInstance(i, index.MetricIndex)
+        self.assertIs(i, index.get_metric_index(check_bundle, i))
+        self.assertEqual(0, len(index.get_metric_index({})))
+
+
 class CollectdGraphTestCase(unittest.TestCase):
 
     def test_get_collectd_graph_data(self):
@@ -1453,6 +2126,654 @@ class CollectdGraphTestCase(unittest.TestCase):
                 elif df.DF_METRIC_RE.match(dp["name"]):
                     self.assertEqual("%s root" % titles["df"], d["title"])
 
+    def test_graph_data_is_json_serializable(self):
+        data = get_collectd_graph_data(check_bundle, ["eth0"], ["root"])
+        self.assertEqual(data, json.loads(json.dumps(data)))
+        self.assertTrue(json.dumps(memory.get_memory_graph_data(check_bundle)))
+        for d in data:
+            self.assertTrue(all(isinstance(dp, types.DictType) for dp in d["datapoints"]))
+
+    def test_get_collectd_graph_data_compact(self):
+        data = get_collectd_graph_data(check_bundle, compact=True)
+        self.assertEqual(10, len(data))
+        for d in data:
+            self.assertTrue(all(isinstance(dp, metric.Datapoint) for dp in d["datapoints"]))
+        expected = json.dumps(get_collectd_graph_data(check_bundle), sort_keys=True)
+        self.assertEqual(expected, json.dumps(data, default=metric.get_json_object, sort_keys=True))
+
+    def test_get_collectd_graph_data_discovery(self):
+        data = get_collectd_graph_data(check_bundle)
+        titles = [d["title"] for d in data]
+        self.assertEqual(10, len(data))
+        for i in ["eth0", "lo", "sit0"]:
+            self.assertIn("%s interface %s bit/s" % (check_bundle["target"], i), titles)
+        for d in ["dev-shm", "mnt", "mnt-mysql", "mnt-solr-home", "root"]:
+            self.assertIn("%s df %s" % (check_bundle["target"], d), titles)
+
+        data = get_collectd_graph_data(check_bundle, ["eth0"])
+        self.assertEqual(8, len(data))
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    @staticmethod
+    def get_response(content, headers=None):
+        r = MagicMock()
+        r.content = content
+        r.headers = {} if headers is None else headers
+        return r
+
+    def test_get_cache_key(self):
+        url = get_api_url("graph")
+        self.assertEqual(url, cache.get_cache_key(url))
+        self.assertEqual(cache.get_cache_key(url, {"a": 1, "b": 2}), cache.get_cache_key(url, {"b": 2, "a": 1}))
+        self.assertNotEqual(url, cache.get_cache_key(url, {"a": 1}))
+        self.assertEqual(url + "?a=1&b=2&b=3", cache.get_cache_key(url, {"b": [2, 3], "a": 1}))
+        self.assertEqual(url + "?f_a=1&f_b=2", cache.get_cache_key(url, [("f_b", "2"), ("f_a", "1")]))
+        self.assertEqual(url + "?f_b=2&f_a=1", cache.get_cache_key(url, "f_b=2&f_a=1"))
+
+    def test_get_list_params(self):
+        c = CirconusClient("app", "token", coalesce=True)
+        with patch("circonus.client.requests.Session.get") as get_patch:
+            get_patch.return_value = response_mock = MagicMock()
+            self.assertIs(response_mock, c.get("/check_bundle", [("f_a", "1")]))
+            get_patch.assert_called_with(get_api_url("/check_bundle"), headers=c.api_headers, params=[("f_a", "1")])
+
+    def test_lookup(self):
+        c = cache.ResponseCache()
+        self.assertEqual((None, {}), c.lookup("graph"))
+        r = self.get_response("{}")
+        c.set("graph", "graph", r)
+        self.assertEqual((r, {}), c.lookup("graph"))
+        self.assertEqual(1, c.hits)
+        self.assertEqual(1, c.misses)
+
+    def test_lookup_stale(self):
+        c = cache.ResponseCache(ttls={"graph": 0})
+        r = self.get_response("{}", {"ETag": "abc", "Last-Modified": "Sat, 14 Feb 2015 00:00:00 GMT"})
+        c.set("graph", "graph", r, "graph")
+        self.assertEqual((None, {"If-None-Match": "abc", "If-Modified-Since": "Sat, 14 Feb 2015 00:00:00 GMT"}),
+                         c.lookup("graph"))
+        self.assertIs(r, c.refresh("graph"))
+        self.assertEqual((r, {}), c.lookup("graph"))
+        self.assertIsNone(c.refresh("missing"))
+
+    def test_evict_max_entries(self):
+        c = cache.ResponseCache(max_entries=2)
+        for key in ("a", "b"):
+            c.set(key, key, self.get_response("{}"))
+        c.lookup("a")
+        c.set("c", "c", self.get_response("{}"))
+        self.assertEqual(2, len(c))
+        self.assertEqual((None, {}), c.lookup("b"))
+        self.assertIsNotNone(c.lookup("a")[0])
+
+    def test_evict_max_bytes(self):
+        c = cache.ResponseCache(max_bytes=10)
+        c.set("a", "a", self.get_response("x" * 6))
+        c.set("b", "b", self.get_response("x" * 6))
+        self.assertEqual(1, len(c))
+        self.assertEqual(6, c.size)
+        c.set("c", "c", self.get_response("x" * 11))
+        self.assertEqual((None, {}), c.lookup("c"))
+
+    def test_invalidate(self):
+        c = cache.ResponseCache()
+        c.set("graph/1", "graph/1", self.get_response("{}"))
+        c.set("graph/1?a=1", "graph/1", self.get_response("{}"))
+        c.set("graph/2", "graph/2", self.get_response("{}"))
+        c.invalidate("graph/1")
+        self.assertEqual(1, len(c))
+        self.assertEqual(2, c.size)
+        c.clear()
+        self.assertEqual(0, len(c))
+        self.assertEqual(0, c.size)
+
+
+class CheckBundleStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.store = store.CheckBundleStore(":memory:")
+        self.check_bundles = [{"_cid": "/check_bundle/%d" % i, "_last_modified": 1417807952 + i,
+                               "metrics": [{"name": "cpu`%d`cpu`idle" % i}]} for i in range(3)]
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_put(self):
+        self.assertEqual(0, len(self.store))
+        self.assertEqual(0, self.store.get_last_modified())
+        self.assertEqual(3, self.store.put(self.check_bundles))
+        self.assertEqual(3, len(self.store))
+        self.assertEqual(self.check_bundles[1], self.store.get("/check_bundle/1"))
+        self.assertEqual(self.check_bundles, list(self.store))
+        self.assertEqual(1417807954, self.store.get_last_modified())
+        self.assertIsNone(self.store.get("/check_bundle/4"))
+
+        self.store.put([dict(self.check_bundles[0], display_name="updated")])
+        self.assertEqual(3, len(self.store))
+        self.assertEqual("updated", self.store.get("/check_bundle/0")["display_name"])
+
+        self.store.delete("/check_bundle/0")
+        self.assertEqual(2, len(self.store))
+
+    def test_sync(self):
+        c = MagicMock()
+        c.iter_resources.return_value = iter(self.check_bundles)
+        self.assertEqual(3, self.store.sync(c, {"f_type": "collectd"}))
+        c.iter_resources.assert_called_with("check_bundle", {"f_type": "collectd", store.LAST_MODIFIED_FILTER: 0},
+                                            stream=True)
+
+        c.iter_resources.return_value = iter(self.check_bundles[2:])
+        self.assertEqual(1, self.store.sync(c, [("f_type", "collectd")]))
+        c.iter_resources.assert_called_with("check_bundle", {"f_type": "collectd",
+                                                             store.LAST_MODIFIED_FILTER: 1417807954}, stream=True)
+        self.assertEqual(3, len(self.store))
+
+    def test_sync_watermark_per_params(self):
+        c = MagicMock()
+        c.iter_resources.return_value = iter(self.check_bundles[2:])
+        self.store.sync(c, {"f_type": "collectd"})
+        self.assertEqual(1417807954, self.store.get_last_modified({"f_type": "collectd"}))
+        self.assertEqual(0, self.store.get_last_modified({"f_type": "json"}))
+
+        c.iter_resources.return_value = iter(self.check_bundles[:2])
+        self.store.sync(c, {"f_type": "json"})
+        c.iter_resources.assert_called_with("check_bundle", {"f_type": "json", store.LAST_MODIFIED_FILTER: 0},
+                                            stream=True)
+        self.assertEqual(1417807953, self.store.get_last_modified({"f_type": "json"}))
+        self.assertEqual(1417807954, self.store.get_last_modified({"f_type": "collectd"}))
+        self.assertEqual(1417807954, self.store.get_last_modified())
+        self.assertEqual(3, len(self.store))
+
+    def test_sync_full(self):
+        self.store.put(self.check_bundles)
+        c = MagicMock()
+        c.iter_resources.return_value = iter(self.check_bundles[1:])
+        self.assertEqual(2, self.store.sync(c, full=True))
+        c.iter_resources.assert_called_with("check_bundle", {}, stream=True)
+        self.assertEqual(2, len(self.store))
+        self.assertIsNone(self.store.get("/check_bundle/0"))
+        self.assertEqual(1417807954, self.store.get_last_modified({}))
+
+    def test_sync_full_filtered(self):
+        c = MagicMock()
+        c.iter_resources.return_value = iter(self.check_bundles[:2])
+        self.store.sync(c, {"f_type": "json"})
+        c.iter_resources.return_value = iter(self.check_bundles[1:])
+        self.store.sync(c, {"f_type": "collectd"})
+
+        c.iter_resources.return_value = iter(self.check_bundles[2:])
+        self.store.sync(c, {"f_type": "collectd"}, full=True)
+        self.assertEqual(self.check_bundles, list(self.store))
+        self.assertEqual(1417807953, self.store.get_last_modified({"f_type": "json"}))
+
+        c.iter_resources.return_value = iter([])
+        self.store.sync(c, {"f_type": "json"}, full=True)
+        self.assertEqual(self.check_bundles[2:], list(self.store))
+        self.store.sync(c, full=True)
+        self.assertEqual(0, len(self.store))
+
+
+class SchedulerTestCase(unittest.TestCase):
+
+    @staticmethod
+    def get_response(status_code, headers=None):
+        return MagicMock(status_code=status_code, headers={} if headers is None else headers)
+
+    def test_get_retry_after(self):
+        self.assertIsNone(scheduler.get_retry_after(self.get_response(503)))
+        self.assertEqual(2.0, scheduler.get_retry_after(self.get_response(503, {"Retry-After": "2"})))
+        self.assertIsNone(scheduler.get_retry_after(self.get_response(503, {"Retry-After": "soon"})))
+        self.assertEqual(0.0, scheduler.get_retry_after(self.get_response(503, {
+            "Retry-After": "Sat, 14 Feb 2015 00:00:00 GMT"})))
+
+    def test_token_bucket(self):
+        bucket = scheduler.TokenBucket(10, 2)
+        with patch("circonus.scheduler.sleep") as sleep_patch:
+            self.assertEqual(0.0, bucket.acquire())
+            self.assertEqual(0.0, bucket.acquire())
+            sleep_patch.assert_not_called()
+            with patch("circonus.scheduler.time", return_value=bucket.updated):
+                sleep_patch.side_effect = lambda delay: setattr(bucket, "tokens", 1)
+                self.assertAlmostEqual(0.1, bucket.acquire(), places=2)
+                bucket.pause(5)
+                bucket.tokens = 1
+                sleep_patch.side_effect = lambda delay: setattr(bucket, "paused_until", 0)
+                self.assertEqual(5, bucket.acquire())
+
+    def test_send_retries(self):
+        s = scheduler.RequestScheduler(max_retries=2)
+        rs = [self.get_response(500), self.get_response(502), self.get_response(200)]
+        send = MagicMock(side_effect=rs)
+        with patch("circonus.scheduler.sleep") as sleep_patch:
+            self.assertIs(rs[-1], s.send("get", send, "url"))
+        self.assertEqual(3, send.call_count)
+        self.assertEqual(2, sleep_patch.call_count)
+        self.assertEqual(2, s.retries)
+        rs[0].close.assert_called()
+
+    def test_send_retries_exhausted(self):
+        s = scheduler.RequestScheduler(max_retries=1)
+        rs = [self.get_response(503), self.get_response(503)]
+        with patch("circonus.scheduler.sleep"):
+            self.assertIs(rs[-1], s.send("put", MagicMock(side_effect=rs), "url"))
+
+    def test_send_retries_connection_error(self):
+        s = scheduler.RequestScheduler(max_retries=1)
+        send = MagicMock(side_effect=[ConnectionError(), ConnectionError()])
+        with patch("circonus.scheduler.sleep"):
+            with self.assertRaises(ConnectionError):
+                s.send("delete", send, "url")
+        self.assertEqual(2, send.call_count)
+
+    def test_send_post(self):
+        send = MagicMock(return_value=self.get_response(503))
+        with patch("circonus.scheduler.sleep") as sleep_patch:
+            scheduler.RequestScheduler().send("post", send, "url")
+            self.assertEqual(1, send.call_count)
+            sleep_patch.assert_not_called()
+
+            send.side_effect = [self.get_response(503), self.get_response(200)]
+            s = scheduler.RequestScheduler(retry_methods=scheduler.RETRY_METHODS | {"POST"})
+            self.assertEqual(200, s.send("post", send, "url").status_code)
+
+    def test_send_too_many_requests(self):
+        s = scheduler.RequestScheduler(rate=100)
+        rs = [self.get_response(429, {"Retry-After": "3"}), self.get_response(200)]
+        with patch("circonus.scheduler.sleep") as sleep_patch:
+            with patch.object(s.bucket, "pause") as pause_patch:
+                s.send("get", MagicMock(side_effect=rs), "url")
+                pause_patch.assert_called_with(3.0)
+            sleep_patch.assert_called_with(3.0)
+
+
+class InstrumentTestCase(unittest.TestCase):
+
+    def test_latency_histogram(self):
+        h = instrument.LatencyHistogram()
+        self.assertIsNone(h.get_percentile(50))
+        for i in range(1, 101):
+            h.add(i / 1000.0)
+        self.assertEqual(100, h.count)
+        self.assertEqual(0.1, h.max)
+        self.assertTrue(0.05 <= h.get_percentile(50) <= 0.05 * instrument.HISTOGRAM_GROWTH)
+        self.assertTrue(0.099 <= h.get_percentile(99) <= 0.1)
+        h.add(1000.0)
+        self.assertEqual(1000.0, h.get_percentile(100))
+
+    def test_histogram_collector(self):
+        collector = instrument.HistogramCollector()
+        event = instrument.RequestEvent("GET", "check_bundle")
+        event.add(sent=1, received=10)
+        event.retries = 2
+        event.finish(200)
+        collector.after_request(event)
+        event = instrument.RequestEvent("GET", "check_bundle")
+        event.cache_hit = True
+        event.finish(200)
+        collector.after_request(event)
+        event = instrument.RequestEvent("GET", "check_bundle")
+        event.finish(error=ConnectionError())
+        collector.after_request(event)
+
+        snapshot = collector.snapshot()["GET check_bundle"]
+        self.assertEqual(3, snapshot["count"])
+        self.assertEqual(1, snapshot["errors"])
+        self.assertEqual(1, snapshot["cache_hits"])
+        self.assertEqual(2, snapshot["retries"])
+        self.assertEqual(1, snapshot["bytes_sent"])
+        self.assertEqual(10, snapshot["bytes_received"])
+        self.assertEqual({200: 2}, snapshot["statuses"])
+        self.assertIsNotNone(snapshot["p50"])
+        self.assertIsNotNone(snapshot["p99"])
+
+        collector.reset()
+        self.assertEqual({}, collector.snapshot())
+
+    def test_client_instruments(self):
+        hooks = MagicMock()
+        collector = instrument.HistogramCollector()
+        c = CirconusClient("app", "token", instruments=[hooks, collector], cache=cache.ResponseCache(),
+                           scheduler=scheduler.RequestScheduler(max_retries=1))
+        response = MagicMock(status_code=200, headers={}, content="{}")
+        response.raw.tell.return_value = 2
+        with patch("circonus.client.requests.Session.get") as get_patch:
+            get_patch.side_effect = [MagicMock(status_code=503, headers={}), response]
+            with patch("circonus.scheduler.sleep"):
+                c.get("/check_bundle/1")
+            c.get("/check_bundle/1")
+        with patch("circonus.client.requests.Session.post") as post_patch:
+            post_patch.side_effect = ConnectionError()
+            with self.assertRaises(ConnectionError):
+                c.create("graph", {"title": "test"})
+            body = post_patch.call_args[1]["data"]
+
+        self.assertEqual(3, hooks.before_request.call_count)
+        self.assertEqual(3, hooks.after_request.call_count)
+        events = [call[0][0] for call in hooks.after_request.call_args_list]
+        self.assertEqual(["GET", "GET", "POST"], [e.method for e in events])
+        self.assertEqual(["check_bundle", "check_bundle", "graph"], [e.resource_type for e in events])
+        self.assertEqual([200, 200, None], [e.status for e in events])
+        self.assertEqual([1, 0, 0], [e.retries for e in events])
+        self.assertEqual([False, True, False], [e.cache_hit for e in events])
+        self.assertIsInstance(events[2].error, ConnectionError)
+        self.assertEqual(len(body), events[2].bytes_sent)
+        self.assertTrue(all(e.latency >= 0 for e in events))
+
+        snapshot = collector.snapshot()
+        self.assertEqual(2, snapshot["GET check_bundle"]["count"])
+        self.assertEqual(1, snapshot["GET check_bundle"]["cache_hits"])
+        self.assertEqual(1, snapshot["POST graph"]["errors"])
+
+
+class FakeCirconusAPITestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.api = fake.FakeCirconusAPI().start()
+        self.c = CirconusClient("app", "token", base_url=self.api.base_url)
+
+    def tearDown(self):
+        self.c.session.close()
+        self.api.stop()
+
+    def test_crud(self):
+        r = self.c.create("check_bundle", {"type": "collectd", "display_name": "test"})
+        cid = r.json()["_cid"]
+        self.assertEqual("/check_bundle/1", cid)
+        self.assertEqual(["telemetry:collectd"], self.c.get(cid).json()["tags"])
+
+        self.c.update_with_tags(cid, ["telemetry:collectd"])
+        self.assertNotIn("PUT", self.api.requests)
+        self.c.update_with_tags(cid, ["cat:tag"])
+        resource = self.c.get(cid).json()
+        self.assertEqual("test", resource["display_name"])
+        self.assertItemsEqual(["telemetry:collectd", "cat:tag"], resource["tags"])
+        self.assertEqual(1, len(self.c.get("check_bundle", {"f_tags": "cat:tag"}).json()))
+
+        self.assertEqual(204, self.c.delete(cid).status_code)
+        with self.assertRaises(HTTPError):
+            self.c.get(cid)
+        self.assertEqual(1, self.api.requests["DELETE"])
+
+    def test_pagination(self):
+        for n in range(25):
+            self.api.add("graph", {"title": "graph %d" % n})
+        titles = [g["title"] for g in self.c.iter_resources("graph", page_size=10)]
+        self.assertEqual(["graph %d" % n for n in range(25)], titles)
+        self.assertEqual(3, self.api.requests["GET"])
+        self.assertEqual(25, len(list(self.c.iter_resources("graph", page_size=10, stream=True))))
+
+    def test_streamed_compressed_bodies(self):
+        c = CirconusClient("app", "token", base_url=self.api.base_url, stream_min_items=1, compress=True)
+        r = c.create("graph", {"title": "test", "datapoints": [{"metric_name": "m%d" % n} for n in range(100)]})
+        self.assertEqual(100, len(self.api.get_resources("graph")[0]["datapoints"]))
+        self.assertEqual(r.json(), c.get(r.json()["_cid"]).json())
+        c.session.close()
+
+    def test_errors(self):
+        self.api.fail(500)
+        with self.assertRaises(HTTPError):
+            self.c.get("/graph")
+        self.assertEqual(200, self.c.get("/graph").status_code)
+
+        self.api.error_rate = 1.0
+        with self.assertRaises(HTTPError):
+            self.c.get("/graph")
+
+        api = fake.FakeCirconusAPI(api_token="secret").start()
+        c = CirconusClient("app", "token", base_url=api.base_url)
+        with self.assertRaises(HTTPError) as e:
+            c.get("/graph")
+        self.assertEqual(403, e.exception.response.status_code)
+        c.session.close()
+        api.stop()
+
+    def test_rate_limit(self):
+        self.api.rate_limit = 2
+        self.api.retry_after = 0.5
+        self.c.get("/graph", {"size": 1})
+        self.c.get("/graph", {"size": 2})
+        with self.assertRaises(HTTPError) as e:
+            self.c.get("/graph", {"size": 3})
+        self.assertEqual(429, e.exception.response.status_code)
+        self.assertEqual("0.5", e.exception.response.headers["Retry-After"])
+
+        self.api.rate_limit = None
+        self.api.fail(429, 2)
+        c = CirconusClient("app", "token", base_url=self.api.base_url, scheduler=scheduler.RequestScheduler())
+        with patch("circonus.scheduler.sleep") as sleep_patch:
+            self.assertEqual(200, c.get("/graph").status_code)
+        self.assertEqual(2, c.scheduler.retries)
+        sleep_patch.assert_called_with(0.5)
+        c.session.close()
+
+    def test_latency(self):
+        self.api.latency = 0.05
+        collector = instrument.HistogramCollector()
+        c = CirconusClient("app", "token", base_url=self.api.base_url, instruments=[collector])
+        c.get("/graph")
+        self.assertTrue(collector.snapshot()["GET graph"]["max"] >= 0.05)
+        c.session.close()
+
+
+class SpoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.addCleanup(rmtree, self.directory)
+        self.spool = spool.Spool(self.directory)
+        self.api = fake.FakeCirconusAPI().start()
+        self.addCleanup(self.api.stop)
+        self.c = CirconusClient("app", "token", base_url=self.api.base_url)
+        self.addCleanup(self.c.session.close)
+
+    def read_events(self):
+        events = []
+        for segment in self.spool.get_segments():
+            with open("%s/%s" % (self.directory, segment)) as f:
+                events.extend(json.loads(line) for line in f)
+        return events
+
+    def test_append(self):
+        a = self.spool.create_annotation("title", "category")
+        self.assertTrue(a.response)
+        self.spool.update("/graph/1", {"title": "updated"})
+        with self.assertRaises(ValueError):
+            self.spool.append("delete", "/graph/1", {})
+        events = self.read_events()
+        self.assertEqual(["create", "update"], [e["method"] for e in events])
+        self.assertEqual(["annotation", "/graph/1"], [e["path"] for e in events])
+        self.assertEqual(a.get_data(), events[0]["data"])
+        self.assertEqual(1, len(self.spool.get_segments()))
+
+        s = spool.Spool(self.directory, segment_bytes=1)
+        s.create("graph", {"title": "graph"})
+        s.create("graph", {"title": "graph"})
+        self.assertEqual(3, len(s.get_segments()))
+        self.assertEqual(4, len(self.read_events()))
+
+    def test_replay(self):
+        self.api.add("graph", {"title": "graph"})
+        self.spool.create_annotation("title", "category")
+        self.spool.update("/graph/1", {"title": "updated"})
+        self.spool.update("/graph/2", {"title": "missing"})
+        self.assertTrue(self.spool.replay(self.c))
+        self.assertEqual(["title"], [a["title"] for a in self.api.get_resources("annotation")])
+        self.assertEqual("updated", self.api.get_resources("graph")[0]["title"])
+        self.assertEqual(2, self.spool.replayed)
+        self.assertEqual(1, self.spool.rejected)
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_replay_resumes(self):
+        for n in range(4):
+            self.spool.create("graph", {"title": "graph %d" % n})
+        self.api.fail(503)
+        self.api.requests.clear()
+        self.assertFalse(self.spool.replay(self.c, batch_size=1))
+        self.spool.create("graph", {"title": "graph 4"})
+        self.assertTrue(self.spool.replay(self.c, batch_size=1))
+        self.assertEqual(["graph %d" % n for n in range(5)], [g["title"] for g in self.api.get_resources("graph")])
+        self.assertEqual(6, self.api.requests["POST"])
+
+        self.spool.create("graph", {"title": "graph 5"})
+        with open("%s/%s" % (self.directory, self.spool.get_segments()[0]), "a") as f:
+            f.write('{"method": "create", "path": "graph", "da')
+        self.assertTrue(self.spool.replay(self.c))
+        self.assertEqual(6, len(self.api.get_resources("graph")))
+        self.assertEqual(1, self.spool.rejected)
+
+    def test_replay_rejects_other_errors(self):
+        self.spool.create("graph", {"title": "bad"})
+        self.spool.create("graph", {"title": "good"})
+        client_mock = MagicMock()
+        client_mock.create.side_effect = [ValueError("malformed"), MagicMock()]
+        self.assertTrue(self.spool.replay(client_mock, batch_size=1))
+        self.assertEqual(1, self.spool.rejected)
+        self.assertEqual(1, self.spool.replayed)
+        self.assertEqual([], self.spool.get_segments())
+
+    def test_annotation_queue(self):
+        client_mock = MagicMock()
+        client_mock.create.side_effect = [ConnectionError(), HTTPError(response=MagicMock(status_code=400))]
+        q = AnnotationQueue(client_mock, flush_on_exit=False, spool=self.spool, batch_size=1)
+        q.create_annotation("spooled", "category")
+        q.create_annotation("rejected", "category")
+        self.assertTrue(q.close(1))
+        self.assertEqual(2, q.failed)
+        self.assertEqual(1, q.spooled)
+        self.assertEqual(["spooled"], [e["data"]["title"] for e in self.read_events()])
+        self.assertTrue(q.create_annotation("closed", "category").response)
+        self.assertEqual(2, q.spooled)
+
+    def test_annotation_queue_spills_without_lock(self):
+        q = AnnotationQueue(MagicMock(), flush_on_exit=False, spool=self.spool)
+        q.close(1)
+        acquired = []
+        spool_create = self.spool.create
+
+        def probe():
+            acquired.append(q._condition.acquire(False))
+            if acquired[-1]:
+                q._condition.release()
+
+        def create(resource_type, data):
+            t = Thread(target=probe)
+            t.start()
+            t.join()
+            return spool_create(resource_type, data)
+
+        with patch.object(self.spool, "create", side_effect=create):
+            self.assertTrue(q.create_annotation("closed", "category").response)
+        self.assertEqual([True], acquired)
+        self.assertEqual(1, q.spooled)
+
+    def test_replayer(self):
+        self.spool.create("graph", {"title": "graph"})
+        with spool.SpoolReplayer(self.spool, self.c, interval=0.01):
+            for _ in range(100):
+                if self.api.get_resources("graph"):
+                    break
+                sleep(0.01)
+        self.assertEqual(1, len(self.api.get_resources("graph")))
+        self.assertEqual([], self.spool.get_segments())
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def test_call(self):
+        s = cache.SingleFlight()
+        self.assertEqual(3, s.call("key", lambda a, b: a + b, 1, b=2))
+        self.assertEqual(0, s.shared)
+
+    def test_call_error(self):
+        s = cache.SingleFlight()
+        release = Event()
+        errors = []
+
+        def fail():
+            release.wait()
+            raise ConnectionError()
+
+        def call():
+            try:
+                s.call("key", fail)
+            except ConnectionError as e:
+                errors.append(e)
+
+        threads = [Thread(target=call) for _ in range(2)]
+        for t in threads:
+            t.start()
+        while s.shared < 1:
+            sleep(0.001)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(2, len(errors))
+        self.assertIs(errors[0], errors[1])
+
+
+class StreamTestCase(unittest.TestCase):
+
+    def test_iter_json_array(self):
+        expected = [{"a": [1, 2, {"b": "]"}]}, 12345, "x,y", None, [], {}]
+        document = json.dumps(expected, indent=2)
+        for size in (1, 3, len(document)):
+            chunks = (document[i:i + size] for i in range(0, len(document), size))
+            actual = stream.iter_json_array(chunks)
+            self.assertIsInstance(actual, types.GeneratorType)
+            self.assertEqual(expected, list(actual))
+
+    def test_iter_json_array_decodes_once(self):
+        expected = [{"datapoints": [{"name": 'm\\"%d' % n} for n in range(200)]}, "[{\\", 1]
+        document = json.dumps(expected)
+        chunks = [document[i:i + 7] for i in range(0, len(document), 7)]
+        with patch.object(stream.JSONDecoder, "raw_decode", autospec=True,
+                          side_effect=stream.JSONDecoder.raw_decode) as raw_decode_patch:
+            self.assertEqual(expected, list(stream.iter_json_array(chunks)))
+        self.assertTrue(raw_decode_patch.call_count <= 2 * len(expected))
+
+    def test_iter_json_array_split_numbers(self):
+        self.assertEqual([1.25, 2], list(stream.iter_json_array(["[1.", "25, 2]"])))
+        self.assertEqual([1e5, 2], list(stream.iter_json_array(["[1", "e5 ,2]"])))
+        self.assertEqual([1e-5], list(stream.iter_json_array(["[1e", "-5]"])))
+        self.assertEqual([1.5e+5], list(stream.iter_json_array(["[1.5E+", "5", "]"])))
+        self.assertEqual([-12], list(stream.iter_json_array(["[-", "1", "2 ", " ]"])))
+
+    def test_iter_json_array_empty(self):
+        self.assertEqual([], list(stream.iter_json_array([" [ ", " ] "])))
+
+    def test_iter_json_array_object(self):
+        self.assertEqual([{"_cid": "/graph/1"}], list(stream.iter_json_array(['{"_cid": ', '"/graph/1"}'])))
+
+    def test_iter_json_array_utf8(self):
+        document = json.dumps([u"m\xe9tric"], ensure_ascii=False).encode("utf-8")
+        chunks = [document[i:i + 1] for i in range(len(document))]
+        self.assertEqual([u"m\xe9tric"], list(stream.iter_json_array(chunks)))
+
+    def test_iter_json_array_invalid(self):
+        with self.assertRaises(ValueError):
+            list(stream.iter_json_array(["[1, 2", "}"]))
+        with self.assertRaises(ValueError):
+            list(stream.iter_json_array(["[1 2]"]))
+
+    def test_json_body(self):
+        data = {"title": "test", 1: None, "datapoints": [metric.Datapoint(axis="l"), {"name": u"m\xe9tric"}],
+                "tags": [], "max_left_y": 100}
+        expected = json.dumps(data, default=metric.get_json_object)
+        for chunk_size in (1, 16, stream.CHUNK_SIZE):
+            body = stream.JSONBody(data, chunk_size, metric.get_json_object)
+            chunks = list(body)
+            self.assertEqual(expected, "".join(chunks))
+            self.assertEqual(chunks, list(body))
+            if chunk_size == 1:
+                self.assertTrue(len(chunks) > 1)
+        self.assertEqual(json.dumps([1, 2]), "".join(stream.JSONBody([1, 2])))
+
+    def test_get_item_count(self):
+        self.assertEqual(0, stream.get_item_count([1, 2]))
+        self.assertEqual(3, stream.get_item_count({"datapoints": [1, 2], "tags": ["a"], "title": "test"}))
+
 
 class GraphTestCase(unittest.TestCase):
 